@@ -116,8 +116,19 @@ class ClientSideChild(ChildNode):
             children = [],
         )
 
+    def abort(self, token:Token) -> Response:
+        return Response(
+            name = self.name,
+            token = token,
+            data = None,
+            flag = ResponseFlag.NOT_EXECUTED_NOT_IMPLEMENTED,
+            children = []
+        )
+
     def propagate_command(self, command:str, data, token:Token) -> Response:
-        if command == 'exclude':
+        if command == 'abort':
+            return self.abort(token)
+        elif command == 'exclude':
             self.state.exclude()
             return Response(
                 name = self.name,
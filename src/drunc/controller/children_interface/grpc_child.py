@@ -36,9 +36,10 @@ class gRPCChildNode(ChildNode):
         self.uri = f"{host}:{port}"
 
         from druncschema.controller_pb2_grpc import ControllerStub
+        from drunc.controller.utils import add_abort_to_stub
 
         self.channel = grpc.insecure_channel(self.uri)
-        self.controller = ControllerStub(self.channel)
+        self.controller = add_abort_to_stub(ControllerStub(self.channel), self.channel)
 
         from druncschema.request_response_pb2 import Description
         desc = Description()
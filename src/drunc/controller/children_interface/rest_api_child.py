@@ -269,6 +269,15 @@ class AppCommander:
             headers['X-Answer-Host'] = self.response_host
 
         self.log.debug(headers)
+
+        import queue
+        while True: # replies that arrived after their command was aborted
+            try:
+                stale = self.response_queue.get_nowait()
+                self.log.warning(f'Discarding a late reply from {self.app}: {stale}')
+            except queue.Empty:
+                break
+
         import requests
         try:
             ack = requests.post(
@@ -393,6 +402,28 @@ class RESTAPIChildNode(ClientSideChild):
     def get_endpoint(self):
         return f'rest://{self.app_host}:{self.app_port}'
 
+    def abort(self, token:Token) -> Response:
+        sent_cmd = self.commander.sent_cmd
+        if sent_cmd is not None:
+            # wake up the propagate_fsm_command waiting for the reply, it will put the child in error
+            self.log.warning(f'Aborting the wait for the reply of \'{self.name}\' to \'{sent_cmd}\'')
+            self.commander.notify({
+                'success': False,
+                'result': f'Aborted while waiting for the reply to \'{sent_cmd}\'',
+            })
+
+        return Response(
+            name = self.name,
+            token = token,
+            data = pack_to_any(
+                PlainText(
+                    text = f"\'{self.name}\' aborted" if sent_cmd is not None else f"\'{self.name}\' was not executing any command"
+                )
+            ),
+            flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+            children = []
+        )
+
     # def get_status(self, token):
 
     #     status = Status(
@@ -9,7 +9,7 @@ from druncschema.token_pb2 import Token
 from drunc.authoriser.decorators import authentified_and_authorised
 from drunc.broadcast.server.broadcast_sender import BroadcastSender
 from drunc.broadcast.server.decorators import broadcasted
-from drunc.controller.decorators import in_control
+from drunc.controller.decorators import in_control, not_during_transition
 import drunc.controller.exceptions as ctler_excpt
 from drunc.controller.stateful_node import StatefulNode
 from drunc.utils.grpc_utils import pack_to_any
@@ -120,6 +120,11 @@ class Controller(ControllerServicer):
 
         self.actor = ControllerActor(token)
 
+        # Only one transition can execute at a time, abort sets the event to interrupt it
+        from threading import Lock, Event
+        self.transition_lock = Lock()
+        self.abort_event = Event()
+
         self.connectivity_service = None
         self.connectivity_service_thread = None
         self.uri = ''
@@ -194,6 +199,13 @@ class Controller(ControllerServicer):
                 return_type = 'controller_pb2.FSMCommandResponse'
             ),
 
+            CommandDescription(
+                name = 'abort',
+                data_type = ['None'],
+                help = 'Abort the transition being executed (self and children are put in error), without waiting for it to finish',
+                return_type = 'generic_pb2.PlainText'
+            ),
+
             CommandDescription(
                 name = 'include',
                 data_type = ['None'],
@@ -347,7 +359,12 @@ class Controller(ControllerServicer):
     def __del__(self):
         self.terminate()
 
-    def propagate_to_list(self, command:str, command_data, token, node_to_execute):
+    def propagate_to_list(self, command:str, command_data, token, node_to_execute, timings:Optional[dict]=None, interrupt=None):
+        '''
+        Sends the command to all the nodes of node_to_execute in parallel
+        If a timings dict is provided, it is filled with the wall time (in seconds) taken by each child
+        If an interrupt event is provided and gets set, stops waiting for the children which have not replied yet
+        '''
 
         self.broadcast(
             btype = BroadcastType.COMMAND_EXECUTION_START,
@@ -365,10 +382,14 @@ class Controller(ControllerServicer):
                 message = f'Propagating {command} to children ({child.name})',
             )
 
+            from time import perf_counter
+            start = perf_counter()
             try:
                 response = child.propagate_command(command, command_data, token)
                 with response_lock:
                     response_children.append(response)
+                    if timings is not None:
+                        timings[child.name] = perf_counter() - start
 
                 if response.flag == ResponseFlag.EXECUTED_SUCCESSFULLY:
                     self.broadcast(
@@ -390,6 +411,8 @@ class Controller(ControllerServicer):
                 flag = ResponseFlag.DRUNC_EXCEPTION_THROWN if isinstance(e, DruncException) else ResponseFlag.UNHANDLED_EXCEPTION_THROWN
 
                 with response_lock:
+                    if timings is not None:
+                        timings[child.name] = perf_counter() - start
                     from druncschema.request_response_pb2 import Response
                     from druncschema.generic_pb2 import Stacktrace
                     import traceback
@@ -431,7 +454,30 @@ class Controller(ControllerServicer):
             threads.append(t)
 
         for thread in threads:
-            thread.join()
+            while thread.is_alive() and not (interrupt is not None and interrupt.is_set()):
+                thread.join(timeout=0.1)
+
+        with response_lock:
+            response_children = list(response_children) # the threads we stopped waiting for may still append to the original list
+            replied = [r.name for r in response_children]
+
+        for child in node_to_execute:
+            if child.name in replied:
+                continue
+            self.logger.error(f'Stopped waiting for {child.name} to reply to {command}')
+            response_children.append(
+                Response(
+                    name = child.name,
+                    token = token,
+                    data = pack_to_any(
+                        PlainText(
+                            text = f'Interrupted while waiting for the reply to {command}'
+                        )
+                    ),
+                    flag = ResponseFlag.DRUNC_EXCEPTION_THROWN,
+                    children = [],
+                )
+            )
         return response_children
 
 
@@ -552,6 +598,18 @@ class Controller(ControllerServicer):
         2. Execute the command on children controller, app, and self
         3. Return the result
         """
+        if not self.transition_lock.acquire(blocking=False):
+            from drunc.controller.stateful_node import TransitionExecuting
+            raise TransitionExecuting()
+
+        try:
+            self.abort_event.clear()
+            return self._execute_fsm_command(fsm_command, token)
+        finally:
+            self.transition_lock.release()
+
+
+    def _execute_fsm_command(self, fsm_command:FSMCommand, token:Token) -> Response:
         from druncschema.request_response_pb2 import ResponseFlag
 
         if self.stateful_node.node_is_in_error():
@@ -599,6 +657,9 @@ class Controller(ControllerServicer):
 
         self.logger.debug(f'FSM command data: {fsm_command}')
 
+        from time import perf_counter
+        transition_start = perf_counter()
+
         fsm_args = self.stateful_node.decode_fsm_arguments(fsm_command)
 
         fsm_data = self.stateful_node.prepare_transition(
@@ -608,6 +669,9 @@ class Controller(ControllerServicer):
             ctx = self,
         )
 
+        if self.abort_event.is_set():
+            return self._aborted_transition_response(fsm_command.command_name, token, [])
+
         self.stateful_node.propagate_transition_mark(transition)
 
         children_fsm_command = FSMCommand()
@@ -615,13 +679,19 @@ class Controller(ControllerServicer):
         children_fsm_command.data = fsm_data
         children_fsm_command.ClearField("children_nodes") # we strip the children node, since when we feed them to the children they are meaningless
 
+        children_timing = {}
         response_children = self.propagate_to_list(
             'execute_fsm_command',
             command_data = children_fsm_command,
             token = token,
             node_to_execute = self.children_nodes,
+            timings = children_timing,
+            interrupt = self.abort_event,
         )
 
+        if self.abort_event.is_set():
+            return self._aborted_transition_response(fsm_command.command_name, token, response_children)
+
         child_worst_response_flag = ResponseFlag.EXECUTED_SUCCESSFULLY
         child_worst_fsm_flag = FSMResponseFlag.FSM_EXECUTED_SUCCESSFULLY
 
@@ -662,10 +732,38 @@ class Controller(ControllerServicer):
         #         cause = FSMResponseFlag.FSM_FAILED,
         #     )
 
+        # The timing of this node, the children's own breakdown is in their responses
+        from google.protobuf.struct_pb2 import Struct
+        timing = Struct()
+        timing.update(self.stateful_node.get_transition_timing())
+        timing.update({
+            'children': children_timing,
+            'total': perf_counter() - transition_start,
+        })
+
         self_response_fsm_flag = FSMResponseFlag.FSM_EXECUTED_SUCCESSFULLY # self has executed successfully, even if children have not
         fsm_result = FSMCommandResponse(
             flag = self_response_fsm_flag,
             command_name = fsm_command.command_name,
+            data = pack_to_any(timing),
+        )
+
+        return Response (
+            name = self.name,
+            token = token,
+            data = pack_to_any(fsm_result),
+            flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+            children = response_children,
+        )
+
+
+    def _aborted_transition_response(self, command_name:str, token:Token, response_children) -> Response:
+        self.logger.error(f'Transition \'{command_name}\' was aborted')
+        self.stateful_node.abort_transition() # again, in case the sub-state moved on since the abort was received
+
+        fsm_result = FSMCommandResponse(
+            flag = FSMResponseFlag.FSM_FAILED,
+            command_name = command_name,
         )
 
         return Response (
@@ -685,6 +783,44 @@ class Controller(ControllerServicer):
     ) # 2nd step
     @in_control # 3rd step
     @unpack_request_data_to(pass_token=True) # 4th step
+    def abort(self, token:Token) -> Response:
+        """
+        High priority path, served by the second worker of the gRPC server, while the transition is still executing.
+        1. Interrupt the wait on the children of the transition being executed, and put self in error
+        2. Push the abort to the children, without waiting for the transition to finish
+        """
+        transition_executing = self.transition_lock.locked()
+        if transition_executing:
+            self.abort_event.set()
+            self.stateful_node.abort_transition()
+
+        response_children = self.propagate_to_list(
+            'abort',
+            command_data = None,
+            token = token,
+            node_to_execute = self.children_nodes,
+        )
+
+        resp = PlainText(text = f'{self.name} aborted' if transition_executing else f'{self.name} was not executing any transition')
+
+        return Response (
+            name = self.name,
+            token = token,
+            data = pack_to_any(resp),
+            flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+            children = response_children,
+        )
+
+
+    # ORDER MATTERS!
+    @broadcasted # outer most wrapper 1st step
+    @authentified_and_authorised(
+        action=ActionType.UPDATE,
+        system=SystemType.CONTROLLER
+    ) # 2nd step
+    @in_control # 3rd step
+    @not_during_transition # 4th step
+    @unpack_request_data_to(pass_token=True) # 5th step
     def include(self, token:Token) -> PlainText:
         response_children = self.propagate_to_list('include', command_data=None, token=token, node_to_execute=self.children_nodes)
         self.stateful_node.include_node()
@@ -706,6 +842,7 @@ class Controller(ControllerServicer):
         system=SystemType.CONTROLLER
     ) # 2nd step
     @in_control
+    @not_during_transition
     @unpack_request_data_to(pass_token=True) # 3rd step
     def exclude(self, token:Token) -> Response:
         response_children = self.propagate_to_list('exclude', command_data=None, token=token, node_to_execute=self.children_nodes)
@@ -731,7 +868,8 @@ class Controller(ControllerServicer):
         action=ActionType.UPDATE,
         system=SystemType.CONTROLLER
     ) # 2nd step
-    @unpack_request_data_to(pass_token=True) # 3rd step
+    @not_during_transition # 3rd step
+    @unpack_request_data_to(pass_token=True) # 4th step
     def take_control(self, token:Token) -> PlainText:
         if self.actor.take_control(token) != 0:
             return Response(
@@ -776,7 +914,8 @@ class Controller(ControllerServicer):
         system=SystemType.CONTROLLER
     ) # 2nd step
     @in_control # 3rd step
-    @unpack_request_data_to(pass_token=True) # 4th step
+    @not_during_transition # 4th step
+    @unpack_request_data_to(pass_token=True) # 5th step
     def surrender_control(self, token:Token) -> PlainText:
         user = self.actor.get_user_name()
         if self.actor.surrender_control(token) != 0:
@@ -16,7 +16,8 @@ class ControllerDriver(GRPCDriver):
 
     def create_stub(self, channel):
         from druncschema.controller_pb2_grpc import ControllerStub
-        return ControllerStub(channel)
+        from drunc.controller.utils import add_abort_to_stub
+        return add_abort_to_stub(ControllerStub(channel), channel)
 
     def describe(self) -> DecodedResponse:
         return self.send_command('describe', outformat = Description)
@@ -42,6 +43,9 @@ class ControllerDriver(GRPCDriver):
         from druncschema.controller_pb2 import FSMCommandResponse
         return self.send_command('execute_fsm_command', data = arguments, outformat = FSMCommandResponse)
 
+    def abort(self) -> DecodedResponse:
+        return self.send_command('abort', outformat = PlainText)
+
     def include(self, arguments) -> DecodedResponse:
         return self.send_command('include', data = arguments, outformat = PlainText)
 
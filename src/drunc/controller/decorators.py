@@ -24,4 +24,24 @@ def in_control(cmd):
 
         return cmd(obj, request)
 
-    return wrap
\ No newline at end of file
+    return wrap
+
+
+def not_during_transition(cmd):
+    '''
+    For the commands changing the state of the node: they are rejected while a transition is executing, as only
+    abort is meant to be served alongside a transition
+    '''
+    from functools import wraps
+
+    @wraps(cmd)
+    def wrap(obj, request):
+        if not obj.transition_lock.acquire(blocking=False):
+            from drunc.controller.stateful_node import TransitionExecuting
+            raise TransitionExecuting()
+        try:
+            return cmd(obj, request)
+        finally:
+            obj.transition_lock.release()
+
+    return wrap
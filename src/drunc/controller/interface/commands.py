@@ -82,6 +82,25 @@ def who_is_in_charge(obj:ControllerContext) -> None:
     if who:
         obj.print(who.text)
 
+@click.command('abort')
+@click.pass_obj
+def abort(obj:ControllerContext) -> None:
+    result = obj.get_driver('controller').abort()
+    if not result: return
+
+    from druncschema.generic_pb2 import PlainText
+    def print_result(response, prefix=''):
+        if response is None: return
+        if isinstance(response.data, PlainText):
+            obj.print(f'{prefix}{response.data.text}')
+        for child_response in response.children:
+            print_result(child_response, prefix+'  ')
+
+    print_result(result)
+
+    from drunc.controller.interface.shell_utils import print_status_table
+    print_status_table(obj, obj.get_driver('controller').status(), obj.get_driver('controller').describe())
+
 @click.command('include')
 @click.pass_obj
 def include(obj:ControllerContext) -> None:
@@ -5,6 +5,8 @@ from typing import Mapping
 class ControllerContext(ShellContext): # boilerplatefest
     status_receiver = None
     took_control = False
+    fsm_schema = None
+    fsm_state = None # FSM state of the controller when the shell last saw it
 
     def reset(self, address:str=None):
         self.address = address
@@ -52,9 +52,13 @@ def controller_cli(configuration:str, command_facility:str, name:str, session:st
     def serve(listen_addr:str) -> None:
         import grpc
         from concurrent import futures
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+        # Transitions are executed one at a time, the second worker is there so that abort (and the read-only commands) can be
+        # served while a transition is executing; the other commands changing the state of the node are rejected until it is over
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
 
         add_ControllerServicer_to_server(ctrlr, server)
+        from drunc.controller.utils import add_abort_handler_to_server
+        add_abort_handler_to_server(ctrlr, server)
         port = server.add_insecure_port(listen_addr)
 
         server.start()
@@ -21,10 +21,11 @@ def controller_shell(ctx, controller_address:str, log_level:str) -> None:
     ctx.call_on_close(controller_cleanup_wrapper(ctx.obj))
     controller_desc = controller_setup(ctx.obj, controller_address)
 
-    transitions = ctx.obj.get_driver('controller').describe_fsm(key="all-transitions").data
+    from drunc.controller.interface.shell_utils import get_fsm_schema
+    transitions = get_fsm_schema(ctx.obj)
 
     from drunc.controller.interface.commands import (
-        describe, status, connect, take_control, surrender_control, who_am_i, who_is_in_charge, include, exclude, wait
+        describe, status, connect, take_control, surrender_control, who_am_i, who_is_in_charge, include, exclude, wait, abort
     )
 
     ctx.command.add_command(describe, 'describe')
@@ -39,3 +40,4 @@ def controller_shell(ctx, controller_address:str, log_level:str) -> None:
     ctx.command.add_command(include, 'include')
     ctx.command.add_command(exclude, 'exclude')
     ctx.command.add_command(wait, 'wait')
+    ctx.command.add_command(abort, 'abort')
@@ -37,6 +37,8 @@ def print_status_table(obj, statuses:DecodedResponse, descriptions:DecodedRespon
         obj.print(f'Could not get the status of the controller, got a \'{data_type}\' instead')
         return
 
+    fsm_state_seen(obj, statuses.data.state)
+
     from drunc.controller.interface.shell_utils import format_bool
     from rich.table import Table
 
@@ -153,6 +155,10 @@ def controller_setup(ctx, controller_address):
 
     log.debug('Connected to the controller')
 
+    # new connection, the FSM description will be fetched again on the first command
+    ctx.fsm_schema = None
+    ctx.fsm_state = None
+
     # children = ctx.get_driver('controller').ls().data
     # ctx.print(f'{desc.name}.{desc.session}\'s children :family:: {children.text}')
 
@@ -311,18 +317,105 @@ def tree_prefix(i, n):
         return next
 
 
+def get_transition_timing(response) -> dict:
+    '''
+    Extracts the timing breakdown packed by the controllers in their FSMCommandResponse
+    Returns an empty dict if the node did not provide one (applications, failed commands)
+    '''
+    from druncschema.controller_pb2 import FSMCommandResponse
+    from google.protobuf.struct_pb2 import Struct
+    from google.protobuf.json_format import MessageToDict
+
+    if not isinstance(response.data, FSMCommandResponse):
+        return {}
+    if not response.data.HasField('data') or not response.data.data.Is(Struct.DESCRIPTOR):
+        return {}
+
+    from drunc.utils.grpc_utils import unpack_any
+    return MessageToDict(unpack_any(response.data.data, Struct))
+
+
+def print_transition_timing(obj, result, transition_name):
+    from rich.table import Table
+    t = Table(title=f'{transition_name} timing (seconds)')
+    t.add_column('Name')
+    t.add_column('Total', justify='right')
+    t.add_column('Pre-transition')
+    t.add_column('Propagation', justify='right')
+    t.add_column('Post-transition')
+
+    def format_time(seconds):
+        return f'{seconds:.3f}' if seconds is not None else ''
+
+    def format_actions(step_time, actions):
+        if step_time is None:
+            return ''
+        text = format_time(step_time)
+        for action, seconds in actions.items():
+            text += f'\n  {action}: {format_time(seconds)}'
+        return text
+
+    def add_to_table(table, response, parent_timing, prefix=''):
+        timing = get_transition_timing(response)
+        # nodes without a breakdown (e.g. applications) are reported with the round trip seen by their parent
+        total = timing.get('total', parent_timing.get('children', {}).get(response.name))
+        table.add_row(
+            prefix+response.name,
+            format_time(total),
+            format_actions(timing.get('preparing'), timing.get('pre_transition', {})),
+            format_time(timing.get('propagating')),
+            format_actions(timing.get('finalising'), timing.get('post_transition', {})),
+        )
+        for child_response in response.children:
+            if child_response is None:
+                continue
+            add_to_table(table, child_response, timing, "  "+prefix)
+
+    if not get_transition_timing(result):
+        return
+
+    add_to_table(t, result, {})
+    obj.print(t)
+
+
+def fsm_state_seen(obj, state:str) -> None:
+    '''
+    Called with the FSM state of the controller whenever the shell gets it: the cached FSM description is dropped
+    when the state changed, as the controller cannot tell whether its FSM changed with it
+    '''
+    if state != obj.fsm_state:
+        log.debug(f'FSM state changed from {obj.fsm_state} to {state}, the FSM description will be fetched again')
+        obj.fsm_state = state
+        obj.fsm_schema = None
+
+
+def get_fsm_schema(obj, refresh=False):
+    '''
+    Returns the description of all the FSM transitions (and their arguments) of the controller.
+    It is fetched once per connection, again when refresh is True, and after the shell saw the FSM state change
+    (see fsm_state_seen).
+    '''
+    if obj.fsm_schema is not None and not refresh:
+        return obj.fsm_schema
+
+    log.debug('Fetching the FSM description')
+    obj.fsm_schema = obj.get_driver('controller').describe_fsm('all-transitions').data
+    return obj.fsm_schema
+
+
 def run_one_fsm_command(controller_name, transition_name, obj, **kwargs):
     obj.print(f"Running transition \'{transition_name}\' on controller \'{controller_name}\'")
     from druncschema.controller_pb2 import FSMCommand
 
-    fsm_description = obj.get_driver('controller').describe_fsm().data
-
     from drunc.controller.interface.shell_utils import search_fsm_command, validate_and_format_fsm_arguments, ArgumentException
 
-    command_desc = search_fsm_command(transition_name, fsm_description.commands)
+    command_desc = search_fsm_command(transition_name, get_fsm_schema(obj).commands)
+
+    if command_desc is None: # maybe the FSM changed since we fetched it
+        command_desc = search_fsm_command(transition_name, get_fsm_schema(obj, refresh=True).commands)
 
     if command_desc is None:
-        obj.error(f'Command "{transition_name}" does not exist, or is not accessible right now')
+        obj.error(f'Command "{transition_name}" does not exist')
         return
 
     try:
@@ -341,6 +434,15 @@ def run_one_fsm_command(controller_name, transition_name, obj, **kwargs):
     if not result: return
 
     from druncschema.controller_pb2 import FSMResponseFlag
+    from druncschema.request_response_pb2 import ResponseFlag
+
+    if result.flag != ResponseFlag.EXECUTED_SUCCESSFULLY:
+        # the arguments were validated against our cached FSM description, check it is still current
+        get_fsm_schema(obj, refresh=True)
+
+    elif result.data.flag == FSMResponseFlag.FSM_INVALID_TRANSITION:
+        obj.error(f'Command "{transition_name}" is not accessible right now')
+        return
 
     from rich.table import Table
     t = Table(title=f'{transition_name} execution report')
@@ -369,6 +471,8 @@ def run_one_fsm_command(controller_name, transition_name, obj, **kwargs):
     add_to_table(t, result)
     obj.print(t)
 
+    print_transition_timing(obj, result, transition_name)
+
     statuses = obj.get_driver('controller').status()
     descriptions = obj.get_driver('controller').describe()
 
@@ -117,12 +117,29 @@ class StatefulNode(abc.ABC):
             initial_value = False
         )
 
+        # Wall time (in seconds) of each sub-state step of the last transition, and of its pre and post transition actions
+        self.__transition_timing = {}
+        self.__step_start = None
+
     def get_node_operational_state(self):
         return self.__operational_state.value
 
     def get_node_operational_sub_state(self):
         return self.__operational_sub_state.value
 
+    def get_transition_timing(self) -> dict:
+        return dict(self.__transition_timing)
+
+    def __start_step(self):
+        from time import perf_counter
+        self.__step_start = perf_counter()
+
+    def __end_step(self, step):
+        from time import perf_counter
+        if self.__step_start is not None:
+            self.__transition_timing[step] = perf_counter() - self.__step_start
+        self.__step_start = None
+
     def get_fsm_transitions(self):
         r = self.__fsm.get_executable_transitions(self.get_node_operational_state())
         return r
@@ -175,14 +192,18 @@ class StatefulNode(abc.ABC):
             raise fsme.InvalidTransition(transition, self.get_node_operational_state())
 
         self.__operational_sub_state.value = f'preparing-{transition.name}'
+        self.__transition_timing = {'pre_transition': {}}
+        self.__start_step()
 
         transition_data = self.__fsm.prepare_transition(
             transition,
             transition_data,
             transition_args,
             ctx,
+            self.__transition_timing['pre_transition'],
         )
 
+        self.__end_step('preparing')
         self.__operational_sub_state.value = f'{transition.name}-ready'
 
         return transition_data
@@ -193,6 +214,7 @@ class StatefulNode(abc.ABC):
             raise InvalidSubTransition(self.get_node_operational_sub_state(), f'{transition.name}-ready', 'propagate_transition')
 
         self.__operational_sub_state.value = f'propagating-{transition.name}'
+        self.__start_step()
 
 
     def finish_propagating_transition_mark(self, transition):
@@ -200,6 +222,7 @@ class StatefulNode(abc.ABC):
         if self.get_node_operational_sub_state() != f'propagating-{transition.name}':
             raise InvalidSubTransition(self.get_node_operational_sub_state(), f'propagating-{transition.name}', 'finish_propagating_transition')
 
+        self.__end_step('propagating')
         self.__operational_sub_state.value = f'{transition.name}-propagated'
 
 
@@ -209,6 +232,7 @@ class StatefulNode(abc.ABC):
             raise InvalidSubTransition(self.get_node_operational_sub_state(), f'{transition.name}-propagated', 'start_transition')
 
         self.__operational_sub_state.value = f'executing-{transition.name}'
+        self.__start_step()
 
 
     def terminate_transition_mark(self, transition):
@@ -216,22 +240,36 @@ class StatefulNode(abc.ABC):
         if self.get_node_operational_sub_state() != f'executing-{transition.name}':
             raise InvalidSubTransition(self.get_node_operational_sub_state(), f'executing-{transition.name}', 'terminate_transition')
 
+        self.__end_step('executing')
         self.__operational_sub_state.value = f'{transition.name}-terminated'
         self.__operational_state.value = self.__fsm.get_destination_state(self.__operational_state.value, transition)
 
 
+    def abort_transition(self):
+        '''
+        Marks the transition being executed as aborted, and puts the node in error
+        '''
+        self.logger.error(f'Aborting the transition (sub-state \'{self.get_node_operational_sub_state()}\')')
+        self.__operational_sub_state.value = 'aborted'
+        self.to_error()
+
+
     def finalise_transition(self, transition, transition_data, transition_args, ctx=None):
 
         if self.get_node_operational_sub_state() != f'{transition.name}-terminated':
             raise InvalidSubTransition(self.get_node_operational_sub_state(), f'{transition.name}-terminated', 'finalise_transition')
 
         self.__operational_sub_state.value = f'finalising-{transition.name}'
+        self.__transition_timing['post_transition'] = {}
+        self.__start_step()
         transition_data = self.__fsm.finalise_transition(
             transition,
             transition_data,
             transition_args,
             ctx,
+            self.__transition_timing['post_transition'],
         )
+        self.__end_step('finalising')
         self.__operational_sub_state.value = self.__operational_state.value
 
         return transition_data
\ No newline at end of file
@@ -105,4 +105,36 @@ def get_segment_lookup_timeout(segment_conf, base_timeout=60):
         return max_recursion
 
     recursion_count = recurse_segment(segment_conf, 1)
-    return base_timeout * recursion_count
\ No newline at end of file
+    return base_timeout * recursion_count
+
+# The abort command is not part of the Controller service of druncschema,
+# so it is served by a generic handler, reusing the Request and Response messages
+ABORT_SERVICE = 'drunc.ControllerAbort'
+ABORT_METHOD = 'abort'
+
+def add_abort_handler_to_server(controller, server) -> None:
+    import grpc
+    from druncschema.request_response_pb2 import Response
+    handler = grpc.method_handlers_generic_handler(
+        ABORT_SERVICE,
+        {
+            ABORT_METHOD: grpc.unary_unary_rpc_method_handler(
+                controller.abort,
+                request_deserializer = Request.FromString,
+                response_serializer = Response.SerializeToString,
+            )
+        }
+    )
+    server.add_generic_rpc_handlers((handler,))
+
+def add_abort_to_stub(stub, channel):
+    '''
+    Adds the abort command to a ControllerStub, so it can be used like the other commands (i.e. with send_command)
+    '''
+    from druncschema.request_response_pb2 import Response
+    stub.abort = channel.unary_unary(
+        f'/{ABORT_SERVICE}/{ABORT_METHOD}',
+        request_serializer = Request.SerializeToString,
+        response_deserializer = Response.FromString,
+    )
+    return stub
@@ -5,7 +5,7 @@ from drunc.exceptions import DruncSetupException
 
 import conffwk
 import getpass
-from sh import ssh, ErrorReturnCode, Command
+from sh import ErrorReturnCode, TimeoutException, Command
 
 
 class ThreadPinning(FSMAction):
@@ -17,59 +17,149 @@ class ThreadPinning(FSMAction):
         self.log = logging.getLogger("thread-pinning")
         self.conf_dict = {p.name: p.value for p in configuration.parameters}
 
-    def pin_thread(self, thread_pinning_file, configuration, session):
-        from drunc.process_manager.oks_parser import collect_apps
-        db = conffwk.Configuration(f"oksconflibs:{configuration}")
-        session_dal = db.get_dal(class_name="Session", uid=session)
-
-        from os import environ
-
-        apps = collect_apps(db, session_dal, session_dal.segment, environ)
-
-        if session_dal.rte_script:
-            rte = session_dal.rte_script
-
-        else:
-            from drunc.process_manager.utils import get_rte_script
-            rte_script = get_rte_script()
-            if not rte_script:
-                raise DruncSetupException("No RTE script found.")
+        # How many hosts get pinned at the same time, and how long we wait for each of them
+        self.max_concurrent_hosts = int(self.conf_dict.get('max_concurrent_hosts', 16))
+        self.host_timeout = float(self.conf_dict.get('host_timeout', 60))
+
+        # dict[(configuration, session), (hash of the configuration files, rte, hosts)]
+        self._topology_cache = {}
+        from threading import Lock
+        self._topology_cache_lock = Lock()
+
+        self.ssh = Command('/usr/bin/ssh')
+
+        # Pinning happens at every conf/start, so optionally (like ssh_multiplexing of the ssh process manager) the
+        # connections to the hosts are kept open in between
+        self.ssh_masters = None
+        if str(self.conf_dict.get('ssh_multiplexing', False)).lower() in ['true', '1', 'yes']:
+            from drunc.utils.ssh_utils import SSHControlMasters
+            self.ssh_masters = SSHControlMasters()
+            import atexit
+            atexit.register(self.ssh_masters.close)
+
+        # Optionally, the RTE script is sourced once per host, and its environment reused by the next pinnings
+        self.rte_snapshots = None
+        if str(self.conf_dict.get('rte_snapshot', False)).lower() in ['true', '1', 'yes']:
+            from drunc.process_manager.rte_snapshot import RTESnapshots
+            self.rte_snapshots = RTESnapshots(ssh_masters=self.ssh_masters, timeout=self.host_timeout)
+
+
+    def _get_rte_and_hosts(self, configuration, session):
+        '''
+        Returns the RTE script and the set of hosts running the applications of the session.
+        Parsing the whole OKS database is expensive, so this is cached per (configuration, session),
+        and invalidated if the configuration file or any file it includes gets modified.
+        '''
+        # Same hash as the boot plans, over the content of all the configuration files
+        from drunc.process_manager.boot_plan import boot_plan_key
+        configuration_hash = boot_plan_key(configuration, session, '')
+        key = (configuration, session)
+
+        with self._topology_cache_lock:
+            cached = self._topology_cache.get(key)
+            if cached is not None and cached[0] == configuration_hash:
+                self.log.debug(f'Using the cached host list for session \'{session}\'')
+                return cached[1], cached[2]
+
+            from drunc.process_manager.oks_parser import collect_apps
+            db = conffwk.Configuration(f"oksconflibs:{configuration}")
+            session_dal = db.get_dal(class_name="Session", uid=session)
+
+            from os import environ
+
+            apps = collect_apps(db, session_dal, session_dal.segment, environ)
+
+            if session_dal.rte_script:
+                rte = session_dal.rte_script
+
+            else:
+                from drunc.process_manager.utils import get_rte_script
+                rte_script = get_rte_script()
+                if not rte_script:
+                    raise DruncSetupException("No RTE script found.")
+
+                rte = rte_script
+
+            hosts = frozenset(app["host"] for app in apps)
+            self._topology_cache[key] = (configuration_hash, rte, hosts)
+            return rte, hosts
+
+
+    def _pin_host(self, host, user, rte, cmd, thread_pinning_file) -> dict:
+        from time import perf_counter
+        user_host = user+"@"+host
+        if rte and self.rte_snapshots is not None:
+            import os
+            cmd = f"{self.rte_snapshots.source_command(user_host, rte, os.environ)}; {cmd}"
+        elif rte:
+            cmd = f"source {rte}; {cmd}"
+        result = {
+            'host': host,
+            'success': False,
+            'duration': 0.,
+            'error': '',
+        }
+        self.log.info(f"Applying thread pinning {cmd} file {thread_pinning_file} on {host}")
+        start = perf_counter()
+
+        try:
+            from contextlib import nullcontext
+            session = self.ssh_masters.session(user_host) if self.ssh_masters is not None else nullcontext([])
+            with session as options:
+                arguments = [user_host, "-tt", "-o StrictHostKeyChecking=no", *options, f'{{ {cmd} ; }}']
+                proc = self.ssh(*arguments, _timeout=self.host_timeout)
+            self.log.debug(proc)
+            result['success'] = True
+        except TimeoutException:
+            result['error'] = f'timed out after {self.host_timeout}s'
+            self.log.error(f'Thread pinning on {host} {result["error"]}')
+        except ErrorReturnCode as e:
+            self.log.error(e.stdout.decode('ascii'))
+            self.log.error(e.stderr.decode('ascii'))
+            result['error'] = e.stderr.decode('ascii')
+        except Exception as e:
+            self.log.critical(str(e))
+            result['error'] = str(e)
+
+        result['duration'] = perf_counter() - start
+        return result
+
+
+    @staticmethod
+    def format_results(results:list) -> str:
+        host_width = max([len('host')] + [len(r['host']) for r in results])
+        lines = [f'{"host":<{host_width}}  {"result":<7}  {"time":>8}  error']
+        for r in results:
+            status = 'success' if r['success'] else 'failed'
+            lines.append(f'{r["host"]:<{host_width}}  {status:<7}  {r["duration"]:>7.2f}s  {r["error"].strip()}')
+        return "\n".join(lines)
+
+
+    def pin_thread(self, thread_pinning_file, configuration, session) -> list:
+        rte, hosts = self._get_rte_and_hosts(configuration, session)
+
+        cmd = f"readout-affinity.py --pinfile {thread_pinning_file}"
+        self.log.info(f"Executing '{cmd}' (with the environment of {rte}) on {len(hosts)} hosts" if rte else f"Executing '{cmd}' on {len(hosts)} hosts")
 
-            rte = rte_script
+        user = getpass.getuser()
 
-        cmd = f"source {rte}; " if rte else ""
-        cmd += f"readout-affinity.py --pinfile {thread_pinning_file}"
+        if not hosts:
+            return []
 
-        user = getpass.getuser()
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_hosts, len(hosts))) as executor:
+            results = list(executor.map(
+                lambda host: self._pin_host(host, user, rte, cmd, thread_pinning_file),
+                sorted(hosts)
+            ))
 
-        hosts = set()
-        for app in apps:
-            hosts.add(app["host"])
-
-        my_ssh = Command('/usr/bin/ssh')
-
-        failed_hosts = set()
-
-        for host in hosts:
-            arguments = [user+"@"+host, "-tt", "-o StrictHostKeyChecking=no", f'{{ {cmd} ; }}']
-            try:
-                self.log.info(f"Executing '{cmd}'")
-                self.log.info(f"Applying thread pinning {cmd} file {thread_pinning_file} on {host}")
-                proc = my_ssh(*arguments)
-            except ErrorReturnCode as e:
-                self.log.error(e.stdout.decode('ascii'))
-                self.log.error(e.stderr.decode('ascii'))
-                failed_hosts.add(f'{host}: {e.stderr.decode("ascii")}')
-                continue
-            except Exception as e:
-                self.log.critical(str(e))
-                failed_hosts.add(f'{host}: {e}')
-                continue
-            self.log.debug(proc)
+        self.log.info(f'Thread pinning with {thread_pinning_file}:\n{self.format_results(results)}')
 
-        failed_hosts_error_str = ", ".join(failed_hosts)
+        failed_hosts = [f'{r["host"]}: {r["error"]}' for r in results if not r['success']]
         if failed_hosts:
-            raise ThreadPinningFailed(failed_hosts_error_str)
+            raise ThreadPinningFailed(", ".join(failed_hosts))
+
+        return results
 
     def post_conf(self, _input_data, _context, **kwargs):
         run_configuration = find_configuration(_context.configuration.initial_data)
@@ -87,4 +177,4 @@ class ThreadPinning(FSMAction):
         run_configuration = find_configuration(_context.configuration.initial_data)
         if 'pre_conf' in self.conf_dict:
             self.pin_thread(self.conf_dict['pre_conf'], run_configuration, session=_context.session)
-        return _input_data
\ No newline at end of file
+        return _input_data
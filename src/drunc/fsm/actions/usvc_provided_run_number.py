@@ -19,18 +19,108 @@ class UsvcProvidedRunNumber(FSMAction):
 
         self.timeout = 0.5
 
+        # In lease mode, the next run number is reserved in the background after conf and after stop,
+        # so that start does not have to wait for the microservice
+        self.lease_enabled = dotdrunc["run_number_configuration"].get("lease", False)
+        self.lease_retries = dotdrunc["run_number_configuration"].get("lease_retries", 5)
+        self._lease = None
+        self._lease_thread = None
+        # Bumped by each start, a reservation only stores its run number if no start happened since it was
+        # requested: a late one would hand out a run number older than the one start requested itself
+        self._lease_generation = 0
+        self._lease_thread_generation = None
+        from threading import Lock
+        self._lease_lock = Lock()
+
         import logging
         self._log = logging.getLogger('microservice')
 
+    def post_conf(self, _input_data:dict, _context, **kwargs):
+        self._reserve_run_number()
+        return _input_data
+
+    def post_stop(self, _input_data:dict, _context, **kwargs):
+        self._reserve_run_number()
+        return _input_data
+
     def pre_start(self, _input_data:dict, _context, run_type:str="TEST", disable_data_storage:bool=False, trigger_rate:float=0., **kwargs):
         from drunc.fsm.actions.utils import validate_run_type
         run_type = validate_run_type(run_type.upper())
         _input_data['production_vs_test'] = run_type
-        _input_data["run"] = self._getnew_run_number()
+        _input_data["run"] = self._consume_lease()
         _input_data['disable_data_storage'] = disable_data_storage
         _input_data['trigger_rate'] = trigger_rate
         return _input_data
 
+    def _reserve_run_number(self):
+        if not self.lease_enabled:
+            return
+
+        with self._lease_lock:
+            if self._lease is not None:
+                self._log.debug(f'Run number {self._lease} is already reserved')
+                return
+            if self._lease_thread is not None and self._lease_thread.is_alive() and self._lease_thread_generation == self._lease_generation:
+                return
+
+            from threading import Thread
+            self._lease_thread = Thread(
+                target = self._lease_worker,
+                args = (self._lease_generation,),
+                name = 'run-number-lease',
+                daemon = True,
+            )
+            self._lease_thread_generation = self._lease_generation
+            self._lease_thread.start()
+
+    def _lease_cancelled(self, generation:int) -> bool:
+        with self._lease_lock:
+            return generation != self._lease_generation
+
+    def _lease_worker(self, generation:int):
+        from time import sleep
+        backoff = self.timeout
+        for attempt in range(self.lease_retries):
+            if self._lease_cancelled(generation):
+                return
+            try:
+                run = self._getnew_run_number()
+            except CannotGetRunNumber:
+                self._log.warning(f'Could not reserve a run number (attempt {attempt+1}/{self.lease_retries}), retrying in {backoff}s')
+                sleep(backoff)
+                backoff *= 2
+                continue
+
+            with self._lease_lock:
+                if generation != self._lease_generation:
+                    self._log.warning(f'Run number {run} was reserved after start requested its own, it will not be used')
+                    return
+                self._lease = run
+            self._log.info(f'Reserved run number {run}')
+            return
+
+        self._log.error(f'Could not reserve a run number after {self.lease_retries} attempts, the next start will request one')
+
+    def _consume_lease(self):
+        if not self.lease_enabled:
+            return self._getnew_run_number()
+
+        thread = self._lease_thread
+        if thread is not None and thread.is_alive():
+            # A reservation is in flight, give it the same time a synchronous request would get
+            thread.join(timeout=self.timeout)
+
+        with self._lease_lock:
+            run, self._lease = self._lease, None
+            self._lease_generation += 1 # a reservation still in flight is too late for this start, and for the next ones
+
+        if run is None:
+            self._log.info('No reserved run number, requesting one')
+            return self._getnew_run_number()
+
+        self.run = run
+        return run
+
     def _getnew_run_number(self):
         try:
             req = requests.get(self.API_SOCKET+"/runnumber/getnew",
@@ -47,8 +47,13 @@ class PreOrPostTransitionSequence:
         return ', '.join([f'{cb.method.__name__} (mandatory={cb.mandatory})'for cb in self.sequence])
 
 
-    def execute(self, transition_data, transition_args, ctx=None):
+    def execute(self, transition_data, transition_args, ctx=None, timings=None):
+        '''
+        Executes all the callbacks of the sequence
+        If a timings dict is provided, it is filled with the wall time (in seconds) taken by each action
+        '''
         self._log.debug(f'{transition_data=}, {transition_args=}')
+        from time import perf_counter
         import json
         if not transition_data:
             transition_data = '{}'
@@ -63,7 +68,12 @@ class PreOrPostTransitionSequence:
             try:
                 self._log.debug(f'data before callback: {input_data}')
                 self._log.info(f'executing the callback: {callback.method.__name__} from {callback.method.__module__}')
-                input_data = callback.method(_input_data=input_data, _context=ctx, **transition_args)
+                start = perf_counter()
+                try:
+                    input_data = callback.method(_input_data=input_data, _context=ctx, **transition_args)
+                finally:
+                    if timings is not None:
+                        timings[callback.method.__self__.name] = perf_counter() - start
                 self._log.debug(f'data after callback: {input_data}')
                 from drunc.fsm.exceptions import InvalidDataReturnByFSMAction
                 try:
@@ -241,19 +251,21 @@ class FSM:
         return regex_match(transition.source, source_state)
 
 
-    def prepare_transition(self, transition, transition_data, transition_args, ctx=None):
+    def prepare_transition(self, transition, transition_data, transition_args, ctx=None, timings=None):
         transition_data = self.pre_transition_sequences[transition].execute(
             transition_data,
             transition_args,
-            ctx
+            ctx,
+            timings,
         )
         return transition_data
 
 
-    def finalise_transition(self, transition, transition_data, transition_args, ctx=None):
+    def finalise_transition(self, transition, transition_data, transition_args, ctx=None, timings=None):
         transition_data = self.post_transition_sequences[transition].execute(
             transition_data,
             transition_args,
-            ctx
+            ctx,
+            timings,
         )
         return transition_data
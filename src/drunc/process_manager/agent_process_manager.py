@@ -0,0 +1,477 @@
+from druncschema.process_manager_pb2 import BootRequest, ProcessQuery, ProcessUUID, ProcessInstance, ProcessInstanceList, ProcessDescription, ProcessRestriction, LogRequest, LogLine
+from drunc.exceptions import DruncCommandException
+from drunc.process_manager.process_manager import ProcessManager
+
+import logging
+import threading
+
+
+class AgentUnreachable(DruncCommandException):
+    def __init__(self, host, address, details):
+        from google.rpc import code_pb2
+        super().__init__(f'Could not reach the process manager agent of {host} at {address}: {details}', code_pb2.UNAVAILABLE)
+
+
+class AgentCommandFailed(DruncCommandException):
+    def __init__(self, command, address, error):
+        super().__init__(f'Command \'{command}\' failed on the process manager agent at {address}: {error}')
+
+
+class AgentProcess:
+    '''
+    What the central process manager knows of a process booted by an agent, so that it can answer without asking the
+    agent (flush, the index of the processes). The status is kept up to date by the watch stream of the agent, and by ps.
+    '''
+    def __init__(self, agent, alive:bool, exit_code=None):
+        self.agent = agent
+        self.alive = alive
+        self.exit_code = exit_code
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def update(self, pi:ProcessInstance) -> None:
+        self.alive = pi.status_code == ProcessInstance.StatusCode.RUNNING
+        if not self.alive and pi.HasField('return_code'):
+            self.exit_code = pi.return_code
+
+
+class Agent:
+    '''
+    Client of the process manager agent of a host: a process manager running there (usually the ssh one, which
+    spawns the local processes directly), serving the usual process manager commands for its processes.
+
+    The commands are sent with a blocking channel (they are run in the threads of the central process manager), the
+    log streams with an asyncio one. Once started, a thread follows the watch stream of the agent, and calls
+    on_event(agent, event, process_instance) for each change, reconnecting if the agent goes away.
+    '''
+    def __init__(self, host:str, address:str, token, timeout:float, on_event):
+        import grpc
+        from druncschema.process_manager_pb2_grpc import ProcessManagerStub
+        from drunc.process_manager.utils import add_extension_commands_to_stub
+        self.log = logging.getLogger(f'agent.{host}')
+        self.host = host
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+        self.on_event = on_event
+
+        channel = grpc.insecure_channel(address)
+        self.stub = add_extension_commands_to_stub(ProcessManagerStub(channel), channel)
+        self._channel = channel
+        self._aio_stub = None
+
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watch_call = None
+        self._stop = threading.Event()
+
+
+    def _request(self, data=None):
+        from druncschema.request_response_pb2 import Request
+        from drunc.utils.grpc_utils import pack_to_any
+        if data is None:
+            return Request(token = self.token)
+        return Request(token = self.token, data = pack_to_any(data))
+
+
+    def _decode(self, command:str, response, outformat):
+        from druncschema.request_response_pb2 import ResponseFlag
+        from drunc.utils.grpc_utils import unpack_any
+        if response.flag == ResponseFlag.EXECUTED_SUCCESSFULLY:
+            return unpack_any(response.data, outformat)
+
+        error = ResponseFlag.Name(response.flag)
+        from druncschema.generic_pb2 import Stacktrace, PlainText
+        if response.data.Is(Stacktrace.DESCRIPTOR):
+            lines = [l for l in unpack_any(response.data, Stacktrace).text if l]
+            if lines:
+                error = lines[-1]
+        elif response.data.Is(PlainText.DESCRIPTOR):
+            error = unpack_any(response.data, PlainText).text
+        raise AgentCommandFailed(command, self.address, error)
+
+
+    def command(self, command:str, data, outformat):
+        import grpc
+        try:
+            response = getattr(self.stub, command)(self._request(data), timeout=self.timeout)
+        except grpc.RpcError as e:
+            if e.code() in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED):
+                raise AgentUnreachable(self.host, self.address, e.details()) from e
+            raise AgentCommandFailed(command, self.address, e.details()) from e
+        return self._decode(command, response, outformat)
+
+
+    async def read_logs(self, options):
+        '''
+        Yields the LogLines of read_logs on the agent (options being packed with pack_log_options)
+        '''
+        import grpc
+        if self._aio_stub is None:
+            from druncschema.process_manager_pb2_grpc import ProcessManagerStub
+            from drunc.process_manager.utils import add_extension_commands_to_stub
+            channel = grpc.aio.insecure_channel(self.address)
+            self._aio_stub = add_extension_commands_to_stub(ProcessManagerStub(channel), channel)
+        try:
+            async for response in self._aio_stub.read_logs(self._request(options)):
+                yield self._decode('read_logs', response, LogLine)
+        except grpc.aio.AioRpcError as e:
+            raise AgentUnreachable(self.host, self.address, e.details()) from e
+
+
+    def start_watching(self) -> None:
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name=f'agent_watch_{self.host}', daemon=True)
+            self._watcher.start()
+
+
+    def _watch(self) -> None:
+        import grpc
+        from google.protobuf.struct_pb2 import Struct
+        from drunc.process_manager.utils import unpack_process_event
+        query = ProcessQuery(names=['.*'])
+        retry_wait = 1.
+        while not self._stop.is_set():
+            try:
+                self._watch_call = self.stub.watch(self._request(query))
+                for response in self._watch_call:
+                    retry_wait = 1.
+                    event, pi = unpack_process_event(self._decode('watch', response, Struct))
+                    self.on_event(self, event, pi)
+            except grpc.RpcError as e:
+                if self._stop.is_set():
+                    return
+                self.log.debug(f'Lost the watch stream of the agent at {self.address}: {e.details()}')
+            except Exception as e:
+                self.log.error(f'Could not follow the changes of the processes on the agent at {self.address}: {str(e)}')
+            self._stop.wait(retry_wait)
+            retry_wait = min(2*retry_wait, 30.)
+
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._watch_call is not None:
+            self._watch_call.cancel()
+        self._channel.close()
+
+
+class AgentProcessManager(ProcessManager):
+    '''
+    Central process manager of the agent mode: a process manager agent runs on each host, and boots, kills, samples
+    the processes there and reads their logs locally. This one only routes the commands to the agents, by the allowed
+    hosts of the boot requests (in order, until one of the agents boots the process) and the host of the processes,
+    so that it holds one connection per host instead of one ssh session per process.
+
+    The agents are reached at the address given for their host in the configuration (agents), or on agent_port of the
+    host otherwise.
+    '''
+    def __init__(self, configuration, **kwargs):
+        import getpass
+        self.session = getpass.getuser() # unfortunate, same as the ssh process manager
+
+        super().__init__(
+            configuration = configuration,
+            session = self.session,
+            **kwargs
+        )
+
+        from drunc.utils.shell_utils import create_dummy_token_from_uname
+        self.token = create_dummy_token_from_uname()
+        self.agents = {} # address -> Agent
+        self._agents_lock = threading.Lock()
+        from collections import OrderedDict
+        self._early_exits = OrderedDict() # uuid -> ProcessInstance, the processes which exited before their boot returned
+
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=self.configuration.data.max_parallel_agents, thread_name_prefix='agent_command')
+
+
+    def _agent_address(self, host:str) -> str:
+        address = self.configuration.data.agents.get(host)
+        if address:
+            return address
+        from drunc.utils.utils import host_is_local
+        if host_is_local(host):
+            host = 'localhost'
+        return f'{host}:{self.configuration.data.agent_port}'
+
+
+    def _agent(self, host:str) -> Agent:
+        address = self._agent_address(host)
+        with self._agents_lock:
+            agent = self.agents.get(address)
+            if agent is None:
+                agent = Agent(
+                    host = host,
+                    address = address,
+                    token = self.token,
+                    timeout = self.configuration.data.agent_timeout,
+                    on_event = self._on_agent_event,
+                )
+                self.agents[address] = agent
+        return agent
+
+
+    def _on_agent_event(self, agent:Agent, event:str, pi:ProcessInstance) -> None:
+        from drunc.process_manager.process_events import ProcessEventType
+        if event not in (ProcessEventType.SNAPSHOT, ProcessEventType.EXITED):
+            return # the boots, restarts and flushes go through here, and are published by the commands
+        uuid = pi.uuid.uuid
+        with self.process_lock:
+            process = self.process_store.get(uuid)
+            if process is None or process.agent is not agent:
+                if event == ProcessEventType.EXITED and uuid not in self.boot_request:
+                    # maybe booted by this process manager, which has not registered it yet
+                    self._early_exits[uuid] = pi
+                    while len(self._early_exits) > 1000:
+                        self._early_exits.popitem(last=False)
+                return
+            process.update(pi)
+
+        if event == ProcessEventType.EXITED:
+            m = pi.process_description.metadata
+            self.log.info(f'Process \'{m.name}\' (session: \'{m.session}\', user: \'{m.user}\') process exited with exit code {pi.return_code} on {agent.host}')
+            self.process_events.publish(event, self._process_instance(uuid))
+
+
+    def _register(self, agent:Agent, br:BootRequest, pi:ProcessInstance) -> None:
+        uuid = pi.uuid.uuid
+        with self.process_lock:
+            self.boot_request[uuid] = BootRequest()
+            self.boot_request[uuid].CopyFrom(br)
+            self.boot_request[uuid].process_description.CopyFrom(pi.process_description)
+            self.process_index.add(uuid, pi.process_description.metadata)
+            process = AgentProcess(agent, alive=False)
+            process.update(pi)
+            early_exit = self._early_exits.pop(uuid, None)
+            if early_exit is not None:
+                process.update(early_exit)
+            self.process_store[uuid] = process
+        agent.start_watching()
+
+
+    def _process_instance(self, uuid:str) -> ProcessInstance:
+        with self.process_lock:
+            process = self.process_store.get(uuid)
+            br = self.boot_request.get(uuid)
+            if br is not None:
+                pd = ProcessDescription()
+                pd.CopyFrom(br.process_description)
+                pr = ProcessRestriction()
+                pr.CopyFrom(br.process_restriction)
+
+        pu = ProcessUUID(uuid=uuid)
+        if process is None or br is None: # killed or flushed in the meantime
+            return ProcessInstance(
+                process_description = ProcessDescription(),
+                process_restriction = ProcessRestriction(),
+                status_code = ProcessInstance.StatusCode.DEAD, # should be unknown
+                return_code = None,
+                uuid = pu
+            )
+
+        return ProcessInstance(
+            process_description = pd,
+            process_restriction = pr,
+            status_code = ProcessInstance.StatusCode.RUNNING if process.is_alive() else ProcessInstance.StatusCode.DEAD,
+            return_code = None if process.is_alive() else process.exit_code,
+            uuid = pu
+        )
+
+
+    def _by_agent(self, uuids:list) -> dict:
+        '''
+        Returns agent -> query selecting its processes among uuids
+        '''
+        queries = {}
+        with self.process_lock:
+            for uuid in uuids:
+                process = self.process_store.get(uuid)
+                if process is None:
+                    continue
+                queries.setdefault(process.agent, ProcessQuery()).uuids.append(ProcessUUID(uuid=uuid))
+        return queries
+
+
+    def _on_each_agent(self, uuids:list, command:str, outformat) -> dict:
+        '''
+        Sends command to the agents of the processes in parallel, with a query selecting their processes.
+        Returns agent -> result (the exception if it failed).
+        '''
+        futures = {
+            agent: self._executor.submit(agent.command, command, query, outformat)
+            for agent, query in self._by_agent(uuids).items()
+        }
+        results = {}
+        for agent, future in futures.items():
+            try:
+                results[agent] = future.result()
+            except Exception as e:
+                self.log.error(f'\'{command}\' failed on {agent.host}: {str(e)}')
+                results[agent] = e
+        return results
+
+
+    def _boot_impl(self, boot_request:BootRequest) -> ProcessInstance:
+        self.log.debug(f'{self.name} running _boot_impl')
+        hosts = boot_request.process_restriction.allowed_hosts
+        if len(hosts) < 1:
+            raise DruncCommandException('No allowed host provided! bailing')
+
+        error = ''
+        for host in hosts:
+            # each agent only boots processes on its own host
+            br = BootRequest()
+            br.CopyFrom(boot_request)
+            del br.process_restriction.allowed_hosts[:]
+            br.process_restriction.allowed_hosts.append(host)
+            agent = self._agent(host)
+            try:
+                with self.host_boot_slot(host):
+                    pi = agent.command('boot', br, ProcessInstance)
+            except AgentUnreachable as e:
+                error += f'\n{str(e)}'
+                self.log.warning(f'Could not boot \'{br.process_description.metadata.name}\' on {host}, trying on a different host: {str(e)}')
+                continue
+
+            self._register(agent, boot_request, pi)
+            self.log.info(f'Booted \'{br.process_description.metadata.name}\' from session \'{br.process_description.metadata.session}\' with UUID {pi.uuid.uuid} on {host}')
+            return self._process_instance(pi.uuid.uuid)
+
+        raise DruncCommandException(f'Could not boot \'{boot_request.process_description.metadata.name}\' on any of its hosts:{error}')
+
+
+    def _ps_impl(self, query:ProcessQuery) -> ProcessInstanceList:
+        self.log.debug(f'{self.name} running ps')
+        uuids = self._get_process_uid(query)
+        queries = self._by_agent(uuids)
+        for agent, result in self._on_each_agent(uuids, 'ps', ProcessInstanceList).items():
+            if isinstance(result, Exception):
+                continue # the last known status is returned
+            known = {pi.uuid.uuid: pi for pi in result.values}
+            with self.process_lock:
+                for pu in queries[agent].uuids:
+                    process = self.process_store.get(pu.uuid)
+                    if process is None or process.agent is not agent:
+                        continue
+                    if pu.uuid in known:
+                        process.update(known[pu.uuid])
+                    else: # the agent restarted, and does not know the process anymore
+                        process.alive = False
+
+        return ProcessInstanceList(
+            values = [self._process_instance(uuid) for uuid in uuids]
+        )
+
+
+    def _kill(self, uuids:list) -> ProcessInstanceList:
+        ret = []
+        for agent, result in self._on_each_agent(uuids, 'kill', ProcessInstanceList).items():
+            if isinstance(result, Exception):
+                continue
+            for pi in result.values:
+                uuid = pi.uuid.uuid
+                with self.process_lock:
+                    process = self.process_store.get(uuid)
+                    if process is None or process.agent is not agent:
+                        continue
+                    process.update(pi)
+                ret.append(self._process_instance(uuid))
+                with self.process_lock:
+                    if self.process_store.get(uuid) is process: # not restarted in the meantime
+                        del self.process_store[uuid]
+        return ProcessInstanceList(values=ret)
+
+
+    def _kill_impl(self, query:ProcessQuery) -> ProcessInstanceList:
+        self.log.info(f'{self.name} killing {query.names} in session {self.session}')
+        return self._kill(self._get_process_uid(query))
+
+
+    def _terminate_impl(self) -> ProcessInstanceList:
+        self.log.info(f'{self.name} terminating')
+        try:
+            with self.process_lock:
+                uuids = list(self.process_store.keys())
+            if uuids:
+                self.log.info('Killing all the known processes before exiting')
+                return self._kill(uuids)
+            self.log.info('No known process to kill before exiting')
+            return ProcessInstanceList()
+        finally:
+            with self._agents_lock:
+                agents = list(self.agents.values())
+            for agent in agents:
+                agent.close()
+            self._executor.shutdown(wait=False)
+
+
+    def _restart_impl(self, query:ProcessQuery) -> ProcessInstanceList:
+        self.log.info(f'{self.name} restarting {query.names} in session {self.session}')
+        uuids = self._get_process_uid(query, in_boot_request=True)
+        uuid = self._ensure_one_process(uuids, in_boot_request=True)
+        with self.process_lock:
+            br = BootRequest()
+            br.CopyFrom(self.boot_request[uuid])
+        agent = self._agent(br.process_description.metadata.hostname)
+        pi = agent.command('restart', ProcessQuery(uuids=[ProcessUUID(uuid=uuid)]), ProcessInstance)
+        self._register(agent, br, pi)
+        return self._process_instance(uuid)
+
+
+    def _forget_process(self, uuid:str) -> None:
+        # Called with the process lock held by flush, once the process is out of the store: the agent of its host
+        # (kept in its boot request) is told in the background
+        br = self.boot_request.get(uuid)
+        if br is None or not br.process_description.metadata.hostname:
+            return
+        agent = self._agent(br.process_description.metadata.hostname)
+        query = ProcessQuery(uuids=[ProcessUUID(uuid=uuid)])
+        def flush_on_agent():
+            try:
+                agent.command('flush', query, ProcessInstanceList)
+            except Exception as e:
+                self.log.warning(f'Could not flush {uuid} on {agent.host}: {str(e)}')
+        self._executor.submit(flush_on_agent)
+
+
+    def _metrics_impl(self, query:ProcessQuery):
+        from google.protobuf.struct_pb2 import Struct
+        metrics = Struct()
+        for agent, result in self._on_each_agent(self._get_process_uid(query), 'metrics', Struct).items():
+            if not isinstance(result, Exception):
+                metrics.MergeFrom(result)
+        return metrics
+
+
+    async def _logs_impl(self, log_request:LogRequest, follow:bool=False, log_filter=None, chunk_size:int=1) -> LogLine:
+        self.log.debug(f'{self.name} retrieving logs for {log_request.query}')
+        uuid = self._ensure_one_process(self._get_process_uid(log_request.query))
+        with self.process_lock:
+            process = self.process_store.get(uuid)
+        if process is None: # killed or flushed in the meantime
+            yield LogLine(
+                uuid = ProcessUUID(uuid=uuid),
+                line = 'Could not retrieve logs: the process is not known anymore'
+            )
+            return
+        agent = process.agent
+
+        from drunc.process_manager.utils import pack_log_options
+        options = pack_log_options(
+            LogRequest(query=ProcessQuery(uuids=[ProcessUUID(uuid=uuid)]), how_far=log_request.how_far),
+            follow = follow,
+            chunk_size = chunk_size,
+            **(log_filter.options() if log_filter is not None else {}),
+        )
+        try:
+            async for ll in agent.read_logs(options):
+                yield ll
+        except AgentUnreachable as e:
+            yield LogLine(
+                uuid = ProcessUUID(uuid=uuid),
+                line = f'Could not retrieve logs: {str(e)}'
+            )
@@ -0,0 +1,245 @@
+'''
+Cache of the boot plans, i.e. everything a boot needs from the OKS configuration: the boot requests of the
+applications, their boot tree and where to find the top controller afterwards.
+
+Building a plan means consolidating the configuration and walking the whole segment tree with conffwk, which takes
+a while for big sessions, and gives the same result as long as the configuration files, the session, the user and
+the environment the applications are booted with are the same. The plans are kept under a key hashed from all of
+these, in memory and on disk, so that booting an unchanged configuration again (in this shell or in a new one) skips
+the OKS parsing entirely.
+
+The log paths contain the time of the boot (see get_log_path), so they are not part of the plan: they are computed
+again each time the plan is used.
+'''
+import hashlib
+import json
+import logging
+import os
+import threading
+
+CACHE_VERSION = 1 # to bump when the content of the plans changes
+
+# What the boot requests depend on, besides the configuration files (the RTE script, the release, the includes)
+RELEVANT_ENVIRONMENT = (
+    'DUNEDAQ_DB_PATH',
+    'DUNE_DAQ_BASE_RELEASE',
+    'SPACK_RELEASES_DIR',
+    'DBT_INSTALL_DIR',
+    'DBT_SETUP_RELEASE_SCRIPT_SOURCED',
+    'DBT_WORKAREA_ENV_SCRIPT_SOURCED',
+)
+
+
+def _resolve_include(path:str, including_file:str):
+    # Like OKS: absolute, then relative to the including file, then in $DUNEDAQ_DB_PATH
+    if os.path.isabs(path):
+        return path if os.path.isfile(path) else None
+    candidates = [os.path.join(os.path.dirname(including_file), path)]
+    candidates += [os.path.join(directory, path) for directory in os.getenv('DUNEDAQ_DB_PATH', '').split(':') if directory]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+
+def configuration_files(oks_conf:str) -> list:
+    '''
+    Returns the configuration file and all the files it includes, recursively, in the order they are found.
+    An include which cannot be found is returned as is (prefixed with '?'), so that it still changes the key.
+    '''
+    from xml.etree.ElementTree import iterparse
+
+    files, to_visit, seen = [], [os.path.abspath(oks_conf)], set()
+    while to_visit:
+        path = to_visit.pop(0)
+        if path in seen:
+            continue
+        seen.add(path)
+        files.append(path)
+        if path.startswith('?'):
+            continue
+
+        in_include = False
+        for event, element in iterparse(path, events=('start', 'end')):
+            if element.tag == 'include':
+                in_include = event == 'start'
+            elif event == 'start' and in_include and element.tag == 'file':
+                include = element.get('path')
+                if include:
+                    to_visit.append(_resolve_include(include, path) or f'?{include}')
+            elif element.tag in ('obj', 'class'): # the includes are at the top of the file
+                break
+    return files
+
+
+def boot_plan_key(oks_conf:str, session_name:str, user:str) -> str:
+    '''
+    Hashes the content of the configuration files with everything else the boot requests depend on
+    '''
+    key = hashlib.sha256()
+
+    def add(*values):
+        for value in values:
+            key.update(str(value).encode())
+            key.update(b'\0')
+
+    add(CACHE_VERSION, session_name, user, os.getcwd())
+    for variable in RELEVANT_ENVIRONMENT:
+        add(variable, os.getenv(variable, ''))
+
+    for path in configuration_files(oks_conf):
+        add(path)
+        if not path.startswith('?'):
+            with open(path, 'rb') as f:
+                key.update(hashlib.sha256(f.read()).digest())
+    return key.hexdigest()
+
+
+class BootPlan:
+    '''
+    boot_requests: the BootRequests of the applications, in the order they were collected
+    boot_tree: application name -> name of its controller (see BootScheduler)
+    log_paths: application name -> the arguments of get_log_path other than the user, session, name and override_logs
+    controller: where to find the top controller after the boot (name, connectivity_service, lookup_timeout, host,
+      port, protocol)
+    '''
+    def __init__(self, boot_requests:list, boot_tree:dict, log_paths:dict, controller:dict):
+        self.boot_requests = boot_requests
+        self.boot_tree = boot_tree
+        self.log_paths = log_paths
+        self.controller = controller
+
+
+    def to_dict(self) -> dict:
+        from google.protobuf.json_format import MessageToDict
+        return {
+            'version': CACHE_VERSION,
+            'boot_requests': [MessageToDict(br) for br in self.boot_requests],
+            'boot_tree': self.boot_tree,
+            'log_paths': self.log_paths,
+            'controller': self.controller,
+        }
+
+
+    @staticmethod
+    def from_dict(d:dict):
+        if d.get('version') != CACHE_VERSION:
+            raise ValueError(f'Boot plan version {d.get("version")} instead of {CACHE_VERSION}')
+        from google.protobuf.json_format import ParseDict
+        from druncschema.process_manager_pb2 import BootRequest
+        return BootPlan(
+            boot_requests = [ParseDict(br, BootRequest()) for br in d['boot_requests']],
+            boot_tree = d['boot_tree'],
+            log_paths = d['log_paths'],
+            controller = d['controller'],
+        )
+
+
+    def boot_requests_for(self, user:str, session_name:str, override_logs:bool) -> dict:
+        '''
+        Returns application name -> BootRequest, with the log paths of this boot
+        '''
+        from druncschema.process_manager_pb2 import BootRequest
+        from drunc.process_manager.utils import get_log_path
+        from drunc.utils.utils import host_is_local
+        from drunc.exceptions import DruncShellException
+
+        boot_requests = {}
+        for br in self.boot_requests:
+            request = BootRequest()
+            request.CopyFrom(br)
+            name = request.process_description.metadata.name
+            log_path = get_log_path(
+                user = user,
+                session_name = session_name,
+                application_name = name,
+                override_logs = override_logs,
+                **self.log_paths.get(name, {}),
+            )
+            hosts = request.process_restriction.allowed_hosts
+            if hosts and host_is_local(hosts[0]) and not os.path.exists(os.path.dirname(log_path)):
+                raise DruncShellException(f"Log path {log_path} does not exist.")
+            request.process_description.process_logs_path = log_path
+            boot_requests[name] = request
+        return boot_requests
+
+
+def default_cache_directory() -> str:
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'drunc', 'boot_plans')
+
+
+class BootPlanCache:
+    '''
+    The boot plans, in memory and in directory (one json file per key), keeping the max_entries most recently used
+    files. A file which cannot be read is ignored (and removed): the plan is simply built again.
+    '''
+    def __init__(self, directory:str=None, max_entries:int=32):
+        self.log = logging.getLogger('boot_plan_cache')
+        self.directory = directory or default_cache_directory()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._plans = {}
+
+
+    def _path(self, key:str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+
+    def get(self, key:str):
+        with self._lock:
+            plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                plan = BootPlan.from_dict(json.load(f))
+            os.utime(path) # most recently used
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.log.debug(f'Ignoring the cached boot plan {path}: {str(e)}')
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        with self._lock:
+            self._plans[key] = plan
+        return plan
+
+
+    def put(self, key:str, plan:BootPlan) -> None:
+        with self._lock:
+            self._plans[key] = plan
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(plan.to_dict(), f)
+            os.replace(tmp, path) # another shell never reads half a plan
+            self._prune()
+        except OSError as e:
+            self.log.debug(f'Could not write the boot plan to {self.directory}: {str(e)}')
+
+
+    def _prune(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
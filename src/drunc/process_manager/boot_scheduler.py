@@ -0,0 +1,85 @@
+import logging
+from math import ceil
+
+from drunc.exceptions import DruncShellException
+
+
+class BootScheduler:
+    '''
+    Decides when each application of a session is booted, using the control tree the applications form.
+
+    Applications which do not control anything (infrastructure and leaf applications) are released straight away.
+    A controller is released once controller_threshold (a fraction between 0 and 1) of the applications in its
+    subtree have been spawned. With a threshold of 1, a controller only starts once its whole subtree has been
+    launched, so that it finds its children straight away; with 0, everything is booted at the same time.
+    '''
+    def __init__(self, parents:dict, controller_threshold:float=1.):
+        '''
+        parents: application name -> name of the controller of the application (None for the top controller and
+        the infrastructure applications). The insertion order is the order in which ready applications are released.
+        '''
+        if not 0. <= controller_threshold <= 1.:
+            raise DruncShellException(f'The controller boot threshold should be between 0 and 1, got {controller_threshold}')
+
+        self.log = logging.getLogger('boot_scheduler')
+        self.parents = dict(parents)
+
+        subtree_size = {name: 0 for name in self.parents}
+        for name in self.parents:
+            for ancestor in self._ancestors(name):
+                subtree_size[ancestor] += 1
+
+        # Number of applications of the subtree that still need to be spawned before the application can be released
+        self.blocking = {
+            name: ceil(controller_threshold * size)
+            for name, size in subtree_size.items()
+        }
+        self.released = set()
+        self.spawned = set()
+
+
+    def _ancestors(self, name:str):
+        parent = self.parents.get(name)
+        seen = {name}
+        while parent is not None and parent not in seen:
+            yield parent
+            seen.add(parent)
+            parent = self.parents.get(parent)
+
+
+    def pop_ready(self) -> list:
+        '''
+        Returns the applications that can be booted now, and were not returned before.
+        '''
+        ready = [
+            name for name in self.parents
+            if name not in self.released and self.blocking[name] <= 0
+        ]
+        self.released.update(ready)
+        return ready
+
+
+    def notify_spawned(self, name:str) -> None:
+        '''
+        Records that the process of an application was spawned (or failed to be, the controller should not wait for it either way).
+        '''
+        if name not in self.parents:
+            self.log.warning(f'\'{name}\' is not part of the boot tree, releasing all the applications that are left')
+            self.release_all()
+            return
+
+        if name in self.spawned:
+            return
+        self.spawned.add(name)
+
+        for ancestor in self._ancestors(name):
+            self.blocking[ancestor] -= 1
+
+
+    def release_all(self) -> None:
+        for name in self.blocking:
+            self.blocking[name] = 0
+
+
+    def all_released(self) -> bool:
+        return len(self.released) == len(self.parents)
@@ -7,6 +7,7 @@ class ProcessManagerTypes(Enum):
     Unknown = 0
     SSH = 1
     K8s = 2
+    Agents = 3
 
 class ProcessManagerConfData:
     def __init__(self):
@@ -14,6 +15,9 @@ class ProcessManagerConfData:
         self.authoriser = None
         self.type = ProcessManagerTypes.Unknown
         self.command_address = ''
+        self.boot_max_concurrency = 32
+        self.boot_max_concurrency_per_host = 8
+        self.command_threads = 16
 
 
 class ProcessManagerConfHandler(ConfHandler):
@@ -26,11 +30,31 @@ class ProcessManagerConfHandler(ConfHandler):
         else:
             new_data.broadcaster = None
         new_data.authoriser = None
+        new_data.boot_max_concurrency = data.get("boot_max_concurrency", new_data.boot_max_concurrency)
+        new_data.boot_max_concurrency_per_host = data.get("boot_max_concurrency_per_host", new_data.boot_max_concurrency_per_host)
+        new_data.command_threads = data.get("command_threads", new_data.command_threads)
 
         match data['type'].lower():
             case 'ssh':
                 new_data.type = ProcessManagerTypes.SSH
                 new_data.kill_timeout = data.get("kill_timeout", 0.5)
+                new_data.ssh_multiplexing = data.get("ssh_multiplexing", False)
+                new_data.ssh_max_sessions = data.get("ssh_max_sessions", 8)
+                new_data.local_fast_path = data.get("local_fast_path", True)
+                new_data.ssh_control_persist = data.get("ssh_control_persist", 600)
+                new_data.remote_python = data.get("remote_python", "python3")
+                new_data.resource_sampling_interval = data.get("resource_sampling_interval", 5)
+                new_data.resource_history = data.get("resource_history", 120)
+                new_data.rte_snapshot = data.get("rte_snapshot", False)
+                new_data.rte_snapshot_check_interval = data.get("rte_snapshot_check_interval", 60)
+                new_data.log_buffer_lines = data.get("log_buffer_lines", 0)
+                new_data.log_buffer_size = data.get("log_buffer_size", 1048576)
+            case 'agents':
+                new_data.type = ProcessManagerTypes.Agents
+                new_data.agents = data.get("agents", {})
+                new_data.agent_port = data.get("agent_port", 10054)
+                new_data.agent_timeout = data.get("agent_timeout", 60)
+                new_data.max_parallel_agents = data.get("max_parallel_agents", 32)
             case 'k8s':
                 new_data.type = ProcessManagerTypes.K8s
                 new_data.image = data.get("image", "ghcr.io/dune-daq/alma9:latest")
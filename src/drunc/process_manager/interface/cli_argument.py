@@ -4,6 +4,43 @@ def validate_conf_string(ctx, param, boot_configuration):
     return boot_configuration
 
 
+def validate_log_time(ctx, param, value):
+    '''
+    Turns a date (ISO format, e.g. 2024-03-12T10:00 or 10:00 for today) or a duration before now (e.g. 30s, 10m, 2h, 1d) into a POSIX timestamp
+    '''
+    if value is None:
+        return None
+    import re, time
+    from datetime import datetime, date
+    import click
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd])', value.strip())
+    if m:
+        return time.time() - float(m.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[m.group(2)]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(f'{date.today().isoformat()}T{value}').timestamp()
+    except ValueError:
+        raise click.BadParameter(f'\'{value}\' is neither a date (2024-03-12T10:00, 10:00) nor a duration (30s, 10m, 2h, 1d)')
+
+
+def validate_log_grep(ctx, param, value):
+    '''
+    Checks that the regex given to --grep compiles, before it is sent to the process manager
+    '''
+    if value is None:
+        return None
+    import re
+    import click
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise click.BadParameter(f'\'{value}\' is not a valid regular expression: {str(e)}')
+    return value
+
+
 def add_query_options(at_least_one:bool, all_processes_by_default:bool=False):
     def wrapper(f0):
         import click
@@ -7,12 +7,14 @@ from drunc.process_manager.interface.cli_argument import add_query_options
 from drunc.process_manager.interface.context import ProcessManagerContext
 
 from druncschema.process_manager_pb2 import ProcessQuery
-from drunc.process_manager.interface.cli_argument import validate_conf_string
+from drunc.process_manager.interface.cli_argument import validate_conf_string, validate_log_time, validate_log_grep
 
 @click.command('boot')
 @click.option('-u','--user', type=str, default=getpass.getuser(), help='Select the process of a particular user (default $USER)')
 @click.option('-l', '--log-level', type=click.Choice(log_levels.keys(), case_sensitive=False), default='INFO', help='Set the log level')
 @click.option('-o/-no', '--override-logs/--no-override-logs', type=bool, default=True, help="Override logs, if --no-override-logs filenames have the timestamp of the run.")
+@click.option('--controller-boot-threshold', type=click.FloatRange(0., 1.), default=1., help='Fraction of the applications under a controller that must be spawned before the controller is booted (1: whole subtree first, 0: everything in parallel)')
+@click.option('--boot-plan-cache/--no-boot-plan-cache', 'use_boot_plan_cache', default=True, help='Reuse the boot plan of the configuration if it has not changed since it was last booted (--no-boot-plan-cache reads the configuration again)')
 @click.argument('boot-configuration', type=str, callback=validate_conf_string)
 @click.argument('session-name', type=str)
 @click.pass_obj
@@ -24,6 +26,8 @@ async def boot(
     boot_configuration:str,
     log_level:str,
     override_logs:bool,
+    controller_boot_threshold:float,
+    use_boot_plan_cache:bool,
     ) -> None:
     log = logging.getLogger("process_manager_interface")
     from drunc.utils.shell_utils import InterruptedCommand
@@ -34,9 +38,15 @@ async def boot(
             session_name = session_name,
             log_level = log_level,
             override_logs = override_logs,
+            controller_boot_threshold = controller_boot_threshold,
+            use_boot_plan_cache = use_boot_plan_cache,
         )
+        from druncschema.process_manager_pb2 import ProcessInstance
         async for result in results:
             if not result: break
+            if not isinstance(result.data, ProcessInstance):
+                log.error('A process could not be booted, see the logs of the process manager')
+                continue
             log.debug(f'\'{result.data.process_description.metadata.name}\' ({result.data.uuid.uuid}) process started')
     except InterruptedCommand:
         return
@@ -122,10 +132,16 @@ async def flush(obj:ProcessManagerContext, query:ProcessQuery) -> None:
 @click.command('logs')
 @add_query_options(at_least_one=True)
 @click.option('--how-far', type=int, default=100, help='How many lines one wants')
-@click.option('--grep', type=str, default=None)
+@click.option('--grep', type=str, default=None, callback=validate_log_grep, help='Only get the lines in which this regex is found (searched by the process manager)')
+@click.option('-i', '--ignore-case', is_flag=True, default=False, help='Ignore the case with --grep')
+@click.option('-C', '--context', type=int, default=0, help='Number of lines to show around the lines found with --grep')
+@click.option('--since', type=str, default=None, callback=validate_log_time, help='Only get the lines written after this date (2024-03-12T10:00, 10:00) or this long ago (30s, 10m, 2h, 1d)')
+@click.option('--until', type=str, default=None, callback=validate_log_time, help='Only get the lines written before this date or this long ago')
+@click.option('-f', '--follow', is_flag=True, default=False, help='Keep streaming the lines as they are written (like tail -f), until ctrl-c or the process exits')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=1000, help='Maximum number of lines the process manager sends in one message')
 @click.pass_obj
 @run_coroutine
-async def logs(obj:ProcessManagerContext, how_far:int, grep:str, query:ProcessQuery) -> None:
+async def logs(obj:ProcessManagerContext, how_far:int, grep:str, ignore_case:bool, context:int, since:float, until:float, follow:bool, chunk_size:int, query:ProcessQuery) -> None:
     from druncschema.process_manager_pb2 import LogRequest
 
     log_req = LogRequest(
@@ -136,8 +152,26 @@ async def logs(obj:ProcessManagerContext, how_far:int, grep:str, query:ProcessQu
     uuid = None
     from rich.markup import escape
 
+    # Only the options that are set are sent, without any the plain logs command is used
+    options = {
+        'follow': follow,
+        'grep': grep,
+        'ignore_case': ignore_case if grep else None,
+        'context': context if grep else None,
+        'since': since,
+        'until': until,
+        'chunk_size': chunk_size if chunk_size > 1 else None,
+    }
+    options = {k: v for k, v in options.items() if v}
+
+    highlight = None
+    if grep is not None:
+        import re
+        highlight = re.compile(grep, re.IGNORECASE if ignore_case else 0)
+
     async for result in obj.get_driver('process_manager').logs(
         log_req,
+        **options,
         ):
         if not result: break
 
@@ -145,23 +179,20 @@ async def logs(obj:ProcessManagerContext, how_far:int, grep:str, query:ProcessQu
             uuid = result.data.uuid.uuid
             obj.rule(f'[yellow]{uuid}[/yellow] logs')
 
-        line = result.data.line
-        if line == "":
-            obj.print('')
-            continue
-
-        if line[-1] == '\n':
-            line = line[:-1]
-
-        if grep is not None and grep not in line:
-            continue
-
-        line = escape(line)
-
-        if grep is not None:
-            line = line.replace(grep, f'[u]{grep}[/]')
-
-        obj.print(line)
+        # Each result holds a chunk of lines
+        for line in result.data.line.splitlines() or ['']:
+            if highlight is None:
+                obj.print(escape(line))
+                continue
+
+            # The lines were selected by the process manager, the matches are underlined here
+            highlighted, position = '', 0
+            for m in highlight.finditer(line):
+                if m.end() == m.start():
+                    continue
+                highlighted += escape(line[position:m.start()]) + f'[u]{escape(m.group())}[/]'
+                position = m.end()
+            obj.print(highlighted + escape(line[position:]))
 
     obj.rule('End')
 
@@ -188,7 +219,73 @@ async def ps(obj:ProcessManagerContext, query:ProcessQuery, long_format:bool) ->
 
     if not results: return
 
+    metrics = None
+    if long_format:
+        from drunc.process_manager.utils import unpack_metrics
+        resources = await obj.get_driver('process_manager').metrics(
+            query = query,
+        )
+        if resources:
+            metrics = unpack_metrics(resources.data)
+
     from drunc.process_manager.utils import tabulate_process_instance_list
-    obj.print(tabulate_process_instance_list(results.data, title='Processes running', long=long_format))
+    obj.print(tabulate_process_instance_list(results.data, title='Processes running', long=long_format, metrics=metrics))
+
+
+@click.command('watch')
+@add_query_options(at_least_one=False, all_processes_by_default=True)
+@click.pass_obj
+@run_coroutine
+async def watch(obj:ProcessManagerContext, query:ProcessQuery) -> None:
+    from datetime import datetime
+    from druncschema.process_manager_pb2 import ProcessInstance
+    from drunc.process_manager.utils import unpack_process_event
+    from drunc.process_manager.process_events import ProcessEventType
+
+    styles = {
+        ProcessEventType.EXITED: 'danger',
+        ProcessEventType.FLUSHED: 'yellow',
+    }
+
+    async for result in obj.get_driver('process_manager').watch(
+        query = query,
+    ):
+        if not result or not result.data:
+            continue
+        event, pi = unpack_process_event(result.data)
+        m = pi.process_description.metadata
+        alive = 'alive' if pi.status_code == ProcessInstance.StatusCode.RUNNING else f'dead (exit code {pi.return_code})'
+        style = styles.get(event, 'green')
+        obj.print(f'{datetime.now().strftime("%H:%M:%S")} [{style}]{event:9}[/{style}] {m.name} (session: {m.session}, host: {m.hostname}, uuid: {pi.uuid.uuid}) {alive}')
+
+
+@click.command('metrics')
+@add_query_options(at_least_one=True)
+@click.option('--how-far', type=int, default=10, help='Number of samples to show per process')
+@click.pass_obj
+@run_coroutine
+async def metrics(obj:ProcessManagerContext, query:ProcessQuery, how_far:int) -> None:
+    results = await obj.get_driver('process_manager').metrics(
+        query = query,
+    )
+
+    if not results: return
+
+    from datetime import datetime
+    from rich.table import Table
+    from drunc.process_manager.utils import unpack_metrics, resource_columns, RESOURCE_COLUMNS
+    for uuid, process in unpack_metrics(results.data).items():
+        t = Table(title=f'{process["name"]} ({process["session"]}) on {process["host"]}, {uuid}')
+        t.add_column('time')
+        t.add_column('pid')
+        for column in RESOURCE_COLUMNS:
+            t.add_column(column, justify='right')
+        for sample in process.get('samples', [])[-how_far:]:
+            t.add_row(
+                datetime.fromtimestamp(sample['time']).strftime('%H:%M:%S'),
+                f'{sample["pid"]:.0f}',
+                *resource_columns(sample),
+            )
+        obj.print(t)
 
 
@@ -53,8 +53,18 @@ def run_pm(pm_conf:str, pm_address:str, log_level:str, override_logs:bool, log_p
             from drunc.exceptions import DruncSetupException
             raise DruncSetupException('The address on which to expect commands/send status wasn\'t specified')
         from druncschema.process_manager_pb2_grpc import add_ProcessManagerServicer_to_server
-        server = grpc.aio.server()
+        # The synchronous commands (boot, kill, ps...) block on processes and hosts, they are run in these threads rather than
+        # on the event loop (which serves the log streams and the batch boots) or in its default executor (used to read the logs)
+        from concurrent.futures import ThreadPoolExecutor
+        server = grpc.aio.server(
+            migration_thread_pool = ThreadPoolExecutor(
+                max_workers = pmch.data.command_threads,
+                thread_name_prefix = 'pm_command',
+            )
+        )
         add_ProcessManagerServicer_to_server(pm, server)
+        from drunc.process_manager.utils import add_extension_handlers_to_server
+        add_extension_handlers_to_server(pm, server)
         port = server.add_insecure_port(address)
         if generated_port is not None:
             generated_port.value = port
@@ -36,7 +36,7 @@ def process_manager_shell(ctx, process_manager_address:str, log_level:str) -> No
 
     ctx.call_on_close(cleanup)
 
-    from drunc.process_manager.interface.commands import boot, terminate, kill, flush, logs, restart, ps, dummy_boot
+    from drunc.process_manager.interface.commands import boot, terminate, kill, flush, logs, restart, ps, metrics, watch, dummy_boot
     ctx.command.add_command(boot, 'boot')
     ctx.command.add_command(terminate, 'terminate')
     ctx.command.add_command(kill, 'kill')
@@ -44,4 +44,6 @@ def process_manager_shell(ctx, process_manager_address:str, log_level:str) -> No
     ctx.command.add_command(logs, 'logs')
     ctx.command.add_command(restart, 'restart')
     ctx.command.add_command(ps, 'ps')
+    ctx.command.add_command(metrics, 'metrics')
+    ctx.command.add_command(watch, 'watch')
     ctx.command.add_command(dummy_boot, 'dummy_boot')
\ No newline at end of file
@@ -4,6 +4,7 @@ from druncschema.request_response_pb2 import Response
 from druncschema.authoriser_pb2 import ActionType, SystemType
 
 from drunc.process_manager.process_manager import ProcessManager
+from drunc.process_manager.process_events import ProcessEventType
 from drunc.exceptions import DruncCommandException, DruncException
 from drunc.k8s_exceptions import DruncK8sNamespaceAlreadyExists
 from drunc.authoriser.decorators import authentified_and_authorised
@@ -244,42 +245,8 @@ class K8sProcessManager(ProcessManager):
 
 
     def _get_process_uid(self, query:ProcessQuery, in_boot_request:bool=False):
-        import re
-        uuid_selector = []
-        name_selector = query.names
-        user_selector = query.user
-        session_selector = query.session
-        # relevant reading here: https://github.com/protocolbuffers/protobuf/blob/main/docs/field_presence.md
-
-        processes = []
-
-        all_the_uuids = self.boot_request.keys()
-
-        for uid in query.uuids:
-            uuid_selector += [uid.uuid]
-
-        all_pods = []
-        for uuid in all_the_uuids:
-            podname = self.boot_request[uuid].process_description.metadata.name
-            all_pods.append(podname)
-
-        for uuid in self.boot_request.keys():
-            accepted = False
-            meta = self.boot_request[uuid].process_description.metadata
-
-            if uuid in uuid_selector: accepted = True
-
-            for name_reg in name_selector:
-                if re.search(name_reg, meta.name):
-                    accepted = True
-
-            if session_selector == meta.session: accepted = True
-
-            if user_selector == meta.user: accepted = True
-
-            if accepted: processes.append(uuid)
-
-        return processes
+        # There is no process store here, the pods are all in the boot requests
+        return self.process_index.query(query)
 
     def _get_pi(self, uuid, podname, session, return_code=None):
         pd = ProcessDescription()
@@ -361,15 +328,26 @@ class K8sProcessManager(ProcessManager):
 
 
 
-    async def _logs_impl(self, log_request:LogRequest) -> LogLine:
+    async def _logs_impl(self, log_request:LogRequest, follow:bool=False, log_filter=None, chunk_size:int=1) -> LogLine:
 
         uuids = self._get_process_uid(log_request.query, in_boot_request=True)
         uuid = self._ensure_one_process(uuids, in_boot_request=True)
+        if follow:
+            yield LogLine(line='Following the logs is not supported by the K8s process manager, showing the last lines only')
         for uuid in self._get_process_uid(log_request.query):
             podname = self.boot_request[uuid].process_description.metadata.name
             session = self.boot_request[uuid].process_description.metadata.session
-            for log in self._core_v1_api.read_namespaced_pod_log(podname, session, tail_lines=log_request.how_far).split("\n"):
-                yield LogLine(line=log)
+            import asyncio # the kubernetes client is blocking
+            lines = (await asyncio.to_thread(self._core_v1_api.read_namespaced_pod_log, podname, session, tail_lines=log_request.how_far)).split("\n")
+            if log_filter is not None: # only the regex is applied here, on the lines already tailed
+                lines = [log for log in lines if log_filter.match(log)]
+            if chunk_size <= 1:
+                for log in lines:
+                    yield LogLine(line=log)
+                continue
+            from drunc.process_manager.log_reader import chunk_lines
+            for chunk in chunk_lines([log+'\n' for log in lines], chunk_size):
+                yield LogLine(line=chunk)
 
 
 
@@ -383,10 +361,17 @@ class K8sProcessManager(ProcessManager):
 
         session = boot_request.process_description.metadata.session
         podnames = boot_request.process_description.metadata.name
-        if uuid in self.boot_request:
-            raise DruncCommandException(f'\"{session}.{podnames}\":{uuid} already exists!')
-        self.boot_request[uuid] = BootRequest()
-        self.boot_request[uuid].CopyFrom(boot_request)
+
+        # Not applied to the pods, rather than shown by ps without being applied
+        from drunc.process_manager.placement import check_no_placement
+        check_no_placement(boot_request.process_description.env, 'k8s')
+
+        with self.process_lock:
+            if uuid in self.boot_request:
+                raise DruncCommandException(f'\"{session}.{podnames}\":{uuid} already exists!')
+            self.boot_request[uuid] = BootRequest()
+            self.boot_request[uuid].CopyFrom(boot_request)
+            self.process_index.add(uuid, boot_request.process_description.metadata)
 
         self._create_namespace(session)
         self._create_pod(podnames, session, boot_request)
@@ -437,12 +422,14 @@ class K8sProcessManager(ProcessManager):
 
             self._kill_pod(podname, session)
 
-            same_uuid_br = []
-            same_uuid_br = BootRequest()
-            same_uuid_br.CopyFrom(self.boot_request[uuid])
-            same_uuid = uuid
+            with self.process_lock:
+                same_uuid_br = []
+                same_uuid_br = BootRequest()
+                same_uuid_br.CopyFrom(self.boot_request[uuid])
+                same_uuid = uuid
 
-            del self.boot_request[uuid]
+                del self.boot_request[uuid]
+                self.process_index.remove(uuid)
             del uuid
 
             ret=self.__boot(same_uuid_br, same_uuid)
@@ -476,8 +463,11 @@ class K8sProcessManager(ProcessManager):
             if not self.is_alive(podname, session):
                 return_code = self._return_code(podname, session)
                 ret.append(self._get_pi(uuid, podname, session, return_code))
+                self.process_events.publish(ProcessEventType.FLUSHED, ret[-1])
                 self._log.info(f'Flushing \"{session}.{podname}\":{uuid}')
-                del self.boot_request[uuid]
+                with self.process_lock:
+                    self.boot_request.pop(uuid, None)
+                    self.process_index.remove(uuid)
                 self._log.info(f'\"{session}.{podname}\":{uuid} flushed')
                 del uuid
                 self._kill_pod(podname, session)
@@ -508,7 +498,9 @@ class K8sProcessManager(ProcessManager):
             return_code = self._return_code(podname, session)
             ret.append(self._get_pi(uuid, podname, session, return_code))
 
-            del self.boot_request[uuid]
+            with self.process_lock:
+                self.boot_request.pop(uuid, None)
+                self.process_index.remove(uuid)
             del uuid
 
             self._kill_if_empty_session(session)
@@ -0,0 +1,58 @@
+'''
+In-memory buffers of the most recent output of the processes, fed with the output as the processes write it, so that
+the last lines of a process (what is asked for after a crash) are served without reading its log file, and are still
+there if the log file was deleted or rotated.
+'''
+import threading
+from collections import deque
+
+
+class LogRingBuffer:
+    '''
+    The last max_lines lines of the output of a process, and at most max_size characters of them
+    '''
+    def __init__(self, max_lines:int=1000, max_size:int=1048576):
+        self.max_lines = max(1, max_lines)
+        self.max_size = max(1, max_size)
+        self._lines = deque()
+        self._size = 0
+        self._partial = ''
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+
+    def _append(self, line:str) -> None:
+        line = line[-self.max_size:]
+        self._lines.append(line)
+        self._size += len(line)
+        while len(self._lines) > self.max_lines or self._size > self.max_size:
+            self._size -= len(self._lines.popleft())
+            self._dropped += 1
+
+
+    def feed(self, data:str) -> None:
+        '''
+        Adds output of the process, which does not have to be made of complete lines
+        '''
+        with self._lock:
+            lines = (self._partial + data).split('\n')
+            self._partial = lines.pop()
+            for line in lines:
+                self._append(line.rstrip('\r') + '\n') # the output of ssh -tt ends its lines with \r\n
+            if len(self._partial) > self.max_size: # no end of line in sight
+                self._append(self._partial)
+                self._partial = ''
+
+
+    def tail(self, n:int, complete:bool=True):
+        '''
+        Returns the last n lines (with their end of line, but the last one if it is incomplete).
+        If complete, returns None when there are fewer than n lines in the buffer but the process wrote more.
+        '''
+        with self._lock:
+            lines = list(self._lines)
+            if self._partial:
+                lines.append(self._partial)
+            if complete and n > len(lines) and self._dropped:
+                return None
+        return lines[-n:] if n > 0 else []
@@ -0,0 +1,291 @@
+'''
+Reading and filtering of the process log files, done in the process manager itself (no external tail, no temporary file).
+The blocking file reads are meant to be run in a thread (asyncio.to_thread), so they do not block the event loop.
+This module only uses the standard library: for the processes on other hosts, it is sent and run there (see remote_log_reader).
+'''
+import os
+import re
+import asyncio
+from datetime import datetime
+
+
+def tail_lines(path:str, n:int, block_size:int=65536) -> tuple:
+    '''
+    Returns the last n lines of the file (with their end of line), reading it backwards by blocks,
+    and the size of the file when it was read, from where it can be followed.
+    '''
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if n <= 0:
+            return [], end
+
+        position = end
+        blocks = []
+        newlines = 0
+        # n+1 end of lines are needed to be sure the first of the n lines is complete
+        while position > 0 and newlines <= n:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            newlines += block.count(b'\n')
+            blocks.append(block)
+
+    data = b''.join(reversed(blocks))
+    lines = data.splitlines(keepends=True)[-n:]
+    return [line.decode(errors='replace') for line in lines], end
+
+
+def read_from(path:str, offset:int, max_size:int=1048576) -> tuple:
+    '''
+    Returns what was appended to the file after offset (at most max_size bytes), and the new offset.
+    If the file got shorter than offset (truncated or rewritten), it is read from the beginning.
+    '''
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < offset:
+            offset = 0
+        f.seek(offset)
+        data = f.read(min(max_size, size - offset))
+    return data, offset + len(data)
+
+
+def split_lines(partial:bytes, data:bytes) -> tuple:
+    '''
+    Splits data, read after the incomplete line partial, in complete lines and the new incomplete line
+    '''
+    lines = (partial + data).split(b'\n')
+    partial = lines.pop()
+    return [line.decode(errors='replace') + '\n' for line in lines], partial
+
+
+async def follow_lines(path:str, offset:int, is_alive=None, poll_interval:float=0.5):
+    '''
+    Yields the lists of lines appended to the file after offset as they are written, like tail -f.
+    Stops once is_alive() returns False and everything the process wrote has been read, or when cancelled.
+    '''
+    partial = b''
+    while True:
+        data, offset = await asyncio.to_thread(read_from, path, offset)
+
+        if data:
+            lines, partial = split_lines(partial, data)
+            if lines:
+                yield lines
+            continue
+
+        if is_alive is not None and not is_alive():
+            if partial:
+                yield [partial.decode(errors='replace')]
+            return
+
+        await asyncio.sleep(poll_interval)
+
+
+def chunk_lines(lines, chunk_size:int, max_bytes:int=1048576):
+    '''
+    Groups the lines in strings of at most chunk_size lines, so that they are sent in one LogLine instead of one each.
+    The chunks are also cut at about max_bytes, to stay well below the gRPC message size limit.
+    '''
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if len(chunk) >= chunk_size or size >= max_bytes:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+# Timestamps at the beginning of the log lines: ISO-like (2024-03-12 10:11:12.123, also in brackets) and ERS (2024-Mar-12 10:11:12,123)
+_ISO_TIMESTAMP = re.compile(rb'^\[?(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?')
+_ERS_TIMESTAMP = re.compile(rb'^(\d{4})-([A-Z][a-z]{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})(?:,(\d{1,6}))?')
+_MONTHS = {m: i+1 for i, m in enumerate([b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun', b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec'])}
+
+
+def line_timestamp(line:bytes):
+    '''
+    Returns the POSIX timestamp at the beginning of the line (local time), or None if there is none
+    '''
+    m = _ISO_TIMESTAMP.match(line)
+    if m:
+        month = int(m.group(2))
+    else:
+        m = _ERS_TIMESTAMP.match(line)
+        if not m or m.group(2) not in _MONTHS:
+            return None
+        month = _MONTHS[m.group(2)]
+    fraction = m.group(7) or b'0'
+    try:
+        return datetime(
+            int(m.group(1)), month, int(m.group(3)),
+            int(m.group(4)), int(m.group(5)), int(m.group(6)),
+            int(fraction.ljust(6, b'0')),
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+class LogFilter:
+    '''
+    Selects the lines of a log: the ones in which the regex grep is found (ignoring the case if ignore_case),
+    with context lines around them, and/or the ones written between since and until (POSIX timestamps).
+    Lines without a timestamp are considered written at the same time as the last line that has one.
+    '''
+    SEPARATOR = '--\n'
+
+    def __init__(self, grep:str=None, ignore_case:bool=False, context:int=0, since:float=None, until:float=None):
+        self.grep = grep
+        self.ignore_case = ignore_case
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        self.regex = re.compile(grep.encode(), flags) if grep else None
+        self.context = max(0, int(context))
+        self.since = since
+        self.until = until
+
+    def options(self) -> dict:
+        '''
+        The arguments to rebuild this filter, e.g. on another host
+        '''
+        return {
+            'grep': self.grep,
+            'ignore_case': self.ignore_case,
+            'context': self.context,
+            'since': self.since,
+            'until': self.until,
+        }
+
+    def active(self) -> bool:
+        return self.regex is not None or self.since is not None or self.until is not None
+
+    def match(self, line:str) -> bool:
+        return self.regex is None or self.regex.search(line.encode()) is not None
+
+
+def _first_timestamp_after(f, offset:int, max_lines:int=1000):
+    f.seek(offset)
+    if offset > 0:
+        f.readline() # most likely in the middle of a line
+    for _ in range(max_lines):
+        line = f.readline()
+        if not line:
+            return None
+        timestamp = line_timestamp(line)
+        if timestamp is not None:
+            return timestamp
+    return None
+
+
+def _offset_before(f, size:int, since:float, block_size:int=65536) -> int:
+    '''
+    Bisects the file (assuming the lines are in chronological order) for an offset a bit before the first line written after since
+    '''
+    low, high = 0, size
+    while high - low > block_size:
+        middle = (low + high) // 2
+        timestamp = _first_timestamp_after(f, middle)
+        if timestamp is not None and timestamp < since:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def _grep_blocks(f, regex, max_lines:int, block_size:int=8388608) -> list:
+    '''
+    Fast path without context or time window: the regex is searched in big blocks, and only the matching lines are split out
+    '''
+    from collections import deque
+    selected = deque(maxlen=max_lines)
+    leftover = b''
+    while True:
+        block = f.read(block_size)
+        data = leftover + block
+        if not block:
+            cut = len(data)
+        else:
+            cut = data.rfind(b'\n') + 1
+        data, leftover = data[:cut], data[cut:]
+
+        position = 0
+        while True:
+            m = regex.search(data, position)
+            if m is None:
+                break
+            start = data.rfind(b'\n', 0, m.start()) + 1
+            end = data.find(b'\n', m.start())
+            end = len(data) if end == -1 else end + 1
+            selected.append(data[start:end])
+            position = end
+            if position >= len(data):
+                break
+
+        if not block:
+            break
+    return list(selected)
+
+
+def filter_lines(path:str, log_filter:LogFilter, max_lines:int) -> tuple:
+    '''
+    Returns the last max_lines lines of the file selected by log_filter (including the context lines and the
+    separators between the groups of non-consecutive lines), and the size of the file when it was read.
+    The file is scanned in the process manager, so that only the selected lines are sent to the client.
+    '''
+    from collections import deque
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if max_lines <= 0:
+            return [], end
+
+        if log_filter.context == 0 and log_filter.since is None and log_filter.until is None:
+            f.seek(0)
+            lines = _grep_blocks(f, log_filter.regex, max_lines)
+            return [line.decode(errors='replace') for line in lines], end
+
+        start = 0
+        if log_filter.since is not None:
+            start = _offset_before(f, end, log_filter.since)
+        f.seek(start)
+        if start > 0:
+            f.readline()
+
+        selected = deque(maxlen=max_lines)
+        before = deque(maxlen=log_filter.context) if log_filter.context else None
+        after = 0
+        last_selected = None
+        timestamp = None
+
+        for number, line in enumerate(f):
+            line_time = line_timestamp(line)
+            if line_time is not None:
+                timestamp = line_time
+
+            if log_filter.until is not None and timestamp is not None and timestamp > log_filter.until:
+                break
+            if log_filter.since is not None and (timestamp is None or timestamp < log_filter.since):
+                continue
+
+            if log_filter.regex is None or log_filter.regex.search(line):
+                first = before[0][0] if before else number
+                if last_selected is not None and first > last_selected + 1:
+                    selected.append(LogFilter.SEPARATOR.encode())
+                if before:
+                    selected.extend(l for _, l in before)
+                    before.clear()
+                selected.append(line)
+                last_selected = number
+                after = log_filter.context
+
+            elif after > 0:
+                selected.append(line)
+                last_selected = number
+                after -= 1
+
+            elif before is not None:
+                before.append((number, line))
+
+    return [line.decode(errors='replace') for line in selected], end
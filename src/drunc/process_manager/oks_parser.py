@@ -31,12 +31,13 @@ class EnvironmentVariableCannotBeSet(DruncException):
 
 
 # Recursively process all Segments in given Segment extracting Applications
-def collect_apps(db, session, segment, env:Dict[str,str], tree_prefix=[0,]) -> List[Dict]:
+def collect_apps(db, session, segment, env:Dict[str,str], tree_prefix=[0,], parent:str=None) -> List[Dict]:
   """
   ! Recustively collect (daq) application belonging to segment and its subsegments
 
   @param session  The session the segment belongs to
   @param segment  Segment to collect applications from
+  @param parent   Name of the controller of the segment's controller (None for the top segment)
 
   @return The list of dictionaries holding application attributs
 
@@ -77,6 +78,7 @@ def collect_apps(db, session, segment, env:Dict[str,str], tree_prefix=[0,]) -> L
       "host": host,
       "env": rc_env,
       "tree_id": tree_id_str,
+      "parent": parent,
       "log_path": controller.log_path,
     }
   )
@@ -88,7 +90,7 @@ def collect_apps(db, session, segment, env:Dict[str,str], tree_prefix=[0,]) -> L
       continue
 
     new_tree_prefix = tree_prefix + [idx]
-    for app in collect_apps(db, session, seg, env, new_tree_prefix):
+    for app in collect_apps(db, session, seg, env, new_tree_prefix, parent=controller.id):
       apps.append(app)
 
 
@@ -124,6 +126,7 @@ def collect_apps(db, session, segment, env:Dict[str,str], tree_prefix=[0,]) -> L
         "host": host,
         "env": app_env,
         "tree_id": app_tree_id_str,
+        "parent": controller.id,
         "log_path": app.log_path,
       }
     )
@@ -178,6 +181,7 @@ def collect_infra_apps(session, env:Dict[str, str], tree_prefix) -> List[Dict]:
         "host": host,
         "env": app_env,
         "tree_id": '.'.join(map(str, this_app_tree_prefix)),
+        "parent": None,
         "log_path": app.log_path,
       }
     )
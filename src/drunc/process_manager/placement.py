@@ -0,0 +1,98 @@
+'''
+Placement of the processes on the CPUs, NUMA nodes and cgroups of their host, applied when they are spawned, so that
+for example the memory of the readout applications is allocated on the right NUMA node from the start.
+
+The placement of a process is read from its environment, so it can be set in the application_environment of the
+applications in the configuration:
+ - DRUNC_CPUS: the CPUs the process runs on, as for taskset -c (e.g. 0-7,16-23)
+ - DRUNC_NUMA_NODE: the NUMA node(s) its memory is allocated on, as for numactl --membind (and the CPUs it runs on,
+   if DRUNC_CPUS is not set)
+ - DRUNC_MEMORY_MAX, DRUNC_CPU_QUOTA: cgroup limits (e.g. 16G, 400%), the process being started in a transient
+   systemd scope with these MemoryMax and CPUQuota
+Only the ssh process manager applies the placement, the other ones refuse to boot the processes which have one.
+'''
+import re
+
+from drunc.exceptions import DruncCommandException
+
+PLACEMENT_VARIABLES = {
+    'cpus': 'DRUNC_CPUS',
+    'numa_node': 'DRUNC_NUMA_NODE',
+    'memory_max': 'DRUNC_MEMORY_MAX',
+    'cpu_quota': 'DRUNC_CPU_QUOTA',
+}
+
+# The values end up in a shell command, so only these are accepted
+_FORMATS = {
+    'cpus': re.compile(r'\d+(-\d+)?(,\d+(-\d+)?)*'),
+    'numa_node': re.compile(r'\d+(-\d+)?(,\d+(-\d+)?)*'),
+    'memory_max': re.compile(r'\d+[KMGT]?|infinity'),
+    'cpu_quota': re.compile(r'\d+%'),
+}
+
+
+class InvalidPlacement(DruncCommandException):
+    def __init__(self, variable, value):
+        from google.rpc import code_pb2
+        super().__init__(f'Invalid process placement {variable}=\'{value}\'', code_pb2.INVALID_ARGUMENT)
+
+
+class PlacementNotSupported(DruncCommandException):
+    def __init__(self, variables:list, process_manager:str):
+        from google.rpc import code_pb2
+        super().__init__(f'The {process_manager} process manager cannot apply the process placement ({", ".join(variables)})', code_pb2.UNIMPLEMENTED)
+
+
+def check_no_placement(env, process_manager:str) -> None:
+    '''
+    Raises PlacementNotSupported if a placement is set in env, for the process managers which cannot apply it
+    '''
+    variables = [variable for variable in PLACEMENT_VARIABLES.values() if env.get(variable, '').strip()]
+    if variables:
+        raise PlacementNotSupported(variables, process_manager)
+
+
+def get_placement(env) -> dict:
+    '''
+    Returns the placement set in env (a dict or the env of a ProcessDescription), as {'cpus', 'numa_node',
+    'memory_max', 'cpu_quota'} for the ones that are set
+    '''
+    placement = {}
+    for key, variable in PLACEMENT_VARIABLES.items():
+        value = env.get(variable, '').strip()
+        if not value:
+            continue
+        if not _FORMATS[key].fullmatch(value):
+            raise InvalidPlacement(variable, value)
+        placement[key] = value
+    return placement
+
+
+def placement_prefix(placement:dict) -> str:
+    '''
+    Returns the commands to prepend to an executable to start it with placement
+    '''
+    prefix = ''
+    limits = [f'-p MemoryMax={placement["memory_max"]}'] if 'memory_max' in placement else []
+    limits += [f'-p CPUQuota={placement["cpu_quota"]}'] if 'cpu_quota' in placement else []
+    if limits:
+        prefix += f'systemd-run --user --scope --quiet {" ".join(limits)} -- '
+
+    if 'numa_node' in placement:
+        cpus = f'--physcpubind={placement["cpus"]}' if 'cpus' in placement else f'--cpunodebind={placement["numa_node"]}'
+        prefix += f'numactl --membind={placement["numa_node"]} {cpus} -- '
+    elif 'cpus' in placement:
+        prefix += f'taskset -c {placement["cpus"]} '
+    return prefix
+
+
+def format_placement(env) -> str:
+    '''
+    Short description of the placement set in env, for ps
+    '''
+    try:
+        placement = get_placement(env)
+    except InvalidPlacement:
+        return 'invalid'
+    names = {'cpus': 'cpus', 'numa_node': 'numa', 'memory_max': 'mem', 'cpu_quota': 'cpu'}
+    return ' '.join(f'{names[key]}={value}' for key, value in placement.items())
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import threading
+
+
+class ProcessEventType:
+    SNAPSHOT = 'snapshot' # state of a process when the watch starts (or resynchronises)
+    BOOTED = 'booted'
+    EXITED = 'exited'
+    RESTARTED = 'restarted'
+    FLUSHED = 'flushed'
+
+
+class ProcessEvents:
+    '''
+    Fans the changes of the processes out to the watch streams.
+
+    publish() can be called from any thread (commands, reaper...), and each subscriber gets the events on the
+    event loop it subscribed from, in an asyncio.Queue. A subscriber which does not keep up is not allowed to
+    hold an unbounded backlog: its queue is emptied and replaced by RESYNC, after which it should send a new snapshot.
+    '''
+    RESYNC = object()
+
+    def __init__(self, max_backlog:int=1000):
+        self.log = logging.getLogger('process_events')
+        self.max_backlog = max_backlog
+        self._lock = threading.Lock()
+        self._subscribers = {} # queue -> event loop
+
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+
+    def unsubscribe(self, queue:asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+
+    def _put(self, queue:asyncio.Queue, item) -> None:
+        if queue.qsize() >= self.max_backlog:
+            while not queue.empty():
+                queue.get_nowait()
+            item = self.RESYNC
+        queue.put_nowait(item)
+
+
+    def publish(self, event:str, process_instance) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, (event, process_instance))
+            except RuntimeError: # the loop is closed
+                self.unsubscribe(queue)
@@ -0,0 +1,134 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def compile_name_regex(pattern:str):
+    return re.compile(pattern)
+
+
+def query_matches(query, uuid:str, metadata) -> bool:
+    '''
+    Whether a process is selected by a ProcessQuery, with the same rules as ProcessIndex.query (for processes
+    which are not, or no longer, in the index)
+    '''
+    if any(uid.uuid == uuid for uid in query.uuids):
+        return True
+    if any(compile_name_regex(pattern).search(metadata.name) for pattern in query.names):
+        return True
+    # as in select, an empty session or user (the default of a ProcessQuery) selects the processes without one
+    if query.session is not None and metadata.session == query.session:
+        return True
+    return query.user is not None and metadata.user == query.user
+
+
+class ProcessIndex:
+    '''
+    Secondary indices (by uuid, name, session and user) over the boot requests of a process manager, so that
+    queries cost time proportional to the number of processes they select rather than the number of processes
+    known. It mirrors self.boot_request: processes are added once their boot request is stored and removed when
+    it is deleted.
+
+    Name selectors are regexes searched in the process names; the set of names matching each recently used
+    regex is kept up to date as processes come and go.
+    '''
+    def __init__(self, max_cached_patterns:int=128):
+        self._lock = threading.Lock()
+        self._order = {} # uuid -> insertion number, the results are returned in boot order
+        self._counter = 0
+        self._metadata = {} # uuid -> (name, session, user)
+        self._by_name = {}
+        self._by_session = {}
+        self._by_user = {}
+        self._name_matches = OrderedDict() # regex -> names matching it
+        self.max_cached_patterns = max_cached_patterns
+
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+    def __contains__(self, uuid:str) -> bool:
+        return uuid in self._order
+
+
+    def add(self, uuid:str, metadata) -> None:
+        with self._lock:
+            self._remove(uuid)
+            self._counter += 1
+            self._order[uuid] = self._counter
+            self._metadata[uuid] = (metadata.name, metadata.session, metadata.user)
+
+            if metadata.name not in self._by_name:
+                for pattern, names in self._name_matches.items():
+                    if compile_name_regex(pattern).search(metadata.name):
+                        names.add(metadata.name)
+            self._by_name.setdefault(metadata.name, set()).add(uuid)
+            self._by_session.setdefault(metadata.session, set()).add(uuid)
+            self._by_user.setdefault(metadata.user, set()).add(uuid)
+
+
+    def remove(self, uuid:str) -> None:
+        with self._lock:
+            self._remove(uuid)
+
+
+    def _remove(self, uuid:str) -> None:
+        if uuid not in self._order:
+            return
+        del self._order[uuid]
+        name, session, user = self._metadata.pop(uuid)
+
+        for index, key in [(self._by_name, name), (self._by_session, session), (self._by_user, user)]:
+            index[key].discard(uuid)
+            if not index[key]:
+                del index[key]
+
+        if name not in self._by_name:
+            for names in self._name_matches.values():
+                names.discard(name)
+
+
+    def _names_matching(self, pattern:str) -> set:
+        names = self._name_matches.get(pattern)
+        if names is not None:
+            self._name_matches.move_to_end(pattern)
+            return names
+
+        regex = compile_name_regex(pattern)
+        names = {name for name in self._by_name if regex.search(name)}
+        self._name_matches[pattern] = names
+        if len(self._name_matches) > self.max_cached_patterns:
+            self._name_matches.popitem(last=False)
+        return names
+
+
+    def select(self, uuids=(), names=(), session:str=None, user:str=None) -> list:
+        '''
+        Returns the uuids of the processes matching any of the selectors, in boot order
+        '''
+        with self._lock:
+            selected = {uuid for uuid in uuids if uuid in self._order}
+
+            for pattern in names:
+                for name in self._names_matching(pattern):
+                    selected |= self._by_name[name]
+
+            if session is not None:
+                selected |= self._by_session.get(session, set())
+
+            if user is not None:
+                selected |= self._by_user.get(user, set())
+
+            return sorted(selected, key=self._order.__getitem__)
+
+
+    def query(self, query) -> list:
+        return self.select(
+            uuids = [uid.uuid for uid in query.uuids],
+            names = query.names,
+            session = query.session,
+            user = query.user,
+        )
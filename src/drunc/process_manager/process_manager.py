@@ -2,12 +2,14 @@ from druncschema.authoriser_pb2 import ActionType, SystemType
 from druncschema.broadcast_pb2 import BroadcastType
 from druncschema.process_manager_pb2 import BootRequest, ProcessQuery, ProcessInstance, ProcessRestriction, ProcessDescription, ProcessUUID, ProcessInstanceList, LogRequest, LogLine
 from druncschema.process_manager_pb2_grpc import ProcessManagerServicer
-from druncschema.request_response_pb2 import Request, Response, ResponseFlag
+from druncschema.request_response_pb2 import Response, ResponseFlag
+from google.protobuf.struct_pb2 import Struct
 
 from drunc.authoriser.decorators import authentified_and_authorised, async_authentified_and_authorised
 from drunc.broadcast.server.decorators import broadcasted, async_broadcasted
 from drunc.exceptions import DruncCommandException
 from drunc.process_manager.configuration import ProcessManagerConfHandler, ProcessManagerTypes
+from drunc.process_manager.process_events import ProcessEventType
 from drunc.utils.grpc_utils import unpack_request_data_to, async_unpack_request_data_to,pack_to_any
 from drunc.utils.utils import pid_info_str
 
@@ -61,6 +63,18 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
 
         self.process_store = {} # dict[str, sh.RunningCommand]
         self.boot_request = {} # dict[str, BootRequest]
+        from drunc.process_manager.process_index import ProcessIndex
+        self.process_index = ProcessIndex() # indices over self.boot_request, to be kept in sync with it
+        # The commands run concurrently in the threads of the server: this is held while processes are added to or removed from
+        # the stores above, and to take copies of them, but never while waiting on processes, so that a long kill does not block ps or logs
+        import threading
+        self.process_lock = threading.RLock()
+        from drunc.process_manager.process_events import ProcessEvents
+        self.process_events = ProcessEvents() # changes of the processes, streamed by watch
+        self.resource_sampler = None # ResourceSampler, if the implementation can measure its processes
+        from concurrent.futures import ThreadPoolExecutor
+        self.boot_executor = ThreadPoolExecutor(max_workers=self.configuration.data.boot_max_concurrency, thread_name_prefix='boot') # runs the boots of boot_batch
+        self._host_boot_limits = {} # host -> threading.BoundedSemaphore, see host_boot_slot
 
         from druncschema.request_response_pb2 import CommandDescription
         # TODO, probably need to think of a better way to do this?
@@ -95,6 +109,13 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
                 return_type = 'process_manager_pb2.ProcessInstance'
             ),
 
+            CommandDescription(
+                name = 'boot_batch',
+                data_type = ['process_manager_pb2.BootRequest (stream)'],
+                help = 'Start all the processes streamed, concurrently. Note this is an ASYNC function',
+                return_type = 'process_manager_pb2.ProcessInstance (stream)'
+            ),
+
             CommandDescription(
                 name = 'terminate',
                 data_type = ['process_manager_pb2.ProcessQuery'],
@@ -116,12 +137,33 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
                 return_type = 'process_manager_pb2.LogLine'
             ),
 
+            CommandDescription(
+                name = 'read_logs',
+                data_type = ['google.protobuf.Struct'],
+                help = 'Same as logs, with the options the LogRequest cannot hold (follow, grep, context, time window, lines per LogLine). Note this is an ASYNC function',
+                return_type = 'process_manager_pb2.LogLine'
+            ),
+
             CommandDescription(
                 name = 'ps',
                 data_type = ['process_manager_pb2.ProcessQuery'],
                 help = 'Get the status of the listed process from the process query input (can be multiple).',
                 return_type = 'process_manager_pb2.ProcessInstance'
             ),
+
+            CommandDescription(
+                name = 'metrics',
+                data_type = ['process_manager_pb2.ProcessQuery'],
+                help = 'Get the last CPU, memory, threads and I/O samples of the listed process from the process query input (can be multiple).',
+                return_type = 'google.protobuf.Struct'
+            ),
+
+            CommandDescription(
+                name = 'watch',
+                data_type = ['process_manager_pb2.ProcessQuery'],
+                help = 'Stream the state of the listed processes from the process query input, then their changes (booted, exited, restarted, flushed) as they happen. Note this is an ASYNC function',
+                return_type = 'google.protobuf.Struct (stream)'
+            ),
         ]
 
         self.broadcast(
@@ -167,6 +209,7 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
         self.log.debug(f"{self.name} booting \'{br.process_description.metadata.name}\' from session \'{br.process_description.metadata.session}\'")
         try:
             resp = self._boot_impl(br)
+            self.process_events.publish(ProcessEventType.BOOTED, resp)
             return Response(
                 name = self.name,
                 token = None,
@@ -184,10 +227,105 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
             )
 
 
+    async def boot_batch(self, request_iterator, context):
+        '''
+        Boots the processes of all the BootRequests streamed by the client concurrently, with at most
+        boot_max_concurrency processes being spawned at the same time (by the boot executor, boot_max_concurrency_per_host
+        per host, see host_boot_slot). Streams back the ProcessInstances as soon as each process is spawned (not in the
+        order of the requests).
+        '''
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self.log.info(f"{self.name} booting a batch of processes (maximum {self.configuration.data.boot_max_concurrency} at the same time, {self.configuration.data.boot_max_concurrency_per_host} per host)")
+
+        responses = asyncio.Queue()
+
+        async def boot_one(request):
+            name = self.name # replaced with the process name once known, so the client knows which boot failed
+            try:
+                from drunc.utils.grpc_utils import unpack_any
+                br = unpack_any(request.data, BootRequest)
+                name = br.process_description.metadata.name
+
+                if not self.authoriser.is_authorised(request.token, ActionType.CREATE, SystemType.PROCESS_MANAGER, 'boot'):
+                    from druncschema.generic_pb2 import PlainText
+                    await responses.put(Response(
+                        name = name,
+                        token = request.token,
+                        data = pack_to_any(PlainText(text = f"User {request.token.user_name} is not authorised to execute boot on {self.name}")),
+                        flag = ResponseFlag.NOT_EXECUTED_NOT_AUTHORISED,
+                        children = [],
+                    ))
+                    return
+
+                pi = await loop.run_in_executor(self.boot_executor, self._boot_impl, br)
+                self.process_events.publish(ProcessEventType.BOOTED, pi)
+
+                await responses.put(Response(
+                    name = self.name,
+                    token = None,
+                    data = pack_to_any(pi),
+                    flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+                    children = [],
+                ))
+
+            except Exception as e: # we are in a task, and the other processes still need to boot
+                import traceback
+                from druncschema.generic_pb2 import Stacktrace
+                from drunc.exceptions import DruncException
+                self.log.error(f'Could not boot \'{name}\': {str(e)}')
+                await responses.put(Response(
+                    name = name,
+                    token = request.token,
+                    data = pack_to_any(Stacktrace(text = traceback.format_exc().split("\n"))),
+                    flag = ResponseFlag.DRUNC_EXCEPTION_THROWN if isinstance(e, DruncException) else ResponseFlag.UNHANDLED_EXCEPTION_THROWN,
+                    children = [],
+                ))
+
+        async def boot_all():
+            tasks = []
+            try:
+                async for request in request_iterator:
+                    tasks.append(asyncio.create_task(boot_one(request)))
+                await asyncio.gather(*tasks)
+            finally:
+                await responses.put(None)
+
+        booter = asyncio.create_task(boot_all())
+        while (response := await responses.get()) is not None:
+            yield response
+        await booter
+
+        self.broadcast(
+            message = 'Booted a batch of processes',
+            btype = BroadcastType.COMMAND_EXECUTION_SUCCESS
+        )
+
+
+    def host_boot_slot(self, host:str):
+        '''
+        Held by the implementations while they start a process on host, so that at most boot_max_concurrency_per_host
+        processes are being started on it at the same time (whichever of the allowed hosts they end up on)
+        '''
+        with self.process_lock:
+            limit = self._host_boot_limits.get(host)
+            if limit is None:
+                import threading
+                limit = threading.BoundedSemaphore(self.configuration.data.boot_max_concurrency_per_host)
+                self._host_boot_limits[host] = limit
+        return limit
+
+
     @abc.abstractmethod
     def _terminate_impl(self) -> ProcessInstanceList:
         raise NotImplementedError
 
+    def _forget_process(self, uuid:str) -> None:
+        '''
+        Called when a process is removed from the process store, so that the implementations can free what they hold for it
+        '''
+        pass
+
     # ORDER MATTERS!
     @broadcasted # outer most wrapper 1st step
     @authentified_and_authorised(
@@ -197,6 +335,7 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
     @unpack_request_data_to(None) # 3rd step
     def terminate(self) -> Response:
         self.log.info(f"{self.name} terminating")
+        self.boot_executor.shutdown(wait=False, cancel_futures=True)
         try:
             resp = self._terminate_impl()
             return Response(
@@ -230,6 +369,7 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
         self.log.info(f"{self.name} running restart")
         try:
             resp = self._restart_impl(q)
+            self.process_events.publish(ProcessEventType.RESTARTED, resp)
             return Response(
                 name = self.name,
                 token = None,
@@ -310,6 +450,54 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
                 children = [],
             )
 
+    def _metrics_impl(self, q:ProcessQuery) -> Struct:
+        if self.resource_sampler is None:
+            raise NotImplementedError
+
+        metrics = Struct()
+        for uuid in self._get_process_uid(q):
+            with self.process_lock:
+                br = self.boot_request.get(uuid)
+            if br is None: # removed in the meantime
+                continue
+            m = br.process_description.metadata
+            metrics.update({
+                uuid: {
+                    'name': m.name,
+                    'session': m.session,
+                    'host': m.hostname,
+                    'samples': self.resource_sampler.samples(uuid),
+                }
+            })
+        return metrics
+
+    # ORDER MATTERS!
+    @broadcasted # outer most wrapper 1st step
+    @authentified_and_authorised(
+        action=ActionType.READ,
+        system=SystemType.PROCESS_MANAGER
+    ) # 2nd step
+    @unpack_request_data_to(ProcessQuery) # 3rd step
+    def metrics(self, q:ProcessQuery) -> Response:
+        self.log.debug(f"{self.name} running metrics")
+        try:
+            resp = self._metrics_impl(q)
+            return Response(
+                name = self.name,
+                token = None,
+                data = pack_to_any(resp),
+                flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+                children = [],
+            )
+        except NotImplementedError:
+            return Response(
+                name = self.name,
+                token = None,
+                data = None,
+                flag = ResponseFlag.NOT_EXECUTED_NOT_IMPLEMENTED,
+                children = [],
+            )
+
     # ORDER MATTERS!
     @broadcasted # outer most wrapper 1st step
     @authentified_and_authorised(
@@ -321,43 +509,46 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
         self.log.debug(f"{self.name} running flush")
         ret = []
 
-        for uuid in self._get_process_uid(query):
-
-            if uuid not in self.boot_request:
+        with self.process_lock: # nothing here waits on the processes
+            for uuid in self._get_process_uid(query):
+
+                if uuid not in self.boot_request:
+                    pu = ProcessUUID(uuid=uuid)
+                    pi = ProcessInstance(
+                        process_description = ProcessDescription(),
+                        process_restriction = ProcessRestriction(),
+                        status_code = ProcessInstance.StatusCode.DEAD,
+                        return_code = None,
+                        uuid = pu
+                    )
+                    ret += [pi]
+                    continue
+
+                pd = ProcessDescription()
+                pd.CopyFrom(self.boot_request[uuid].process_description)
+                pr = ProcessRestriction()
+                pr.CopyFrom(self.boot_request[uuid].process_restriction)
                 pu = ProcessUUID(uuid=uuid)
-                pi = ProcessInstance(
-                    process_description = ProcessDescription(),
-                    process_restriction = ProcessRestriction(),
-                    status_code = ProcessInstance.StatusCode.DEAD,
-                    return_code = None,
-                    uuid = pu
-                )
-                ret += [pi]
-                continue
 
-            pd = ProcessDescription()
-            pd.CopyFrom(self.boot_request[uuid].process_description)
-            pr = ProcessRestriction()
-            pr.CopyFrom(self.boot_request[uuid].process_restriction)
-            pu = ProcessUUID(uuid=uuid)
-
-            return_code = None
-            try:
-                if not self.process_store[uuid].is_alive(): # OMG!! remove this implementation code
-                    return_code = self.process_store[uuid].exit_code
-            except Exception:
-                pass
-
-            if not self.process_store[uuid].is_alive():
-                pi = ProcessInstance(
-                    process_description = pd,
-                    process_restriction = pr,
-                    status_code = ProcessInstance.StatusCode.RUNNING if self.process_store[uuid].is_alive() else ProcessInstance.StatusCode.DEAD,
-                    return_code = return_code,
-                    uuid = pu
-                )
-                del self.process_store[uuid]
-                ret += [pi]
+                return_code = None
+                try:
+                    if not self.process_store[uuid].is_alive(): # OMG!! remove this implementation code
+                        return_code = self.process_store[uuid].exit_code
+                except Exception:
+                    pass
+
+                if not self.process_store[uuid].is_alive():
+                    pi = ProcessInstance(
+                        process_description = pd,
+                        process_restriction = pr,
+                        status_code = ProcessInstance.StatusCode.RUNNING if self.process_store[uuid].is_alive() else ProcessInstance.StatusCode.DEAD,
+                        return_code = return_code,
+                        uuid = pu
+                    )
+                    del self.process_store[uuid]
+                    self._forget_process(uuid)
+                    self.process_events.publish(ProcessEventType.FLUSHED, pi)
+                    ret += [pi]
 
         pil = ProcessInstanceList(
             values=ret
@@ -404,20 +595,15 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
 
 
     @abc.abstractmethod
-    async def _logs_impl(self, req:Request, context) -> LogLine:
+    async def _logs_impl(self, log_request:LogRequest, follow:bool=False, log_filter=None, chunk_size:int=1) -> LogLine:
+        '''
+        Yields LogLines, each holding up to chunk_size lines
+        '''
         raise NotImplementedError
 
-    # ORDER MATTERS!
-    @async_broadcasted # outer most wrapper 1st step
-    @async_authentified_and_authorised(
-        action=ActionType.READ,
-        system=SystemType.PROCESS_MANAGER
-    ) # 2nd step
-    @async_unpack_request_data_to(LogRequest) # 3rd step
-    async def logs(self, lr:LogRequest) -> Response:
-        self.log.debug("Getting logs")
+    async def _stream_logs(self, lr:LogRequest, **options) -> Response:
         try:
-            async for r in self._logs_impl(lr):
+            async for r in self._logs_impl(lr, **options):
                 yield Response(
                     name = self.name,
                     token = None,
@@ -434,6 +620,115 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
                 children = [],
             )
 
+    # ORDER MATTERS!
+    @async_broadcasted # outer most wrapper 1st step
+    @async_authentified_and_authorised(
+        action=ActionType.READ,
+        system=SystemType.PROCESS_MANAGER
+    ) # 2nd step
+    @async_unpack_request_data_to(LogRequest) # 3rd step
+    async def logs(self, lr:LogRequest) -> Response:
+        self.log.debug("Getting logs")
+        async for r in self._stream_logs(lr):
+            yield r
+
+    # ORDER MATTERS!
+    @async_broadcasted # outer most wrapper 1st step
+    @async_authentified_and_authorised(
+        action=ActionType.READ,
+        system=SystemType.PROCESS_MANAGER
+    ) # 2nd step
+    @async_unpack_request_data_to(Struct) # 3rd step
+    async def read_logs(self, options:Struct) -> Response:
+        from drunc.process_manager.utils import unpack_log_options
+        lr, options = unpack_log_options(options)
+        self.log.debug(f"Getting logs with {options}")
+
+        import re
+        from drunc.process_manager.log_reader import LogFilter
+        try:
+            log_filter = LogFilter(
+                grep = options.get('grep'),
+                ignore_case = options.get('ignore_case', False),
+                context = int(options.get('context', 0)),
+                since = options.get('since'),
+                until = options.get('until'),
+            )
+        except re.error as e:
+            # the shell checks it, but not all the clients do
+            yield Response(
+                name = self.name,
+                token = None,
+                data = pack_to_any(LogLine(line = f'Could not retrieve logs: invalid grep regular expression \'{options.get("grep")}\': {str(e)}')),
+                flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+                children = [],
+            )
+            return
+
+        async for r in self._stream_logs(
+            lr,
+            follow = options.get('follow', False),
+            log_filter = log_filter if log_filter.active() else None,
+            chunk_size = max(1, int(options.get('chunk_size', 1))),
+            ):
+            yield r
+
+    def _event_response(self, event:str, pi:ProcessInstance) -> Response:
+        from drunc.process_manager.utils import pack_process_event
+        return Response(
+            name = self.name,
+            token = None,
+            data = pack_to_any(pack_process_event(event, pi)),
+            flag = ResponseFlag.EXECUTED_SUCCESSFULLY,
+            children = [],
+        )
+
+    # ORDER MATTERS!
+    @async_broadcasted # outer most wrapper 1st step
+    @async_authentified_and_authorised(
+        action=ActionType.READ,
+        system=SystemType.PROCESS_MANAGER
+    ) # 2nd step
+    @async_unpack_request_data_to(ProcessQuery) # 3rd step
+    async def watch(self, q:ProcessQuery) -> Response:
+        '''
+        Streams a snapshot of the processes selected by the query, then their changes until the client goes away
+        '''
+        import asyncio
+        from drunc.process_manager.process_index import query_matches
+        self.log.debug(f"{self.name} watching processes")
+
+        # subscribed before the snapshot is taken, so no change is missed in between
+        events = self.process_events.subscribe()
+        try:
+            resync = True
+            while True:
+                if resync:
+                    try:
+                        pil = await asyncio.to_thread(self._ps_impl, q)
+                    except NotImplementedError:
+                        yield Response(
+                            name = self.name,
+                            token = None,
+                            data = None,
+                            flag = ResponseFlag.NOT_EXECUTED_NOT_IMPLEMENTED,
+                            children = [],
+                        )
+                        return
+                    for pi in pil.values:
+                        yield self._event_response(ProcessEventType.SNAPSHOT, pi)
+                    resync = False
+
+                item = await events.get()
+                if item is self.process_events.RESYNC:
+                    resync = True
+                    continue
+                event, pi = item
+                if query_matches(q, pi.uuid.uuid, pi.process_description.metadata):
+                    yield self._event_response(event, pi)
+        finally:
+            self.process_events.unsubscribe(events)
+
     def _ensure_one_process(self, uuids:[str], in_boot_request:bool=False) -> str:
         if uuids == []:
             raise BadQuery('The process corresponding to the query doesn\'t exist')
@@ -450,37 +745,11 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
 
 
     def _get_process_uid(self, query:ProcessQuery, in_boot_request:bool=False) -> [str]:
-        import re
-
-        uuid_selector = []
-        name_selector = query.names
-        user_selector = query.user
-        session_selector = query.session
         # relevant reading here: https://github.com/protocolbuffers/protobuf/blob/main/docs/field_presence.md
-
-        for uid in query.uuids:
-            uuid_selector += [uid.uuid]
-
-        processes = []
-        all_the_uuids = self.process_store.keys() if not in_boot_request else self.boot_request.keys()
-
-        for uuid in all_the_uuids:
-            accepted = False
-            meta = self.boot_request[uuid].process_description.metadata
-
-            if uuid in uuid_selector: accepted = True
-
-            for name_reg in name_selector:
-                if re.search(name_reg, meta.name):
-                    accepted = True
-
-            if session_selector == meta.session: accepted = True
-
-            if user_selector == meta.user: accepted = True
-
-            if accepted: processes.append(uuid)
-
-        return processes
+        uuids = self.process_index.query(query)
+        if in_boot_request:
+            return uuids
+        return [uuid for uuid in uuids if uuid in self.process_store]
 
     @staticmethod
     def get(conf, **kwargs):
@@ -491,6 +760,10 @@ class ProcessManager(abc.ABC, ProcessManagerServicer):
             log.info('Starting \'SSHProcessManager\'')
             from drunc.process_manager.ssh_process_manager import SSHProcessManager
             return SSHProcessManager(conf, **kwargs)
+        elif conf.data.type == ProcessManagerTypes.Agents:
+            log.info('Starting \'AgentProcessManager\'')
+            from drunc.process_manager.agent_process_manager import AgentProcessManager
+            return AgentProcessManager(conf, **kwargs)
         elif conf.data.type == ProcessManagerTypes.K8s:
             log.info('Starting \'K8sProcessManager\'')
             from drunc.process_manager.k8s_process_manager import K8sProcessManager
@@ -20,11 +20,14 @@ class ProcessManagerDriver(GRPCDriver):
             token = token,
             **kwargs
         )
+        from drunc.process_manager.boot_plan import BootPlanCache
+        self.boot_plans = BootPlanCache()
 
 
     def create_stub(self, channel):
         from druncschema.process_manager_pb2_grpc import ProcessManagerStub
-        return ProcessManagerStub(channel)
+        from drunc.process_manager.utils import add_extension_commands_to_stub
+        return add_extension_commands_to_stub(ProcessManagerStub(channel), channel)
 
 
     async def _convert_oks_to_boot_request(
@@ -34,7 +37,9 @@ class ProcessManagerDriver(GRPCDriver):
         session_dal,
         db,
         session_name:str,
-        override_logs:bool
+        override_logs:bool,
+        boot_tree:dict=None,
+        log_paths:dict=None,
         ) -> BootRequest:
 
         from drunc.process_manager.oks_parser import collect_apps, collect_infra_apps
@@ -70,6 +75,8 @@ class ProcessManagerDriver(GRPCDriver):
             env['DUNE_DAQ_BASE_RELEASE'] = os.getenv("DUNE_DAQ_BASE_RELEASE")
             env['SPACK_RELEASES_DIR'] = os.getenv("SPACK_RELEASES_DIR")
             tree_id = app['tree_id']
+            if boot_tree is not None:
+                boot_tree[name] = app['parent']
             self._log.debug(f"{name}:\n{json.dumps(app, indent=4)}")
             executable_and_arguments = []
 
@@ -94,6 +101,8 @@ class ProcessManagerDriver(GRPCDriver):
 
             if app_log_path == './':
                 app_log_path = pwd
+            if log_paths is not None:
+                log_paths[name] = {'app_log_path': app_log_path, 'session_log_path': session_log_path}
 
             from drunc.process_manager.utils import get_log_path
             log_path = get_log_path(
@@ -132,20 +141,10 @@ class ProcessManagerDriver(GRPCDriver):
             self._log.debug(f"{breq=}\n\n")
             yield breq
 
-    async def boot(
-        self,
-        conf:str,
-        user:str,
-        session_name:str,
-        log_level:str,
-        override_logs:bool=True,
-        **kwargs
-        ) -> ProcessInstance:
-        self._log.info(f"Booting session {session_name}")
-        import conffwk
-        from drunc.utils.configuration import find_configuration
-        oks_conf = find_configuration(conf)
-
+    async def _make_boot_plan(self, oks_conf:str, conf:str, user:str, session_name:str, override_logs:bool, **kwargs):
+        '''
+        Reads the configuration to build the boot plan of the session, returns None if the configuration is invalid
+        '''
         with tempfile.NamedTemporaryFile(suffix='.data.xml', delete=True) as f:
             f.flush()
             f.seek(0)
@@ -161,43 +160,133 @@ To debug it, close drunc and run the following command:
 [yellow]oks_dump --files-only {oks_conf}[/]
 
 ''', extra={'markup': True})
-                return
+                return None
 
+        import conffwk
         db = conffwk.Configuration(f"oksconflibs:{oks_conf}")
         session_dal = db.get_dal(class_name="Session", uid=session_name)
 
-
-        async for br in self._convert_oks_to_boot_request(
+        boot_tree = {}
+        log_paths = {}
+        boot_requests = [br async for br in self._convert_oks_to_boot_request(
             oks_conf = conf,
             user = user,
             session_dal = session_dal,
             session_name = session_name,
             db = db,
             override_logs = override_logs,
+            boot_tree = boot_tree,
+            log_paths = log_paths,
             **kwargs,
+        )]
+
+        top_controller = session_dal.segment.controller
+        controller = {
+            'name': top_controller.id,
+            'connectivity_service': None,
+            # root-controller timout to find all its children + 60s for the root controller to start itself
+            'lookup_timeout': get_segment_lookup_timeout(session_dal.segment, 60) + 60,
+            'host': None,
+            'port': None,
+            'protocol': None,
+        }
+        if session_dal.connectivity_service:
+            controller['connectivity_service'] = {
+                'host': session_dal.connectivity_service.host,
+                'port': session_dal.connectivity_service.service.port,
+            }
+        for service in top_controller.exposes_service:
+            if service.id == top_controller.id + "_control":
+                controller['port'] = service.port
+                controller['protocol'] = service.protocol
+                controller['host'] = top_controller.runs_on.runs_on.id
+                break
+
+        from drunc.process_manager.boot_plan import BootPlan
+        return BootPlan(boot_requests, boot_tree, log_paths, controller)
+
+
+    async def boot(
+        self,
+        conf:str,
+        user:str,
+        session_name:str,
+        log_level:str,
+        override_logs:bool=True,
+        controller_boot_threshold:float=1.,
+        use_boot_plan_cache:bool=True,
+        **kwargs
+        ) -> ProcessInstance:
+        self._log.info(f"Booting session {session_name}")
+        from drunc.utils.configuration import find_configuration
+        oks_conf = find_configuration(conf)
+
+        from drunc.process_manager.boot_plan import boot_plan_key
+        try:
+            key = boot_plan_key(oks_conf, session_name, user)
+        except Exception as e:
+            self._log.debug(f'Not using the boot plan cache, the configuration files could not be hashed: {str(e)}')
+            key = None
+
+        plan = self.boot_plans.get(key) if key is not None and use_boot_plan_cache else None
+        if plan is not None:
+            self._log.info(f'Configuration unchanged since it was last booted, using the cached boot plan of {session_name}')
+        else:
+            plan = await self._make_boot_plan(oks_conf, conf, user, session_name, override_logs, **kwargs)
+            if plan is None:
+                return
+            if key is not None:
+                self.boot_plans.put(key, plan)
+
+        # All the requests are built before booting anything, so that an invalid configuration does not leave a half-booted session
+        boot_requests = plan.boot_requests_for(user, session_name, override_logs)
+        boot_tree = plan.boot_tree
+
+        from drunc.process_manager.boot_scheduler import BootScheduler
+        scheduler = BootScheduler(boot_tree, controller_boot_threshold)
+        import asyncio
+        progress = asyncio.Event()
+
+        async def scheduled_boot_requests():
+            while True:
+                for name in scheduler.pop_ready():
+                    self._log.debug(f'Releasing \'{name}\' for boot')
+                    yield boot_requests[name]
+                if scheduler.all_released():
+                    return
+                await progress.wait()
+                progress.clear()
+
+        async for response in self.send_stream_for_aio(
+            'boot_batch',
+            data = scheduled_boot_requests(),
+            outformat = ProcessInstance,
             ):
-            yield await self.send_command_aio(
-                'boot',
-                data = br,
-                outformat = ProcessInstance,
-            )
+            # Failed boots are named after the process they were booting, so the controllers above them are not held back
+            if response is None:
+                scheduler.release_all()
+            elif isinstance(response.data, ProcessInstance):
+                scheduler.notify_spawned(response.data.process_description.metadata.name)
+            else:
+                scheduler.notify_spawned(response.name)
+            progress.set()
+            yield response
 
-        top_controller_name = session_dal.segment.controller.id
+        controller = plan.controller
+        top_controller_name = controller['name']
+        connectivity_service = controller['connectivity_service']
 
-        def get_controller_address(session_dal, session_name):
-            from drunc.process_manager.oks_parser import collect_variables
-            env = {}
-            collect_variables(session_dal.environment, env)
-            if session_dal.connectivity_service:
-                connection_server = session_dal.connectivity_service.host
-                connection_port = session_dal.connectivity_service.service.port
+        def get_controller_address(session_name):
+            if connectivity_service:
+                connection_server = connectivity_service['host']
+                connection_port = connectivity_service['port']
 
                 from drunc.connectivity_service.client import ConnectivityServiceClient, ApplicationLookupUnsuccessful
                 csc = ConnectivityServiceClient(session_name, f'{connection_server}:{connection_port}')
 
                 from drunc.utils.utils import get_control_type_and_uri_from_connectivity_service
                 try:
-                    timeout = get_segment_lookup_timeout(session_dal.segment, 60) + 60 # root-controller timout to find all its children + 60s for the root controller to start itself
+                    timeout = controller['lookup_timeout']
                     self._log.debug(f'Using a timeout of {timeout}s to find the [green]{top_controller_name}[/] on the connectivity service', extra={"markup": True})
                     _, uri = get_control_type_and_uri_from_connectivity_service(
                         csc,
@@ -233,20 +322,11 @@ To find the controller address, you can look up \'{top_controller_name}_control\
 
                 return uri.replace('grpc://', '')
 
-            service_id = top_controller_name + "_control"
-            port_number = None
-            protocol = None
-
-            for service in session_dal.segment.controller.exposes_service:
-                if service.id == service_id:
-                    port_number = service.port
-                    protocol = service.protocol
-                    break
-            if port_number is None or protocol is None:
+            if controller['port'] is None or controller['protocol'] is None:
                 return None
 
-            ip = resolve_localhost_and_127_ip_to_network_ip(session_dal.segment.controller.runs_on.runs_on.id)
-            return f'{ip}:{port_number}'
+            ip = resolve_localhost_and_127_ip_to_network_ip(controller['host'])
+            return f'{ip}:{controller["port"]}'
 
         import signal
         def keyboard_interrupt_on_sigint(signal, frame):
@@ -256,11 +336,11 @@ To find the controller address, you can look up \'{top_controller_name}_control\
         original_sigint_handler = signal.getsignal(signal.SIGINT)
         signal.signal(signal.SIGINT, keyboard_interrupt_on_sigint)
         try:
-            self.controller_address = get_controller_address(session_dal, session_name)
+            self.controller_address = get_controller_address(session_name)
         except KeyboardInterrupt:
-            if session_dal.connectivity_service:
-                connection_server = session_dal.connectivity_service.host
-                connection_port = session_dal.connectivity_service.service.port
+            if connectivity_service:
+                connection_server = connectivity_service['host']
+                connection_port = connectivity_service['port']
                 self._log.warning(f"""This shell didn't connect to the {top_controller_name}.
 To find the controller address, you can look up \'{top_controller_name}_control\' on http://{resolve_localhost_to_hostname(connection_server)}:{connection_port} (you may need a SOCKS proxy from outside CERN), or use the address from the logs as above. Then just connect this shell to the controller with:
 [yellow]connect {{controller_address}}:{{controller_port}}>[/]
@@ -322,15 +402,36 @@ To find the controller address, you can look up \'{top_controller_name}_control\
         )
 
 
-    async def logs(self, req:LogRequest) -> LogLine:
+    async def logs(self, req:LogRequest, **options) -> LogLine:
+        '''
+        options are the ones LogRequest cannot hold (follow), if there are any the logs are retrieved with read_logs
+        '''
+        command, data = 'logs', req
+        if options:
+            from drunc.process_manager.utils import pack_log_options
+            command, data = 'read_logs', pack_log_options(req, **options)
+
         async for stream in self.send_command_for_aio(
-            'logs',
-            data = req,
+            command,
+            data = data,
             outformat = LogLine,
             ):
             yield stream
 
 
+    async def watch(self, query:ProcessQuery):
+        '''
+        Yields the snapshot of the processes, then their changes, each data being a Struct (see unpack_process_event)
+        '''
+        from google.protobuf.struct_pb2 import Struct
+        async for stream in self.send_command_for_aio(
+            'watch',
+            data = query,
+            outformat = Struct,
+            ):
+            yield stream
+
+
     async def ps(self, query:ProcessQuery) -> ProcessInstanceList:
         return await self.send_command_aio(
             'ps',
@@ -340,6 +441,16 @@ To find the controller address, you can look up \'{top_controller_name}_control\
 
 
 
+    async def metrics(self, query:ProcessQuery):
+        from google.protobuf.struct_pb2 import Struct
+        return await self.send_command_aio(
+            'metrics',
+            data = query,
+            outformat = Struct,
+        )
+
+
+
     async def flush(self, query:ProcessQuery) -> ProcessInstanceList:
         return await self.send_command_aio(
             'flush',
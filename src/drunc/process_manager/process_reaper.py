@@ -0,0 +1,126 @@
+import os
+import logging
+import selectors
+import threading
+
+import sh
+
+
+class ProcessReaper(threading.Thread):
+    '''
+    Single thread waiting for the exit of all the processes of a process manager.
+
+    On Linux, each process gets a pidfd which becomes readable when it exits, and all of them are waited on
+    with one epoll. Processes for which no pidfd can be opened (other platforms, process already gone) are
+    polled every poll_interval seconds instead.
+
+    on_exit(exec=<sh.ErrorReturnCode or None>, **info) is called once per process with the info given to watch(),
+    from the reaper thread or from the thread calling reap(), and the process is forgotten afterwards.
+    '''
+    def __init__(self, on_exit, poll_interval:float=1.):
+        super().__init__(name='process_reaper', daemon=True)
+        self.log = logging.getLogger('process_reaper')
+        self.on_exit = on_exit
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._watched = {} # key -> (process, info, pidfd or None)
+        self._selector = selectors.DefaultSelector()
+        # Writing to this pipe wakes the reaper up, when the set of processes changed
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+
+    def _wakeup(self) -> None:
+        os.write(self._wakeup_write, b'\0')
+
+
+    def _open_pidfd(self, pid:int):
+        if not hasattr(os, 'pidfd_open'):
+            return None
+        try:
+            return os.pidfd_open(pid)
+        except OSError as e:
+            self.log.debug(f'Could not open a pidfd for {pid}, it will be polled: {str(e)}')
+            return None
+
+
+    def watch(self, key:str, process, **info) -> None:
+        pidfd = self._open_pidfd(process.pid)
+        with self._lock:
+            self._forget(key)
+            self._watched[key] = (process, info, pidfd)
+            if pidfd is not None:
+                self._selector.register(pidfd, selectors.EVENT_READ, key)
+        self._wakeup()
+
+
+    def unwatch(self, key:str) -> None:
+        with self._lock:
+            self._forget(key)
+
+
+    def reap(self, key:str) -> None:
+        '''
+        Delivers the exit of the process now if it exited and the reaper thread did not get to it yet, e.g. before
+        unwatching a process which was just killed
+        '''
+        with self._lock:
+            entry = self._watched.get(key)
+            if entry is None or entry[0].is_alive():
+                return
+            process, info = self._forget(key)
+        self._deliver(process, info)
+
+
+    def _forget(self, key:str):
+        process, info, pidfd = self._watched.pop(key, (None, None, None))
+        if pidfd is not None:
+            self._selector.unregister(pidfd)
+            os.close(pidfd)
+        return process, info
+
+
+    def _collect_exited(self, events) -> list:
+        with self._lock:
+            exited = []
+            for selector_key, _ in events:
+                if selector_key.data is None:
+                    os.read(self._wakeup_read, 4096)
+                    continue
+                entry = self._watched.get(selector_key.data)
+                # The key may have been re-watched with a new process between select and here
+                if entry is not None and entry[2] == selector_key.fd:
+                    exited.append(selector_key.data)
+
+            for key, (process, _, pidfd) in self._watched.items():
+                if pidfd is None and not process.is_alive():
+                    exited.append(key)
+
+            return [self._forget(key) for key in exited]
+
+
+    def run(self) -> None:
+        while True:
+            with self._lock:
+                polling = any(pidfd is None for _, _, pidfd in self._watched.values())
+
+            events = self._selector.select(self.poll_interval if polling else None)
+
+            for process, info in self._collect_exited(events):
+                self._deliver(process, info)
+
+
+    def _deliver(self, process, info:dict) -> None:
+        exc = None
+        try:
+            process.wait() # already exited, this only collects the exit code
+        except sh.ErrorReturnCode as e:
+            exc = e
+        except Exception as e:
+            self.log.error(f'Could not get the exit status of {info}: {str(e)}')
+
+        try:
+            self.on_exit(exec=exc, **info)
+        except Exception as e:
+            self.log.error(f'Exit notification failed for {info}: {str(e)}')
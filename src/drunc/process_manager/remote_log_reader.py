@@ -0,0 +1,187 @@
+'''
+Reading of the log files of the processes running on other hosts, when they are not on a shared filesystem.
+The log_reader module is sent over ssh to a python interpreter on the host of the process, so the log is tailed,
+filtered and followed there with exactly the same code as the local logs, and only the selected lines come back.
+With ssh multiplexing, the reads go through the master connections of the host (see SSHControlMasters), so they do
+not pay for a new connection each time.
+'''
+import json
+import shlex
+import asyncio
+import logging
+
+# Maximum size of a message from the host. The messages of follow are of about MESSAGE_SIZE, but a single line can
+# be as long as what read_from returns (1 MiB), and grow up to 6 times once escaped in json.
+STREAM_LIMIT = 8 * 1048576
+
+# Appended to the source of log_reader; args is a json dict given on the command line
+_REMOTE_MAIN = '''
+import json, sys, time
+
+MESSAGE_SIZE = 262144 # the lines read at once are sent in several messages of about this size
+
+def _send_lines(lines):
+    batch, size = [], 0
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if size >= MESSAGE_SIZE:
+            print(json.dumps({'lines': batch}), flush=True)
+            batch, size = [], 0
+    if batch:
+        print(json.dumps({'lines': batch}), flush=True)
+
+def _remote_main(args):
+    log_filter = LogFilter(**args['filter']) if args.get('filter') else None
+
+    if args['mode'] == 'read':
+        if log_filter is None:
+            lines, offset = tail_lines(args['path'], args['how_far'])
+        else:
+            lines, offset = filter_lines(args['path'], log_filter, args['how_far'])
+        print(json.dumps({'lines': lines, 'offset': offset}), flush=True)
+        return
+
+    offset, partial = args['offset'], b''
+    idle_since = time.monotonic()
+    while True:
+        data, offset = read_from(args['path'], offset)
+        if data:
+            lines, partial = split_lines(partial, data)
+            if log_filter is not None:
+                lines = [line for line in lines if log_filter.match(line)]
+            if lines:
+                _send_lines(lines)
+                idle_since = time.monotonic()
+            continue
+        if time.monotonic() - idle_since > args['heartbeat']:
+            # Fails with a broken pipe once the reader is gone, so this loop does not outlive it
+            print('{}', flush=True)
+            idle_since = time.monotonic()
+        time.sleep(args['poll_interval'])
+
+try:
+    _remote_main(json.loads(sys.argv[1]))
+except (BrokenPipeError, KeyboardInterrupt):
+    pass
+'''
+
+
+class RemoteLogReader:
+    '''
+    Tails, filters and follows log files on other hosts, see the module docstring.
+    ssh_masters is the SSHControlMasters of the process manager (None to open a connection per command),
+    and python the interpreter to use on the hosts.
+    '''
+    def __init__(self, ssh_masters=None, python:str='python3', timeout:float=60.):
+        self.log = logging.getLogger('remote_log_reader')
+        self.ssh_masters = ssh_masters
+        self.python = python
+        self.timeout = timeout
+        self._script = None
+
+
+    def script(self) -> bytes:
+        if self._script is None:
+            import inspect
+            from drunc.process_manager import log_reader
+            self._script = (inspect.getsource(log_reader) + _REMOTE_MAIN).encode()
+        return self._script
+
+
+    def _command(self, user_host:str, args:dict, options:list=()) -> list:
+        return [
+            '/usr/bin/ssh',
+            '-T',
+            '-o', 'StrictHostKeyChecking=no',
+            *options,
+            user_host,
+            f'{self.python} - {shlex.quote(json.dumps(args))}',
+        ]
+
+
+    async def _start(self, user_host:str, args:dict, options:list=()):
+        process = await asyncio.create_subprocess_exec(
+            *self._command(user_host, args, options),
+            stdin = asyncio.subprocess.PIPE,
+            stdout = asyncio.subprocess.PIPE,
+            stderr = asyncio.subprocess.PIPE,
+            limit = STREAM_LIMIT, # the default (64 kiB) is less than what is read at once on a busy log
+        )
+        # The interpreter reads the script until the end of its input, then runs it
+        process.stdin.write(self.script())
+        await process.stdin.drain()
+        process.stdin.close()
+        return process
+
+
+    async def read(self, user_host:str, path:str, how_far:int, log_filter=None) -> tuple:
+        '''
+        Returns the last how_far lines of the file (selected by log_filter, if any), and the offset from where to follow it
+        '''
+        from drunc.exceptions import DruncException
+        options = []
+        if self.ssh_masters is not None:
+            options = await asyncio.to_thread(self.ssh_masters.acquire, user_host)
+        try:
+            process = await self._start(user_host, {
+                'mode': 'read',
+                'path': path,
+                'how_far': how_far,
+                'filter': log_filter.options() if log_filter is not None else None,
+            }, options)
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise DruncException(f'Reading {path} on {user_host} timed out after {self.timeout}s')
+        finally:
+            if self.ssh_masters is not None:
+                self.ssh_masters.release(user_host, options)
+
+        if process.returncode != 0:
+            raise DruncException(f'Could not read {path} on {user_host}: {stderr.decode(errors="replace").strip()}')
+        result = json.loads(stdout)
+        return result['lines'], result['offset']
+
+
+    async def follow(self, user_host:str, path:str, offset:int, log_filter=None, is_alive=None, poll_interval:float=0.5, heartbeat:float=5.):
+        '''
+        Yields the lists of lines appended to the file after offset (selected by log_filter, if any), like follow_lines.
+        Stops once is_alive() returns False and nothing more came from the host, when the remote reader exits, or when cancelled.
+        This can last as long as the process, so it has its own connection rather than a channel of the master connection.
+        '''
+        process = await self._start(user_host, {
+            'mode': 'follow',
+            'path': path,
+            'offset': offset,
+            'filter': log_filter.options() if log_filter is not None else None,
+            'poll_interval': poll_interval,
+            'heartbeat': heartbeat,
+        })
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(process.stdout.readline(), timeout=2*poll_interval)
+                except asyncio.TimeoutError:
+                    message = None
+
+                if message == b'':
+                    stderr = await process.stderr.read()
+                    if stderr:
+                        self.log.warning(f'Following {path} on {user_host} stopped: {stderr.decode(errors="replace").strip()}')
+                    return
+
+                if message:
+                    lines = json.loads(message).get('lines')
+                    if lines:
+                        yield lines
+                    continue
+
+                if is_alive is not None and not is_alive():
+                    return
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
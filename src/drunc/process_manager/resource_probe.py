@@ -0,0 +1,118 @@
+'''
+Measures the resources used by the processes of a host, by reading /proc once for all of them.
+This module only uses the standard library: for the processes on other hosts, it is sent over ssh to a python
+interpreter on the host and run there (see resource_sampler), in which case it reads its targets from the command
+line and prints the measurements as json.
+
+The processes booted by the ssh process manager are shells (whose pid is the first line of their log) running the
+application, so each process is measured together with all its descendants.
+'''
+import os
+import re
+import time
+
+_PID_IN_LOG = re.compile(rb'SSHPM: Starting process (\d+)')
+
+
+def read_pid_from_log(path:str):
+    '''
+    Returns the pid written at the beginning of the log by the ssh process manager, or None if it is not there (yet)
+    '''
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            m = _PID_IN_LOG.search(f.read(4096))
+    except OSError:
+        return None
+    return int(m.group(1)) if m else None
+
+
+def _read_stat(pid:int):
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and can contain anything, the fields are after the last parenthesis
+    fields = stat[stat.rfind(b')')+2:].split()
+    return {
+        'ppid': int(fields[1]),
+        'ticks': int(fields[11]) + int(fields[12]), # utime + stime
+        'threads': int(fields[17]),
+        'rss_pages': int(fields[21]),
+    }
+
+
+def _read_io(pid:int) -> tuple:
+    read_bytes = write_bytes = 0
+    try:
+        with open(f'/proc/{pid}/io', 'rb') as f:
+            for line in f:
+                if line.startswith(b'read_bytes:'):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b'write_bytes:'):
+                    write_bytes = int(line.split()[1])
+    except OSError: # other users' processes
+        pass
+    return read_bytes, write_bytes
+
+
+def descendants(pid:int, children:dict) -> list:
+    '''
+    Returns pid and all its descendants, children being ppid -> [pids]
+    '''
+    tree, to_visit = [], [pid]
+    while to_visit:
+        p = to_visit.pop()
+        tree.append(p)
+        to_visit.extend(children.get(p, []))
+    return tree
+
+
+def probe(targets:dict) -> dict:
+    '''
+    targets is key -> {'pid': pid or None, 'log': log path}, the pid being read from the log if it is not known.
+    Returns key -> {'pid', 'alive', 'time', 'cpu_time', 'rss', 'threads', 'read_bytes', 'write_bytes'}, the counters
+    being cumulated over the process tree ('pid' is None if it could not be found, and the other keys are missing).
+    '''
+    ticks_per_second = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+
+    stats, children = {}, {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        stat = _read_stat(int(entry))
+        if stat is None: # exited while scanning
+            continue
+        stats[int(entry)] = stat
+        children.setdefault(stat['ppid'], []).append(int(entry))
+    now = time.monotonic()
+
+    results = {}
+    for key, target in targets.items():
+        pid = target.get('pid') or read_pid_from_log(target.get('log'))
+        if pid is None:
+            results[key] = {'pid': None}
+            continue
+        if pid not in stats:
+            results[key] = {'pid': pid, 'alive': False}
+            continue
+
+        result = {'pid': pid, 'alive': True, 'time': now, 'cpu_time': 0., 'rss': 0, 'threads': 0, 'read_bytes': 0, 'write_bytes': 0}
+        for p in descendants(pid, children):
+            stat = stats[p]
+            read_bytes, write_bytes = _read_io(p)
+            result['cpu_time'] += stat['ticks'] / ticks_per_second
+            result['rss'] += stat['rss_pages'] * page_size
+            result['threads'] += stat['threads']
+            result['read_bytes'] += read_bytes
+            result['write_bytes'] += write_bytes
+        results[key] = result
+    return results
+
+
+if __name__ == '__main__': # run on a remote host
+    import json, sys
+    print(json.dumps(probe(json.loads(sys.argv[1]))))
@@ -0,0 +1,200 @@
+import logging
+import threading
+from collections import deque
+
+
+def _probe_with_psutil(targets:dict) -> dict:
+    '''
+    Same as resource_probe.probe, with psutil (which also works where there is no /proc)
+    '''
+    import psutil
+    from time import monotonic
+    from drunc.process_manager.resource_probe import read_pid_from_log, descendants
+
+    children = {}
+    for process in psutil.process_iter(['ppid']):
+        children.setdefault(process.info['ppid'], []).append(process.pid)
+    now = monotonic()
+
+    results = {}
+    for key, target in targets.items():
+        pid = target.get('pid') or read_pid_from_log(target.get('log'))
+        if pid is None:
+            results[key] = {'pid': None}
+            continue
+        if not psutil.pid_exists(pid):
+            results[key] = {'pid': pid, 'alive': False}
+            continue
+
+        result = {'pid': pid, 'alive': True, 'time': now, 'cpu_time': 0., 'rss': 0, 'threads': 0, 'read_bytes': 0, 'write_bytes': 0}
+        for p in descendants(pid, children):
+            try:
+                process = psutil.Process(p)
+                with process.oneshot():
+                    cpu_times = process.cpu_times()
+                    result['cpu_time'] += cpu_times.user + cpu_times.system
+                    result['rss'] += process.memory_info().rss
+                    result['threads'] += process.num_threads()
+                    if hasattr(process, 'io_counters'): # not on macOS
+                        io = process.io_counters()
+                        result['read_bytes'] += io.read_bytes
+                        result['write_bytes'] += io.write_bytes
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        results[key] = result
+    return results
+
+
+class ResourceSampler(threading.Thread):
+    '''
+    Samples the CPU, memory, threads and I/O of the processes of a process manager every interval seconds, and keeps
+    the last history samples of each process in memory.
+
+    All the processes of a host are measured with one probe, which scans the process table of the host once: the
+    local processes with psutil (or /proc if it is not installed), the ones on other hosts by running resource_probe
+    there, over ssh (through a master connection of the host, if any). The hosts are probed in parallel, so the cost of a round of
+    sampling depends on the number of hosts rather than the number of processes.
+
+    Each sample is a dict with time (POSIX), pid, cpu_percent (100 is one core), rss (bytes), threads,
+    read_rate and write_rate (bytes/s), the rates being averaged since the previous probe.
+    '''
+    def __init__(self, interval:float=5., history:int=120, ssh_masters=None, python:str='python3', timeout:float=10., max_parallel_hosts:int=16):
+        super().__init__(name='resource_sampler', daemon=True)
+        self.log = logging.getLogger('resource_sampler')
+        self.interval = interval
+        self.history = history
+        self.ssh_masters = ssh_masters
+        self.python = python
+        self.timeout = timeout
+
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel_hosts, thread_name_prefix='resource_probe')
+        self._lock = threading.Lock()
+        self._targets = {} # uuid -> {'user_host': None if local, 'log': log path, 'pid': once known}
+        self._previous = {} # uuid -> last probe result, to compute the rates
+        self._samples = {} # uuid -> deque of the last samples
+        self._stop = threading.Event()
+        self._script = None
+
+
+    def watch(self, uuid:str, hostname:str, user:str, log_path:str) -> None:
+        from drunc.utils.utils import host_is_local
+        user_host = None
+        if hostname and not host_is_local(hostname):
+            user_host = hostname if not user else f'{user}@{hostname}'
+        with self._lock:
+            self._targets[uuid] = {'user_host': user_host, 'log': log_path, 'pid': None}
+            self._previous.pop(uuid, None)
+            self._samples[uuid] = deque(maxlen=self.history)
+
+
+    def unwatch(self, uuid:str) -> None:
+        with self._lock:
+            self._targets.pop(uuid, None)
+            self._previous.pop(uuid, None)
+            self._samples.pop(uuid, None)
+
+
+    def samples(self, uuid:str) -> list:
+        with self._lock:
+            return list(self._samples.get(uuid, []))
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                self.log.error(f'Resource sampling failed: {str(e)}')
+
+
+    def sample(self) -> None:
+        '''
+        Probes all the hosts once, and records a sample for each process measured
+        '''
+        with self._lock:
+            by_host = {}
+            for uuid, target in self._targets.items():
+                by_host.setdefault(target['user_host'], {})[uuid] = {'pid': target['pid'], 'log': target['log']}
+
+        probes = [self._executor.submit(self._probe_host, user_host, targets) for user_host, targets in by_host.items()]
+        for future in probes:
+            for uuid, result in future.result().items():
+                self._record(uuid, result)
+
+
+    def _probe_host(self, user_host, targets:dict) -> dict:
+        try:
+            if user_host is None:
+                try:
+                    return _probe_with_psutil(targets)
+                except ImportError:
+                    from drunc.process_manager.resource_probe import probe
+                    return probe(targets)
+            return self._probe_remote(user_host, targets)
+        except Exception as e:
+            self.log.debug(f'Could not probe the processes on {user_host or "localhost"}: {str(e)}')
+            return {}
+
+
+    def _probe_remote(self, user_host:str, targets:dict) -> dict:
+        import json, shlex
+        if self._script is None:
+            import inspect
+            from drunc.process_manager import resource_probe
+            self._script = inspect.getsource(resource_probe)
+
+        from contextlib import nullcontext
+        from sh import Command
+        session = self.ssh_masters.session(user_host) if self.ssh_masters is not None else nullcontext([])
+        with session as options:
+            output = Command('/usr/bin/ssh')(
+                '-T',
+                '-o', 'StrictHostKeyChecking=no',
+                *options,
+                user_host,
+                f'{self.python} - {shlex.quote(json.dumps(targets))}',
+                _in = self._script,
+                _timeout = self.timeout,
+            )
+        return json.loads(str(output))
+
+
+    def _record(self, uuid:str, result:dict) -> None:
+        from time import time
+        with self._lock:
+            target = self._targets.get(uuid)
+            if target is None: # unwatched during the probe
+                return
+            if result.get('pid') is None:
+                return
+            target['pid'] = result['pid']
+
+            if not result.get('alive'):
+                # Nothing more to measure, the samples are kept until the process is killed or flushed
+                del self._targets[uuid]
+                self._previous.pop(uuid, None)
+                return
+
+            previous = self._previous.get(uuid)
+            self._previous[uuid] = result
+            if previous is None:
+                return
+            elapsed = result['time'] - previous['time']
+            if elapsed <= 0:
+                return
+
+            self._samples[uuid].append({
+                'time': time(),
+                'pid': result['pid'],
+                'cpu_percent': 100 * max(0., result['cpu_time'] - previous['cpu_time']) / elapsed,
+                'rss': result['rss'],
+                'threads': result['threads'],
+                'read_rate': max(0, result['read_bytes'] - previous['read_bytes']) / elapsed,
+                'write_rate': max(0, result['write_bytes'] - previous['write_bytes']) / elapsed,
+            })
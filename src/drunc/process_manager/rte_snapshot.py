@@ -0,0 +1,175 @@
+'''
+Snapshots of the environment set by the RTE scripts.
+
+The processes source the RTE script of their release before starting, which can take seconds on CVMFS, for each
+process. With the snapshots, the RTE script is sourced once per host, user and release: the variables it sets (or
+unsets) are written as plain exports in a file on the host, in SNAPSHOT_DIRECTORY, and the processes source that
+file instead. Only exported variables are captured, not the shell functions or aliases the RTE script may define.
+
+A snapshot is named after the RTE script, its modification time, size and inode, and the release variables, so a
+change of any of them gives a new snapshot; the RTE script is checked for changes at most every check_interval
+seconds. If the snapshot cannot be taken or is gone, the processes source the RTE script as usual.
+'''
+import logging
+import re
+import shlex
+import threading
+
+SNAPSHOT_DIRECTORY = '~/.cache/drunc/rte' # on the hosts, in the home directory of the user running the processes
+
+# The release the RTE script sets up, which is exported before sourcing it (see _convert_oks_to_boot_request)
+RELEASE_VARIABLES = ('DUNE_DAQ_BASE_RELEASE', 'SPACK_RELEASES_DIR')
+
+# Set by the shell itself, or specific to the one which sourced the RTE script
+IGNORED_VARIABLES = {'_', 'SHLVL', 'PWD', 'OLDPWD'}
+
+_MARKER = 'DRUNC_RTE_SOURCED'
+_VARIABLE_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*') # not the exported functions (BASH_FUNC_name%%)
+
+
+def parse_environments(output:str) -> tuple:
+    '''
+    Parses the output of the capture command: the fingerprint of the RTE script on the first line, then the
+    environment (as printed by env -0) before and after sourcing it, separated by _MARKER.
+    Returns (fingerprint, environment before, environment after).
+    '''
+    fingerprint, _, environments = output.partition('\n')
+    before, after = {}, {}
+    current = before
+    for entry in environments.split('\0'):
+        if entry == _MARKER:
+            current = after
+            continue
+        name, sep, value = entry.partition('=')
+        if sep:
+            current[name] = value
+    if not after: # e.g. the RTE script exited the shell
+        raise ValueError('No environment after sourcing the RTE script')
+    return fingerprint.strip(), before, after
+
+
+def environment_script(before:dict, after:dict) -> str:
+    '''
+    Returns the shell commands turning the environment before into the one after
+    '''
+    lines = []
+    for name, value in sorted(after.items()):
+        if name in IGNORED_VARIABLES or not _VARIABLE_NAME.fullmatch(name):
+            continue
+        if before.get(name) != value:
+            lines.append(f'export {name}={shlex.quote(value)}')
+    for name in sorted(before):
+        if name not in after and name not in IGNORED_VARIABLES and _VARIABLE_NAME.fullmatch(name):
+            lines.append(f'unset {name}')
+    return '\n'.join(lines) + '\n'
+
+
+class RTESnapshots:
+    '''
+    The snapshots taken by this process, per (user@host, RTE script, release). user_host is None for the snapshots
+    of this host as the current user, which are taken without ssh.
+    '''
+    def __init__(self, ssh_masters=None, check_interval:float=60., timeout:float=120.):
+        self.log = logging.getLogger('rte_snapshots')
+        self.ssh_masters = ssh_masters
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._snapshots = {} # key -> {'path': snapshot path or None if it could not be taken, 'fingerprint', 'checked'}
+
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+    def _run(self, user_host, command:str, stdin:str=None) -> str:
+        from sh import Command
+        if user_host is None:
+            output = Command('/bin/bash')('-c', command, _in=stdin, _timeout=self.timeout)
+        else:
+            from contextlib import nullcontext
+            session = self.ssh_masters.session(user_host) if self.ssh_masters is not None else nullcontext([])
+            with session as options:
+                output = Command('/usr/bin/ssh')(
+                    '-T',
+                    '-o', 'StrictHostKeyChecking=no',
+                    *options,
+                    user_host,
+                    command,
+                    _in = stdin,
+                    _timeout = self.timeout,
+                )
+        return output.stdout.decode(errors='replace')
+
+
+    @staticmethod
+    def _fingerprint_command(script:str) -> str:
+        return f'stat -L -c %Y:%s:%i {shlex.quote(script)}'
+
+
+    def _capture(self, user_host, script:str, release:tuple) -> tuple:
+        exports = ''.join(f'export {name}={shlex.quote(value)}; ' for name, value in release)
+        output = self._run(
+            user_host,
+            f'{exports}{self._fingerprint_command(script)} || exit 1; '
+            f'env -0; printf \'{_MARKER}\\0\'; '
+            f'source {shlex.quote(script)} >/dev/null 2>&1 </dev/null; env -0'
+        )
+        fingerprint, before, after = parse_environments(output)
+
+        import hashlib
+        name = hashlib.sha256(repr((script, fingerprint, release)).encode()).hexdigest()[:20]
+        path = f'{SNAPSHOT_DIRECTORY}/{name}.sh'
+        # written next to it then moved, so that no process sources half a snapshot
+        self._run(
+            user_host,
+            f'mkdir -p {SNAPSHOT_DIRECTORY} && cat > {path}.$$ && mv {path}.$$ {path}',
+            stdin = environment_script(before, after),
+        )
+        return fingerprint, path
+
+
+    def snapshot(self, user_host, script:str, env:dict):
+        '''
+        Returns the path of the snapshot of script on the host, taking it if needed, or None if it could not be taken
+        '''
+        from time import monotonic
+        release = tuple((name, env[name]) for name in RELEASE_VARIABLES if env.get(name))
+        key = (user_host, script, release)
+
+        with self._key_lock(key): # the processes booted at the same time on a host wait for the same snapshot
+            entry = self._snapshots.get(key)
+            if entry is not None and monotonic() - entry['checked'] < self.check_interval:
+                return entry['path']
+
+            if entry is not None and entry['path'] is not None:
+                try:
+                    fingerprint = self._run(user_host, self._fingerprint_command(script)).strip()
+                except Exception:
+                    fingerprint = None
+                if fingerprint == entry['fingerprint']:
+                    entry['checked'] = monotonic()
+                    return entry['path']
+                self.log.info(f'{script} changed on {user_host or "localhost"}, taking a new snapshot of its environment')
+
+            try:
+                fingerprint, path = self._capture(user_host, script, release)
+                self.log.debug(f'Environment of {script} on {user_host or "localhost"} saved in {path}')
+            except Exception as e:
+                self.log.warning(f'Could not take a snapshot of the environment of {script} on {user_host or "localhost"}, the processes will source it: {str(e)}')
+                fingerprint, path = None, None
+
+            self._snapshots[key] = {'path': path, 'fingerprint': fingerprint, 'checked': monotonic()}
+            return path
+
+
+    def source_command(self, user_host, script:str, env:dict) -> str:
+        '''
+        Returns the command setting up the environment of script: sourcing its snapshot, or itself if there is none
+        '''
+        path = self.snapshot(user_host, script, env)
+        if path is None:
+            return f'source {script}'
+        return f'source {path} 2>/dev/null || source {script}'
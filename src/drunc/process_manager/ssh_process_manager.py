@@ -1,6 +1,3 @@
-import sh
-import threading
-
 from druncschema.process_manager_pb2 import BootRequest, ProcessQuery, ProcessUUID, ProcessInstance, ProcessInstanceList, ProcessDescription, ProcessRestriction, LogRequest, LogLine
 from drunc.process_manager.process_manager import ProcessManager
 
@@ -31,30 +28,6 @@ def on_parent_exit(signum):
     return set_parent_exit_signal
 # ------------------------------------------------
 
-class AppProcessWatcherThread(threading.Thread):
-    def __init__(self, pm, name, user, session, process):
-        threading.Thread.__init__(self)
-        self.pm = pm
-        self.user = user
-        self.session = session
-        self.name = name
-        self.process = process
-
-    def run(self):
-
-        exc = None
-        try:
-            self.process.wait()
-        except sh.ErrorReturnCode as e:
-            exc = e
-
-        self.pm.notify_join(
-            name = self.name,
-            session = self.session,
-            user = self.user,
-            exec = exc
-        )
-
 class SSHProcessManager(ProcessManager):
     def __init__(self, configuration, **kwargs):
 
@@ -67,45 +40,121 @@ class SSHProcessManager(ProcessManager):
             **kwargs
         )
 
-        # self.children_logs_depth = 1000
-        # self.children_logs = {}
-        self.watchers = []
+        # The last lines written by each process, kept in memory until it is flushed
+        self.log_buffers = {}
+
+        # One thread waits for the exit of all the processes
+        from drunc.process_manager.process_reaper import ProcessReaper
+        self.reaper = ProcessReaper(on_exit=self.notify_join)
+        self.reaper.start()
 
         from sh import Command
         self.ssh = Command('/usr/bin/ssh')
+        self.bash = Command('/bin/bash')
+
+        # Optionally, a pool of master connections per host for the processes and the short commands (log reads,
+        # resource probes, RTE snapshots)
+        self.ssh_masters = None
+        self.ssh_sessions = {} # uuid -> (user@host, ssh options) of the processes going through a master
+        if self.configuration.data.ssh_multiplexing:
+            from drunc.utils.ssh_utils import SSHControlMasters
+            self.ssh_masters = SSHControlMasters(
+                control_persist = self.configuration.data.ssh_control_persist,
+                max_sessions = self.configuration.data.ssh_max_sessions,
+            )
+
+        # The logs of the processes on other hosts are read there, through the same master connections
+        from drunc.process_manager.remote_log_reader import RemoteLogReader
+        self.remote_logs = RemoteLogReader(
+            ssh_masters = self.ssh_masters,
+            python = self.configuration.data.remote_python,
+        )
+
+        # The environments of the RTE scripts, set up once per host and release instead of once per process
+        self.rte_snapshots = None
+        if self.configuration.data.rte_snapshot:
+            from drunc.process_manager.rte_snapshot import RTESnapshots
+            self.rte_snapshots = RTESnapshots(
+                ssh_masters = self.ssh_masters,
+                check_interval = self.configuration.data.rte_snapshot_check_interval,
+            )
+
+        # CPU, memory and I/O of the processes, sampled with one probe per host
+        if self.configuration.data.resource_sampling_interval > 0:
+            from drunc.process_manager.resource_sampler import ResourceSampler
+            self.resource_sampler = ResourceSampler(
+                interval = self.configuration.data.resource_sampling_interval,
+                history = self.configuration.data.resource_history,
+                ssh_masters = self.ssh_masters,
+                python = self.configuration.data.remote_python,
+            )
+            self.resource_sampler.start()
+
+    def _signal_processes(self, processes:dict) -> None:
+        '''
+        Sends each signal of the sequence to all the processes (uuid -> process) still alive at once, and waits for them with a
+        single deadline of kill_timeout before escalating, so that the time taken does not depend on the number of processes.
+        '''
+        import signal
+        from time import monotonic, sleep
+        sequence = [
+            # signal.SIGINT, # In appfwk/daq_application, SIGQUIT makes the run marker false and quits the loop, killing the application. SIGINT not needed.
+            signal.SIGQUIT,
+            signal.SIGKILL, # Kept as nuclear option
+        ]
+
+        with self.process_lock:
+            names = {uuid: self.boot_request[uuid].process_description.metadata.name for uuid in processes if uuid in self.boot_request}
+
+        def app_name(uuid):
+            return names.get(uuid, uuid)
+
+        alive = [uuid for uuid, process in processes.items() if process.is_alive()]
+
+        for sig in sequence:
+            if not alive:
+                break
+
+            for uuid in alive:
+                self.log.debug(f'Sending signal \'{str(sig).split(".")[-1]}\' to \'{app_name(uuid)}\' with UUID {uuid}')
+                try:
+                    processes[uuid].signal_group(sig) # TODO grab this from the inputs
+                except ProcessLookupError: # exited in the meantime
+                    pass
+
+            deadline = monotonic() + self.configuration.data.kill_timeout
+            while True:
+                still_alive = [uuid for uuid in alive if processes[uuid].is_alive()]
+                for uuid in set(alive) - set(still_alive):
+                    self.log.info(f'Killed \'{app_name(uuid)}\' with UUID {uuid}')
+                alive = still_alive
+                remaining = deadline - monotonic()
+                if not alive or remaining <= 0:
+                    break
+                sleep(min(0.05, remaining))
+
+        for uuid in alive:
+            self.log.error(f'\'{app_name(uuid)}\' with UUID {uuid} is still alive after {str(sequence[-1]).split(".")[-1]}')
+
 
     def kill_processes(self, uuids:list) -> ProcessInstanceList:
         ret = []
-        for uuid in uuids:
-            process = self.process_store[uuid]
-            app_name = self.boot_request[uuid].process_description.metadata.name
-            if process.is_alive():
-                import signal
-                sequence = [
-                    # signal.SIGINT, # In appfwk/daq_application, SIGQUIT makes the run marker false and quits the loop, killing the application. SIGINT not needed.
-                    signal.SIGQUIT,
-                    signal.SIGKILL, # Kept as nuclear option
-                ]
-                for sig in sequence:
-                    if not process.is_alive():
-                        self.log.info(f'Killed \'{app_name}\' with UUID {uuid}')
-                        break
-                    self.log.debug(f'Sending signal \'{str(sig).split(".")[-1]}\' to \'{app_name}\' with UUID {uuid}')
-                    process.signal_group(sig) # TODO grab this from the inputs
-                    if not process.is_alive():
-                        break
-                    from time import sleep
-                    sleep(self.configuration.data.kill_timeout)
+        with self.process_lock:
+            processes = {uuid: self.process_store[uuid] for uuid in uuids if uuid in self.process_store}
+            boot_requests = {uuid: self.boot_request[uuid] for uuid in processes}
+        self._signal_processes(processes)
+
+        for uuid, process in processes.items():
             pd = ProcessDescription()
-            pd.CopyFrom(self.boot_request[uuid].process_description)
+            pd.CopyFrom(boot_requests[uuid].process_description)
             pr = ProcessRestriction()
-            pr.CopyFrom(self.boot_request[uuid].process_restriction)
+            pr.CopyFrom(boot_requests[uuid].process_restriction)
             pu = ProcessUUID(uuid= uuid)
 
             return_code = None
-            if not self.process_store[uuid].is_alive():
+            if not process.is_alive():
                 try:
-                    return_code = self.process_store[uuid].exit_code
+                    return_code = process.exit_code
                 except Exception:
                     pass
 
@@ -118,7 +167,12 @@ class SSHProcessManager(ProcessManager):
                     uuid = pu
                 )
             ]
-            del self.process_store[uuid]
+            # the exit is notified (broadcast and watch event) before the process is forgotten
+            self.reaper.reap(uuid)
+            with self.process_lock:
+                if self.process_store.get(uuid) is process: # not restarted in the meantime
+                    del self.process_store[uuid]
+                    self._forget_process(uuid)
 
         pil = ProcessInstanceList(
             values=ret
@@ -128,42 +182,87 @@ class SSHProcessManager(ProcessManager):
 
     def _terminate_impl(self) -> ProcessInstanceList:
         self.log.info(f'{self.name} terminating')
-        if self.process_store:
-            self.log.info('Killing all the known processes before exiting')
-            uuids = [uuid for uuid, process in self.process_store.items()]
-            return self.kill_processes(uuids)
-        else:
-            self.log.info('No known process to kill before exiting')
-            return ProcessInstanceList()
+        try:
+            with self.process_lock:
+                uuids = list(self.process_store.keys())
+            if uuids:
+                self.log.info('Killing all the known processes before exiting')
+                return self.kill_processes(uuids)
+            else:
+                self.log.info('No known process to kill before exiting')
+                return ProcessInstanceList()
+        finally:
+            if self.resource_sampler is not None:
+                self.resource_sampler.stop()
+            if self.ssh_masters is not None:
+                self.ssh_masters.close()
 
 
 
-    async def _logs_impl(self, log_request:LogRequest) -> LogLine:
+    async def _logs_impl(self, log_request:LogRequest, follow:bool=False, log_filter=None, chunk_size:int=1) -> LogLine:
         self.log.debug(f'{self.name} retrieving logs for {log_request.query}')
         uid = self._ensure_one_process(self._get_process_uid(log_request.query))
-        logfile = self.boot_request[uid].process_description.process_logs_path
-        # https://stackoverflow.com/questions/7167008/efficiently-finding-the-last-line-in-a-text-file
-        # "Not the straight forward way"...
-        import tempfile
-        f = tempfile.NamedTemporaryFile(delete=False)
-        import sh
+        with self.process_lock:
+            process_description = ProcessDescription()
+            process_description.CopyFrom(self.boot_request[uid].process_description)
+        from drunc.process_manager.log_reader import chunk_lines
+        logfile = process_description.process_logs_path
         nlines = log_request.how_far
         if not nlines:
             nlines = 100
 
+        log_buffer = self.log_buffers.get(uid)
+        if log_buffer is not None and not follow and (log_filter is None or not log_filter.active()):
+            lines = log_buffer.tail(nlines)
+            if lines is not None: # else the process wrote more than the buffer holds, read from the log file
+                for chunk in chunk_lines(lines, chunk_size):
+                    yield LogLine(
+                        uuid = ProcessUUID(uuid=uid),
+                        line = chunk
+                    )
+                return
+
+        import asyncio
+        from drunc.process_manager.log_reader import tail_lines, filter_lines, follow_lines
+        from drunc.utils.utils import host_is_local
+        meta = process_description.metadata
+        user_host = None
+        if meta.hostname and not host_is_local(meta.hostname):
+            user_host = meta.hostname if not meta.user else f'{meta.user}@{meta.hostname}'
+
+        async def read_local():
+            if log_filter is None:
+                return await asyncio.to_thread(tail_lines, logfile, nlines)
+            return await asyncio.to_thread(filter_lines, logfile, log_filter, nlines)
+
         try:
-            sh.tail(
-                f'-{nlines}', logfile,
-                _out=f.name,
-                _err_to_out=True,
-            )
+            if user_host is None:
+                lines, offset = await read_local()
+            else:
+                try:
+                    lines, offset = await self.remote_logs.read(user_host, logfile, nlines, log_filter)
+                except Exception as e:
+                    # e.g. no python on the host, the log may still be reachable on a shared filesystem
+                    self.log.warning(f'Could not read {logfile} on {user_host}, trying locally: {str(e)}')
+                    user_host = None
+                    lines, offset = await read_local()
         except Exception as e:
             ll = LogLine(
                 uuid = ProcessUUID(uuid=uid),
                 line =  f'Could not retrieve logs: {str(e)}'
             )
             yield ll
-            if uid in self.process_store:
+            if log_buffer is not None:
+                # e.g. the log file was deleted, what the process wrote last is still in memory
+                lines = log_buffer.tail(log_buffer.max_lines + 1, complete=False)
+                if log_filter is not None:
+                    lines = [line for line in lines if log_filter.match(line)]
+                for chunk in chunk_lines(lines[-nlines:], chunk_size):
+                    yield LogLine(
+                        uuid = ProcessUUID(uuid=uid),
+                        line = chunk
+                    )
+            elif uid in self.process_store:
                 llstdout = LogLine(
                     uuid = ProcessUUID(uuid=uid),
                     line =  f'stdout: {self.process_store[uid].stdout}'
@@ -174,22 +273,39 @@ class SSHProcessManager(ProcessManager):
                 )
                 yield llstdout
                 yield llstderr
+            return
 
-        f.close()
-        with open(f.name, 'r') as fi:
-            lines = fi.readlines()
-            for line in lines:
-                ll = LogLine(
+        for chunk in chunk_lines(lines, chunk_size):
+            yield LogLine(
+                uuid = ProcessUUID(uuid=uid),
+                line = chunk
+            )
+
+        if not follow:
+            return
+
+        def is_alive():
+            process = self.process_store.get(uid)
+            return process is not None and process.is_alive()
+
+        if user_host is None:
+            followed = follow_lines(logfile, offset, is_alive=is_alive)
+        else:
+            # filtered on the host, only the selected lines come back
+            followed = self.remote_logs.follow(user_host, logfile, offset, log_filter=log_filter, is_alive=is_alive)
+            log_filter = None
+
+        async for lines in followed:
+            if log_filter is not None:
+                lines = [line for line in lines if log_filter.match(line)]
+            for chunk in chunk_lines(lines, chunk_size):
+                yield LogLine(
                     uuid = ProcessUUID(uuid=uid),
-                    line = line
+                    line = chunk
                 )
-                yield ll
-
-        import os
-        os.remove(f.name)
 
 
-    def notify_join(self, name, session, user, exec):
+    def notify_join(self, name, session, user, exec, uuid=None):
         self.log.debug(f"{self.name} joining processes from the event loop")
         exit_code = None
         if exec:
@@ -205,17 +321,79 @@ class SSHProcessManager(ProcessManager):
             BroadcastType.SUBPROCESS_STATUS_UPDATE
         )
 
-    def _watch(self, name, session, user, process):
+        if uuid is not None:
+            self._release_ssh_session(uuid)
+            # From the boot request, the process may already be out of the process store (killed)
+            from drunc.process_manager.process_events import ProcessEventType
+            with self.process_lock:
+                br = self.boot_request.get(uuid)
+                pd = ProcessDescription()
+                pr = ProcessRestriction()
+                if br is not None:
+                    pd.CopyFrom(br.process_description)
+                    pr.CopyFrom(br.process_restriction)
+            pi = ProcessInstance(
+                process_description = pd,
+                process_restriction = pr,
+                status_code = ProcessInstance.StatusCode.DEAD,
+                return_code = exit_code,
+                uuid = ProcessUUID(uuid=uuid)
+            )
+            self.process_events.publish(ProcessEventType.EXITED, pi)
+
+    def _watch(self, uuid, name, session, user, process):
         self.log.debug(f'{self.name} watching process {name}')
-        t = AppProcessWatcherThread(
-            pm = self,
+        self.reaper.watch(
+            uuid,
+            process,
+            uuid = uuid,
+            name = name,
             session = session,
             user = user,
-            name = name,
-            process = process
         )
-        t.start()
-        self.watchers.append(t)
+
+    def _is_local(self, host:str, user:str) -> bool:
+        '''
+        Whether a process can be spawned directly rather than through ssh: on this host, as the user running the process manager
+        '''
+        if not self.configuration.data.local_fast_path:
+            return False
+        import getpass
+        from drunc.utils.utils import host_is_local
+        return host_is_local(host) and (not user or user == getpass.getuser())
+
+    @staticmethod
+    def _session_environment() -> dict:
+        '''
+        Environment the processes spawned directly start from: what sshd sets for the command of a session (the
+        variables of the boot request are exported by the command itself)
+        '''
+        import os, pwd
+        pw = pwd.getpwuid(os.getuid())
+        env = {
+            'HOME': pw.pw_dir,
+            'USER': pw.pw_name,
+            'LOGNAME': pw.pw_name,
+            'SHELL': pw.pw_shell,
+            'PATH': '/usr/local/bin:/usr/bin:/bin',
+        }
+        for var in ('LANG', 'LC_ALL', 'TZ'): # usually forwarded by ssh (SendEnv) or set by PAM
+            if var in os.environ:
+                env[var] = os.environ[var]
+        return env
+
+    def _release_ssh_session(self, uuid:str) -> None:
+        with self.process_lock:
+            user_host, options = self.ssh_sessions.pop(uuid, (None, []))
+        if self.ssh_masters is not None:
+            self.ssh_masters.release(user_host, options)
+
+    def _forget_process(self, uuid:str) -> None:
+        self._release_ssh_session(uuid)
+        self.reaper.unwatch(uuid)
+        self.log_buffers.pop(uuid, None)
+        if self.resource_sampler is not None:
+            self.resource_sampler.unwatch(uuid)
 
     def __boot(self, boot_request:BootRequest, uuid:str) -> ProcessInstance:
         self.log.debug(f'{self.name} booting session \'{boot_request.process_description.metadata}\'')
@@ -228,19 +406,29 @@ class SSHProcessManager(ProcessManager):
         if len(boot_request.process_restriction.allowed_hosts) < 1:
             raise DruncCommandException('No allowed host provided! bailing')
 
+        # CPUs, NUMA node and cgroup limits, applied to the executables (not to the shell sourcing the environment)
+        from drunc.process_manager.placement import get_placement, placement_prefix
+        placement = placement_prefix(get_placement(boot_request.process_description.env))
+
         error = ''
 
-        if uuid in self.boot_request:
-            raise DruncCommandException(f'Process {uuid} already exists!')
-        self.boot_request[uuid] = BootRequest()
-        self.boot_request[uuid].CopyFrom(boot_request)
+        with self.process_lock:
+            if uuid in self.boot_request:
+                raise DruncCommandException(f'Process {uuid} already exists!')
+            self.boot_request[uuid] = BootRequest()
+            self.boot_request[uuid].CopyFrom(boot_request)
+            self.process_index.add(uuid, boot_request.process_description.metadata)
         hostname = ""
 
         for host in boot_request.process_restriction.allowed_hosts:
+            # held while the environment is sourced and the process spawned, see host_boot_slot
+            slot = self.host_boot_slot(host)
+            slot.acquire()
             try:
                 user = boot_request.process_description.metadata.user
                 user_host = host if not user else f'{user}@{host}'
                 hostname = host
+                local = self._is_local(host, user)
 
                 log_file = boot_request.process_description.process_logs_path
                 env_var = boot_request.process_description.env
@@ -255,7 +443,12 @@ class SSHProcessManager(ProcessManager):
 
                 cmd += f'cd {boot_request.process_description.process_execution_directory} ; '
 
-                for exe_arg in boot_request.process_description.executable_and_arguments:
+                for i, exe_arg in enumerate(boot_request.process_description.executable_and_arguments):
+                    if i == 0 and self.rte_snapshots is not None and exe_arg.exec == 'source' and len(exe_arg.args) == 1:
+                        cmd += self.rte_snapshots.source_command(None if local else user_host, exe_arg.args[0], env_var) + ';'
+                        continue
+                    if exe_arg.exec != 'source':
+                        cmd += placement
                     cmd += exe_arg.exec
                     for arg in exe_arg.args:
                         cmd += f' {arg}'
@@ -264,46 +457,90 @@ class SSHProcessManager(ProcessManager):
                 if cmd[-1] == ';':
                     cmd = cmd[:-1]
 
-                arguments = [user_host, "-tt", "-o StrictHostKeyChecking=no", f'{{ {cmd} ; }} &> {log_file}']
+                log_buffer = None
+                if self.configuration.data.log_buffer_lines > 0:
+                    # The output also goes to the standard output, streamed (through ssh) into the log buffer. The exit
+                    # code stays the one of the process, whatever happens to tee.
+                    from drunc.process_manager.log_buffer import LogRingBuffer
+                    log_buffer = LogRingBuffer(
+                        max_lines = self.configuration.data.log_buffer_lines,
+                        max_size = self.configuration.data.log_buffer_size,
+                    )
+                    output = f'{{ {cmd} ; }} 2>&1 | tee {log_file}; exit ${{PIPESTATUS[0]}}'
+                else:
+                    output = f'{{ {cmd} ; }} &> {log_file}'
+
+                environment = {}
+                if local:
+                    # Same command spawned directly, without going through sshd. The end of an ssh session kills the
+                    # whole process tree, so the trap forwards the parent-death signal (and hangups) to the process group.
+                    # The process starts from the same minimal environment as an ssh session, not the one of the process manager.
+                    executable = self.bash
+                    arguments = ['-c', f'trap "trap - TERM HUP; kill -TERM -- -$$" TERM HUP; {{ {output} ; }} & wait $!']
+                    environment = {'_env': self._session_environment()}
+                else:
+                    # The session lasts as long as the process: it holds its channel of the master until the process exits
+                    executable = self.ssh
+                    options = []
+                    if self.ssh_masters is not None:
+                        options = self.ssh_masters.acquire(user_host, check=True)
+                        with self.process_lock:
+                            self.ssh_sessions[uuid] = (user_host, options)
+                    arguments = [*options, user_host, "-tt", "-o StrictHostKeyChecking=no", output]
                 self.log.debug(f"{arguments}")
-                # arguments = [user_host, "-tt", "-o StrictHostKeyChecking=no", f'{{ {cmd} ; }} > >(tee -a {log_file}) 2> >(tee -a {log_file} >&2)']
-                # I'm gonna bail now and read that log file, anyway, it's probably better that heavy logger applications don't clog up the process manager CPU.
-                self.process_store[uuid] = self.ssh (
+                streaming = {}
+                if log_buffer is not None:
+                    # the errors of ssh itself (e.g. host unreachable) end up in the buffer too
+                    streaming = {'_out': log_buffer.feed, '_err': log_buffer.feed, '_decode_errors': 'replace'}
+                    with self.process_lock:
+                        self.log_buffers[uuid] = log_buffer
+                process = executable (
                     *arguments,
-                    # _out=partial(self._process_children_logs, uuid),
+                    **streaming,
+                    **environment,
                     _bg=True,
                     _bg_exc=False,
                     _new_session=True,
                     _preexec_fn = on_parent_exit(signal.SIGTERM) if not macos else None
                 )
+                with self.process_lock:
+                    self.process_store[uuid] = process
                 self._watch(
+                    uuid = uuid,
                     name = meta.name,
                     user = meta.user,
                     session = meta.session,
-                    process = self.process_store[uuid]
+                    process = process
                 )
-                self.log.debug(f'Command:\nssh \'{" ".join(arguments)}\'')
+                if self.resource_sampler is not None:
+                    self.resource_sampler.watch(uuid, hostname=host, user=user, log_path=log_file)
+                self.log.debug(f'Command:\n{executable} \'{" ".join(arguments)}\'')
                 break
 
             except Exception as e:
+                self._release_ssh_session(uuid)
                 error += str(e)
                 print(f'Couldn\'t start on host {host}, reason:\n{str(e)}')
                 print('\nTrying on a different host')
                 continue
+            finally:
+                slot.release()
         ## Saving the host to the metadata
-        self.boot_request[uuid].process_description.metadata.hostname = hostname
+        with self.process_lock:
+            self.boot_request[uuid].process_description.metadata.hostname = hostname
 
-        self.log.info(f'Booted \'{boot_request.process_description.metadata.name}\' from session \'{boot_request.process_description.metadata.session}\' with UUID {uuid}')
-        pd = ProcessDescription()
-        pd.CopyFrom(self.boot_request[uuid].process_description)
-        pr = ProcessRestriction()
-        pr.CopyFrom(self.boot_request[uuid].process_restriction)
+            self.log.info(f'Booted \'{boot_request.process_description.metadata.name}\' from session \'{boot_request.process_description.metadata.session}\' with UUID {uuid}')
+            pd = ProcessDescription()
+            pd.CopyFrom(self.boot_request[uuid].process_description)
+            pr = ProcessRestriction()
+            pr.CopyFrom(self.boot_request[uuid].process_restriction)
+            process = self.process_store.get(uuid)
         pu = ProcessUUID(uuid=uuid)
 
         return_code = None
         alive = False
 
-        if uuid not in self.process_store:
+        if process is None:
             pi = ProcessInstance(
                 process_description = pd,
                 process_restriction = pr,
@@ -314,8 +551,8 @@ class SSHProcessManager(ProcessManager):
             return pi
 
         try:
-            if not self.process_store[uuid].is_alive():
-                return_code = self.process_store[uuid].exit_code
+            if not process.is_alive():
+                return_code = process.exit_code
             else:
                 alive = True
         except Exception:
@@ -331,44 +568,45 @@ class SSHProcessManager(ProcessManager):
         return pi
 
 
-    def _ps_impl(self, query:ProcessQuery) -> ProcessInstanceList:
-        self.log.debug(f'{self.name} running ps')
-        ret = []
-
-        for uuid in self._get_process_uid(query):
-
-            if uuid not in self.process_store:
-                pu = ProcessUUID(uuid=uuid)
-                pi = ProcessInstance(
-                    process_description = ProcessDescription(),
-                    process_restriction = ProcessRestriction(),
-                    status_code = ProcessInstance.StatusCode.DEAD, # should be unknown
-                    return_code = None,
-                    uuid = pu
-                )
-                ret += [pi]
-                continue
-            pd = ProcessDescription()
-            pd.CopyFrom(self.boot_request[uuid].process_description)
-            pr = ProcessRestriction()
-            pr.CopyFrom(self.boot_request[uuid].process_restriction)
-            pu = ProcessUUID(uuid=uuid)
-            return_code = None
-            if not self.process_store[uuid].is_alive():
-                try:
-                    return_code = self.process_store[uuid].exit_code
-                except Exception:
-                    pass
+    def _process_instance(self, uuid:str) -> ProcessInstance:
+        with self.process_lock:
+            process = self.process_store.get(uuid)
+            br = self.boot_request.get(uuid)
+            if br is not None:
+                pd = ProcessDescription()
+                pd.CopyFrom(br.process_description)
+                pr = ProcessRestriction()
+                pr.CopyFrom(br.process_restriction)
 
-            pi = ProcessInstance(
-                process_description = pd,
-                process_restriction = pr,
-                status_code = ProcessInstance.StatusCode.RUNNING if self.process_store[uuid].is_alive() else ProcessInstance.StatusCode.DEAD,
-                return_code = return_code,
+        pu = ProcessUUID(uuid=uuid)
+        if process is None or br is None: # killed or flushed in the meantime
+            return ProcessInstance(
+                process_description = ProcessDescription(),
+                process_restriction = ProcessRestriction(),
+                status_code = ProcessInstance.StatusCode.DEAD, # should be unknown
+                return_code = None,
                 uuid = pu
             )
-            ret += [pi]
 
+        return_code = None
+        if not process.is_alive():
+            try:
+                return_code = process.exit_code
+            except Exception:
+                pass
+
+        return ProcessInstance(
+            process_description = pd,
+            process_restriction = pr,
+            status_code = ProcessInstance.StatusCode.RUNNING if process.is_alive() else ProcessInstance.StatusCode.DEAD,
+            return_code = return_code,
+            uuid = pu
+        )
+
+
+    def _ps_impl(self, query:ProcessQuery) -> ProcessInstanceList:
+        self.log.debug(f'{self.name} running ps')
+        ret = [self._process_instance(uuid) for uuid in self._get_process_uid(query)]
 
         pil = ProcessInstanceList(
             values=ret
@@ -390,20 +628,21 @@ class SSHProcessManager(ProcessManager):
         uuids = self._get_process_uid(query, in_boot_request=True)
         uuid = self._ensure_one_process(uuids, in_boot_request=True)
 
-        same_uuid_br = []
-        same_uuid_br = BootRequest()
-        same_uuid_br.CopyFrom(self.boot_request[uuid])
-        same_uuid = uuid
+        with self.process_lock:
+            same_uuid_br = []
+            same_uuid_br = BootRequest()
+            same_uuid_br.CopyFrom(self.boot_request[uuid])
+            same_uuid = uuid
 
-        if uuid in self.process_store:
-            process = self.process_store[uuid]
-            if process.is_alive():
-                process.terminate()
-
-        del self.process_store[uuid]
-        del self.boot_request[uuid]
+            process = self.process_store.pop(uuid, None)
+            del self.boot_request[uuid]
+            self.process_index.remove(uuid)
+            self._forget_process(uuid)
         del uuid
 
+        if process is not None and process.is_alive():
+            process.terminate()
+
         ret = self.__boot(same_uuid_br, same_uuid)
 
         del same_uuid_br
@@ -413,7 +652,9 @@ class SSHProcessManager(ProcessManager):
 
     def _kill_impl(self, query:ProcessQuery) -> ProcessInstanceList:
         self.log.info(f'{self.name} killing {query.names} in session {self.session}')
-        if self.process_store:
+        with self.process_lock:
+            known_processes = bool(self.process_store)
+        if known_processes:
             self.log.warning('Killing all the known processes before exiting')
             uuids = self._get_process_uid(query)
             return self.kill_processes(uuids)
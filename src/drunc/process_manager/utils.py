@@ -38,7 +38,37 @@ def make_tree(values):
         lines.append(indentation + m.name)
     return lines
 
-def tabulate_process_instance_list(pil, title, long=False):
+def format_bytes(n:float) -> str:
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(n) < 1024:
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} TiB'
+
+def unpack_metrics(metrics) -> dict:
+    '''
+    Returns uuid -> {'name', 'session', 'host', 'samples'} from the Struct returned by metrics
+    '''
+    from google.protobuf.json_format import MessageToDict
+    return MessageToDict(metrics) if metrics is not None else {}
+
+def resource_columns(sample) -> list:
+    if not sample:
+        return ['', '', '', '', '']
+    return [
+        f'{sample["cpu_percent"]:.1f}',
+        format_bytes(sample['rss']),
+        f'{sample["threads"]:.0f}',
+        f'{format_bytes(sample["read_rate"])}/s',
+        f'{format_bytes(sample["write_rate"])}/s',
+    ]
+
+RESOURCE_COLUMNS = ['cpu %', 'rss', 'threads', 'read', 'write']
+
+def tabulate_process_instance_list(pil, title, long=False, metrics=None):
+    '''
+    metrics (uuid -> metrics, see unpack_metrics) adds the last resource sample of each process, in the long format
+    '''
     from rich.table import Table
     t = Table(title=title)
     t.add_column('session')
@@ -50,6 +80,10 @@ def tabulate_process_instance_list(pil, title, long=False):
     t.add_column('exit-code')
     if long:
         t.add_column('executable')
+        t.add_column('placement')
+        if metrics is not None:
+            for column in RESOURCE_COLUMNS:
+                t.add_column(column, justify='right')
 
     from operator import attrgetter
     sorted_pil = sorted(pil.values, key=attrgetter('process_description.metadata.tree_id'))
@@ -59,11 +93,15 @@ def tabulate_process_instance_list(pil, title, long=False):
             m = process.process_description.metadata
             from druncschema.process_manager_pb2 import ProcessInstance
             alive = 'True' if process.status_code == ProcessInstance.StatusCode.RUNNING else '[danger]False[/danger]'
-            row = [m.session, line, m.user, m.hostname, process.uuid.uuid]
+            row = [m.session, line, m.user, m.hostname, process.uuid.uuid, alive, f'{process.return_code}']
             if long:
                 executables = [e.exec for e in process.process_description.executable_and_arguments]
                 row += ['; '.join(executables)]
-            row += [alive, f'{process.return_code}']
+                from drunc.process_manager.placement import format_placement
+                row += [format_placement(process.process_description.env)]
+            if long and metrics is not None:
+                samples = metrics.get(process.uuid.uuid, {}).get('samples', [])
+                row += resource_columns(samples[-1] if samples else None)
             t.add_row(*row)
     except TypeError:
         from drunc.exceptions import DruncCommandException
@@ -139,4 +177,113 @@ def get_log_path(user:str, session_name:str, application_name:str, override_logs
     return log_path
 
 def get_pm_conf_name_from_dir(pm_conf_path:str) -> str:
-    return pm_conf_path.split('/')[-1].split('.')[0]
\ No newline at end of file
+    return pm_conf_path.split('/')[-1].split('.')[0]
+
+# The batch boot and the log reading with options are not part of the ProcessManager service of druncschema,
+# so they are served by a generic handler, with the usual Requests and Responses:
+#  - boot_batch streams Requests (each containing a BootRequest) and Responses (each containing a ProcessInstance)
+#  - read_logs takes a Request containing a Struct (see pack_log_options) and streams Responses containing LogLines
+#  - metrics takes a Request containing a ProcessQuery and returns a Response containing a Struct (uuid -> samples)
+#  - watch takes a Request containing a ProcessQuery and streams Responses containing Structs (see pack_process_event)
+EXTENSION_SERVICE = 'drunc.ProcessManagerExtension'
+BOOT_BATCH_METHOD = 'boot_batch'
+READ_LOGS_METHOD = 'read_logs'
+METRICS_METHOD = 'metrics'
+WATCH_METHOD = 'watch'
+
+def add_extension_handlers_to_server(pm, server) -> None:
+    import grpc
+    from druncschema.request_response_pb2 import Request, Response
+    handler = grpc.method_handlers_generic_handler(
+        EXTENSION_SERVICE,
+        {
+            BOOT_BATCH_METHOD: grpc.stream_stream_rpc_method_handler(
+                pm.boot_batch,
+                request_deserializer = Request.FromString,
+                response_serializer = Response.SerializeToString,
+            ),
+            READ_LOGS_METHOD: grpc.unary_stream_rpc_method_handler(
+                pm.read_logs,
+                request_deserializer = Request.FromString,
+                response_serializer = Response.SerializeToString,
+            ),
+            METRICS_METHOD: grpc.unary_unary_rpc_method_handler(
+                pm.metrics,
+                request_deserializer = Request.FromString,
+                response_serializer = Response.SerializeToString,
+            ),
+            WATCH_METHOD: grpc.unary_stream_rpc_method_handler(
+                pm.watch,
+                request_deserializer = Request.FromString,
+                response_serializer = Response.SerializeToString,
+            ),
+        }
+    )
+    server.add_generic_rpc_handlers((handler,))
+
+def add_extension_commands_to_stub(stub, channel):
+    '''
+    Adds the extension commands to a ProcessManagerStub, so they can be used like the other commands
+    '''
+    from druncschema.request_response_pb2 import Request, Response
+    stub.boot_batch = channel.stream_stream(
+        f'/{EXTENSION_SERVICE}/{BOOT_BATCH_METHOD}',
+        request_serializer = Request.SerializeToString,
+        response_deserializer = Response.FromString,
+    )
+    stub.read_logs = channel.unary_stream(
+        f'/{EXTENSION_SERVICE}/{READ_LOGS_METHOD}',
+        request_serializer = Request.SerializeToString,
+        response_deserializer = Response.FromString,
+    )
+    stub.metrics = channel.unary_unary(
+        f'/{EXTENSION_SERVICE}/{METRICS_METHOD}',
+        request_serializer = Request.SerializeToString,
+        response_deserializer = Response.FromString,
+    )
+    stub.watch = channel.unary_stream(
+        f'/{EXTENSION_SERVICE}/{WATCH_METHOD}',
+        request_serializer = Request.SerializeToString,
+        response_deserializer = Response.FromString,
+    )
+    return stub
+
+def pack_log_options(log_request, **options):
+    '''
+    Packs a LogRequest and the options that do not fit in it (for example follow=True) in a Struct, for read_logs
+    '''
+    from google.protobuf.struct_pb2 import Struct
+    from google.protobuf.json_format import MessageToDict
+    s = Struct()
+    s.update({
+        'log_request': MessageToDict(log_request),
+        'options': options,
+    })
+    return s
+
+def unpack_log_options(s) -> tuple:
+    from google.protobuf.json_format import MessageToDict, ParseDict
+    from druncschema.process_manager_pb2 import LogRequest
+    d = MessageToDict(s)
+    log_request = ParseDict(d.get('log_request', {}), LogRequest())
+    return log_request, d.get('options', {})
+
+def pack_process_event(event:str, process_instance):
+    '''
+    Packs a change of a process (see ProcessEventType) and its ProcessInstance in a Struct, for watch
+    '''
+    from google.protobuf.struct_pb2 import Struct
+    from google.protobuf.json_format import MessageToDict
+    s = Struct()
+    s.update({
+        'event': event,
+        'process_instance': MessageToDict(process_instance),
+    })
+    return s
+
+def unpack_process_event(s) -> tuple:
+    from google.protobuf.json_format import MessageToDict, ParseDict
+    from druncschema.process_manager_pb2 import ProcessInstance
+    d = MessageToDict(s)
+    process_instance = ParseDict(d.get('process_instance', {}), ProcessInstance())
+    return d.get('event'), process_instance
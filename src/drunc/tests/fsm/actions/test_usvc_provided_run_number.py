@@ -0,0 +1,69 @@
+import itertools
+import threading
+
+import pytest
+
+from drunc.fsm.exceptions import CannotGetRunNumber
+import drunc.fsm.actions.usvc_provided_run_number as usvc
+
+
+@pytest.fixture
+def action(monkeypatch):
+    monkeypatch.setattr(usvc, 'get_dotdrunc_json', lambda: {
+        'run_number_configuration': {'socket': 'http://nowhere', 'user': 'me', 'password': 'secret', 'lease': True, 'lease_retries': 3},
+    })
+    action = usvc.UsvcProvidedRunNumber(configuration=None)
+    action.timeout = 0.05
+    return action
+
+
+def test_start_uses_the_reserved_run_number(action, monkeypatch):
+    numbers = itertools.count(1)
+    monkeypatch.setattr(action, '_getnew_run_number', lambda: next(numbers))
+
+    action.post_conf({}, None)
+    action._lease_thread.join()
+    assert action.pre_start({}, None)['run'] == 1
+
+    action.post_stop({}, None)
+    action._lease_thread.join()
+    assert action.pre_start({}, None)['run'] == 2
+
+
+def test_late_reservation_is_not_used(action, monkeypatch):
+    numbers = itertools.count(1)
+    release = threading.Event()
+
+    def getnew_run_number():
+        number = next(numbers)
+        if number == 1: # the reservation hangs longer than start waits for it
+            release.wait()
+        return number
+    monkeypatch.setattr(action, '_getnew_run_number', getnew_run_number)
+
+    action.post_conf({}, None)
+    late_worker = action._lease_thread
+    assert action.pre_start({}, None)['run'] == 2
+
+    # the next reservation does not wait for the late one
+    action.post_stop({}, None)
+    action._lease_thread.join()
+    release.set()
+    late_worker.join()
+    assert action.pre_start({}, None)['run'] == 3
+
+
+def test_reservation_retries(action, monkeypatch):
+    calls = []
+
+    def getnew_run_number():
+        calls.append(None)
+        if len(calls) < 3:
+            raise CannotGetRunNumber('service down')
+        return 42
+    monkeypatch.setattr(action, '_getnew_run_number', getnew_run_number)
+
+    action.post_conf({}, None)
+    action._lease_thread.join()
+    assert action.pre_start({}, None)['run'] == 42
+    assert len(calls) == 3
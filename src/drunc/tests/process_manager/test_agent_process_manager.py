@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip('druncschema')
+
+from druncschema.process_manager_pb2 import BootRequest, ProcessDescription, ProcessInstance, ProcessInstanceList, ProcessMetadata, ProcessQuery, ProcessRestriction, ProcessUUID, LogRequest
+
+from drunc.process_manager.agent_process_manager import AgentProcessManager, AgentUnreachable, AgentCommandFailed
+from drunc.process_manager.process_events import ProcessEvents, ProcessEventType
+from drunc.process_manager.process_index import ProcessIndex
+
+
+class FakeAgent:
+    '''
+    Stands for the Agent of a host: boots processes with increasing uuids, and answers ps and kill from what it booted
+    '''
+    def __init__(self, host, reachable=True):
+        self.host = host
+        self.address = f'{host}:10054'
+        self.reachable = reachable
+        self.failing = set() # commands which fail
+        self.processes = {} # uuid -> ProcessInstance
+        self.watching = False
+
+    def _instance(self, br, uuid, status=ProcessInstance.StatusCode.RUNNING):
+        pd = ProcessDescription()
+        pd.CopyFrom(br.process_description)
+        pd.metadata.hostname = self.host
+        return ProcessInstance(
+            process_description = pd,
+            process_restriction = br.process_restriction,
+            status_code = status,
+            uuid = ProcessUUID(uuid=uuid),
+        )
+
+    def command(self, command, data, outformat):
+        if not self.reachable:
+            raise AgentUnreachable(self.host, self.address, 'connection refused')
+        if command in self.failing:
+            raise AgentCommandFailed(command, self.address, 'failed')
+
+        if command == 'boot':
+            uuid = f'{self.host}-{len(self.processes)}'
+            self.processes[uuid] = self._instance(data, uuid)
+            return self.processes[uuid]
+
+        selected = [self.processes[pu.uuid] for pu in data.uuids if pu.uuid in self.processes]
+        if command == 'kill':
+            for pi in selected:
+                pi.status_code = ProcessInstance.StatusCode.DEAD
+                pi.return_code = -9
+        return ProcessInstanceList(values=selected)
+
+    def start_watching(self):
+        self.watching = True
+
+    def close(self):
+        pass
+
+
+def boot_request(name, hosts):
+    return BootRequest(
+        process_description = ProcessDescription(
+            metadata = ProcessMetadata(name=name, session='test-session', user='test-user'),
+        ),
+        process_restriction = ProcessRestriction(allowed_hosts=hosts),
+    )
+
+
+@pytest.fixture
+def pm():
+    pm = AgentProcessManager.__new__(AgentProcessManager) # without the configuration, broadcaster and authoriser
+    pm.log = logging.getLogger('test_agent_process_manager')
+    pm.name = 'test-pm'
+    pm.session = 'test-session'
+    pm.process_store = {}
+    pm.boot_request = {}
+    pm.process_index = ProcessIndex()
+    pm.process_lock = threading.RLock()
+    pm.process_events = ProcessEvents()
+    pm.agents = {}
+    pm._agents_lock = threading.Lock()
+    pm._early_exits = OrderedDict()
+    pm._executor = ThreadPoolExecutor(max_workers=4)
+    pm.configuration = SimpleNamespace(data=SimpleNamespace(boot_max_concurrency_per_host=8))
+    pm._host_boot_limits = {}
+    pm._agent = lambda host: pm.agents.setdefault(host, FakeAgent(host))
+    yield pm
+    pm._executor.shutdown()
+
+
+def test_boot_falls_back_on_the_next_host(pm):
+    pm.agents['host-a'] = FakeAgent('host-a', reachable=False)
+
+    pi = pm._boot_impl(boot_request('app', ['host-a', 'host-b']))
+
+    assert pi.status_code == ProcessInstance.StatusCode.RUNNING
+    assert pi.uuid.uuid in pm.agents['host-b'].processes
+    assert pm.process_store[pi.uuid.uuid].agent is pm.agents['host-b']
+    assert pm.agents['host-b'].watching
+
+
+def test_boot_fails_when_no_agent_is_reachable(pm):
+    pm.agents['host-a'] = FakeAgent('host-a', reachable=False)
+    pm.agents['host-b'] = FakeAgent('host-b', reachable=False)
+
+    with pytest.raises(Exception, match='on any of its hosts'):
+        pm._boot_impl(boot_request('app', ['host-a', 'host-b']))
+    assert pm.process_store == {}
+
+
+def test_exit_before_register(pm):
+    agent = pm._agent('host-a')
+    br = boot_request('app', ['host-a'])
+    pi = agent.command('boot', br, ProcessInstance)
+
+    # the watch stream of the agent gets the exit before the boot returned
+    exited = ProcessInstance()
+    exited.CopyFrom(pi)
+    exited.status_code = ProcessInstance.StatusCode.DEAD
+    exited.return_code = 3
+    pm._on_agent_event(agent, ProcessEventType.EXITED, exited)
+    assert pi.uuid.uuid not in pm.process_store
+
+    pm._register(agent, br, pi)
+
+    result = pm._process_instance(pi.uuid.uuid)
+    assert result.status_code == ProcessInstance.StatusCode.DEAD
+    assert result.return_code == 3
+    assert pm._early_exits == {}
+
+
+def test_ps_marks_processes_the_agent_forgot_as_dead(pm):
+    pi = pm._boot_impl(boot_request('app', ['host-a']))
+    pm.agents['host-a'].processes.clear() # the agent restarted
+
+    pil = pm._ps_impl(ProcessQuery(uuids=[pi.uuid]))
+
+    assert [p.status_code for p in pil.values] == [ProcessInstance.StatusCode.DEAD]
+
+
+def test_kill_keeps_the_processes_of_failed_agents(pm):
+    pi_a = pm._boot_impl(boot_request('app-a', ['host-a']))
+    pi_b = pm._boot_impl(boot_request('app-b', ['host-b']))
+    pm.agents['host-b'].failing.add('kill')
+
+    pil = pm._kill([pi_a.uuid.uuid, pi_b.uuid.uuid])
+
+    assert [p.uuid.uuid for p in pil.values] == [pi_a.uuid.uuid]
+    assert pi_a.uuid.uuid not in pm.process_store
+    assert pm.process_store[pi_b.uuid.uuid].is_alive()
+
+
+def test_logs_of_a_killed_process(pm):
+    pi = pm._boot_impl(boot_request('app', ['host-a']))
+    del pm.process_store[pi.uuid.uuid] # killed while the logs were requested
+
+    async def read():
+        return [ll async for ll in pm._logs_impl(LogRequest(query=ProcessQuery(uuids=[pi.uuid])))]
+
+    loop = asyncio.new_event_loop()
+    try:
+        lines = loop.run_until_complete(read())
+    finally:
+        loop.close()
+    assert len(lines) == 1
+    assert lines[0].line.startswith('Could not retrieve logs')
@@ -0,0 +1,39 @@
+from drunc.process_manager.boot_plan import configuration_files, boot_plan_key
+
+
+def write_oks(path, includes:list, objects:str=''):
+    files = '\n'.join(f' <file path="{include}"/>' for include in includes)
+    path.write_text(f'''<?xml version="1.0" encoding="ASCII"?>
+<oks-data>
+<include>
+{files}
+</include>
+{objects}
+</oks-data>
+''')
+
+
+def test_key_follows_the_included_files(tmp_path, monkeypatch):
+    db = tmp_path/'db'
+    db.mkdir()
+    monkeypatch.setenv('DUNEDAQ_DB_PATH', str(db))
+    monkeypatch.chdir(tmp_path)
+
+    write_oks(db/'schema.xml', [])
+    write_oks(tmp_path/'hosts.xml', ['schema.xml'], '<obj class="Host" id="a"></obj>')
+    write_oks(tmp_path/'session.xml', ['hosts.xml', 'schema.xml', 'missing.xml'])
+
+    assert configuration_files(str(tmp_path/'session.xml')) == [
+        str(tmp_path/'session.xml'),
+        str(tmp_path/'hosts.xml'),
+        str(db/'schema.xml'),
+        '?missing.xml',
+    ]
+
+    key = boot_plan_key(str(tmp_path/'session.xml'), 'session', 'me')
+    assert boot_plan_key(str(tmp_path/'session.xml'), 'session', 'me') == key
+    assert boot_plan_key(str(tmp_path/'session.xml'), 'other-session', 'me') != key
+
+    # A change in a file included by an included file
+    write_oks(db/'schema.xml', [], '<class name="Host"></class>')
+    assert boot_plan_key(str(tmp_path/'session.xml'), 'session', 'me') != key
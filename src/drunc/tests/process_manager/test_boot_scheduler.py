@@ -0,0 +1,53 @@
+import pytest
+
+from drunc.process_manager.boot_scheduler import BootScheduler
+
+# infra, root-controller -> (app-a, sub-controller -> (app-b, app-c))
+tree = {
+    'infra': None,
+    'root-controller': None,
+    'sub-controller': 'root-controller',
+    'app-b': 'sub-controller',
+    'app-c': 'sub-controller',
+    'app-a': 'root-controller',
+}
+
+
+def test_controllers_wait_for_their_subtree():
+    scheduler = BootScheduler(tree)
+    assert scheduler.pop_ready() == ['infra', 'app-b', 'app-c', 'app-a']
+    assert scheduler.pop_ready() == []
+
+    scheduler.notify_spawned('app-b')
+    scheduler.notify_spawned('app-a')
+    assert scheduler.pop_ready() == []
+
+    scheduler.notify_spawned('app-c')
+    assert scheduler.pop_ready() == ['sub-controller']
+
+    scheduler.notify_spawned('sub-controller')
+    assert scheduler.pop_ready() == ['root-controller']
+    assert scheduler.all_released()
+
+
+def test_threshold():
+    scheduler = BootScheduler(tree, controller_threshold=0.)
+    assert scheduler.pop_ready() == list(tree.keys())
+
+    scheduler = BootScheduler(tree, controller_threshold=0.5)
+    scheduler.pop_ready()
+    scheduler.notify_spawned('app-b')
+    assert scheduler.pop_ready() == ['sub-controller']
+    scheduler.notify_spawned('app-a')
+    assert scheduler.pop_ready() == ['root-controller']
+
+    with pytest.raises(Exception):
+        BootScheduler(tree, controller_threshold=2.)
+
+
+def test_unknown_process_releases_everything():
+    scheduler = BootScheduler(tree)
+    scheduler.pop_ready()
+    scheduler.notify_spawned('process_manager')
+    assert scheduler.pop_ready() == ['root-controller', 'sub-controller']
+    assert scheduler.all_released()
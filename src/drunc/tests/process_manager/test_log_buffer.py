@@ -0,0 +1,25 @@
+from drunc.process_manager.log_buffer import LogRingBuffer
+
+
+def test_keeps_the_last_lines():
+    buffer = LogRingBuffer(max_lines=3, max_size=1000)
+    buffer.feed('first\r\nsec')
+    buffer.feed('ond\nthird\n')
+    assert buffer.tail(5) == ['first\n', 'second\n', 'third\n']
+
+    buffer.feed('fourth\nfif')
+    assert buffer.tail(2) == ['fourth\n', 'fif']
+    assert buffer.tail(3) == ['third\n', 'fourth\n', 'fif']
+    # 'first' was dropped, the log file has to be read
+    assert buffer.tail(5) is None
+    assert buffer.tail(5, complete=False) == ['second\n', 'third\n', 'fourth\n', 'fif']
+
+
+def test_bounded_size():
+    buffer = LogRingBuffer(max_lines=100, max_size=10)
+    buffer.feed('12345\n67890\nabc\n')
+    assert buffer.tail(2) == ['67890\n', 'abc\n']
+    assert buffer.tail(3) is None
+
+    buffer.feed('x' * 25)
+    assert buffer.tail(1) == ['x' * 10]
@@ -0,0 +1,83 @@
+import asyncio
+
+from datetime import datetime
+
+from drunc.process_manager.log_reader import tail_lines, follow_lines, filter_lines, chunk_lines, line_timestamp, LogFilter
+
+
+def test_tail_lines(tmp_path):
+    log = tmp_path / 'log.txt'
+    log.write_text(''.join(f'line {i}\n' for i in range(1000)))
+
+    lines, offset = tail_lines(str(log), 3, block_size=16)
+    assert lines == ['line 997\n', 'line 998\n', 'line 999\n']
+    assert offset == log.stat().st_size
+
+    assert len(tail_lines(str(log), 5000)[0]) == 1000
+    assert tail_lines(str(log), 0)[0] == []
+
+
+def test_follow_lines(tmp_path):
+    log = tmp_path / 'log.txt'
+    log.write_text('old\n')
+    _, offset = tail_lines(str(log), 1)
+    alive = [True]
+
+    async def write_then_exit():
+        await asyncio.sleep(0.05)
+        with open(log, 'a') as f:
+            f.write('new 1\nnew 2\nunfinished')
+        await asyncio.sleep(0.1)
+        alive[0] = False
+
+    async def follow():
+        writer = asyncio.create_task(write_then_exit())
+        lines = [line async for lines in follow_lines(str(log), offset, is_alive=lambda: alive[0], poll_interval=0.01) for line in lines]
+        await writer
+        return lines
+
+    loop = asyncio.new_event_loop() # not asyncio.run, which would unset the event loop of the other tests
+    try:
+        assert loop.run_until_complete(follow()) == ['new 1\n', 'new 2\n', 'unfinished']
+    finally:
+        loop.close()
+
+
+def test_line_timestamp():
+    expected = datetime(2024, 3, 12, 10, 11, 12, 500000).timestamp()
+    assert line_timestamp(b'2024-Mar-12 10:11:12,500 LOG [...] message') == expected
+    assert line_timestamp(b'2024-03-12 10:11:12.5 message') == expected
+    assert line_timestamp(b'[2024-03-12T10:11:12.500] message') == expected
+    assert line_timestamp(b'no timestamp here') is None
+
+
+def test_filter_lines(tmp_path):
+    log = tmp_path / 'log.txt'
+    log.write_text(''.join(
+        f'2024-03-12 10:{minute:02d}:00 {"ERROR" if minute % 20 == 0 else "info"} message {minute}\n'
+        for minute in range(60)
+    ))
+
+    lines, _ = filter_lines(str(log), LogFilter(grep='ERROR'), 100)
+    assert [l.split()[-1] for l in lines] == ['0', '20', '40']
+
+    lines, _ = filter_lines(str(log), LogFilter(grep='error', ignore_case=True), 2)
+    assert [l.split()[-1] for l in lines] == ['20', '40']
+
+    lines, _ = filter_lines(str(log), LogFilter(grep='ERROR', context=1), 100)
+    assert [l.split()[-1] for l in lines] == ['0', '1', '--', '19', '20', '21', '--', '39', '40', '41']
+
+    since = datetime(2024, 3, 12, 10, 30).timestamp()
+    until = datetime(2024, 3, 12, 10, 45).timestamp()
+    lines, _ = filter_lines(str(log), LogFilter(grep='ERROR', since=since, until=until), 100)
+    assert [l.split()[-1] for l in lines] == ['40']
+    lines, _ = filter_lines(str(log), LogFilter(since=since, until=until), 100)
+    assert len(lines) == 16
+
+
+def test_chunk_lines():
+    lines = [f'line {i}\n' for i in range(10)]
+    chunks = list(chunk_lines(lines, 4))
+    assert len(chunks) == 3
+    assert ''.join(chunks) == ''.join(lines)
+    assert len(list(chunk_lines(lines, 100, max_bytes=14))) == 5
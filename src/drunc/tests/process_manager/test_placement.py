@@ -0,0 +1,21 @@
+import pytest
+
+from drunc.process_manager.placement import get_placement, placement_prefix, format_placement, InvalidPlacement, check_no_placement, PlacementNotSupported
+
+
+def test_placement_from_the_environment():
+    env = {'DRUNC_CPUS': '0-7,16-23', 'DRUNC_NUMA_NODE': '1', 'DRUNC_MEMORY_MAX': '16G', 'OTHER': 'x'}
+    placement = get_placement(env)
+    assert placement == {'cpus': '0-7,16-23', 'numa_node': '1', 'memory_max': '16G'}
+    assert placement_prefix(placement) == 'systemd-run --user --scope --quiet -p MemoryMax=16G -- numactl --membind=1 --physcpubind=0-7,16-23 -- '
+    assert placement_prefix(get_placement({'DRUNC_CPUS': '3'})) == 'taskset -c 3 '
+    assert placement_prefix(get_placement({})) == ''
+    assert format_placement(env) == 'cpus=0-7,16-23 numa=1 mem=16G'
+
+    # the values go in a shell command
+    with pytest.raises(InvalidPlacement):
+        get_placement({'DRUNC_CPUS': '0; reboot'})
+
+    check_no_placement({'OTHER': 'x', 'DRUNC_CPUS': ''}, 'k8s')
+    with pytest.raises(PlacementNotSupported):
+        check_no_placement(env, 'k8s')
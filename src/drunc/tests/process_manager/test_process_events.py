@@ -0,0 +1,35 @@
+import asyncio
+import threading
+
+from drunc.process_manager.process_events import ProcessEvents, ProcessEventType
+
+
+def test_events_from_other_threads():
+    events = ProcessEvents(max_backlog=3)
+
+    async def watch():
+        queue = events.subscribe()
+        publisher = threading.Thread(target=lambda: events.publish(ProcessEventType.EXITED, 'process'))
+        publisher.start()
+        publisher.join()
+        assert await asyncio.wait_for(queue.get(), timeout=5) == (ProcessEventType.EXITED, 'process')
+
+        # a watcher which does not keep up is told to resynchronise instead of piling up events
+        for i in range(5):
+            events.publish(ProcessEventType.BOOTED, i)
+        await asyncio.sleep(0.1)
+        items = []
+        while not queue.empty():
+            items.append(queue.get_nowait())
+        assert items[0] is ProcessEvents.RESYNC and len(items) <= 3
+
+        events.unsubscribe(queue)
+        events.publish(ProcessEventType.BOOTED, 'process')
+        await asyncio.sleep(0.1)
+        assert queue.empty()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(watch())
+    finally:
+        loop.close()
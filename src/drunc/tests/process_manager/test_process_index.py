@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+from drunc.process_manager.process_index import ProcessIndex
+
+
+def meta(name, session='session', user='user'):
+    return SimpleNamespace(name=name, session=session, user=user)
+
+
+def test_select():
+    index = ProcessIndex()
+    index.add('1', meta('root-controller'))
+    index.add('2', meta('ru-controller'))
+    index.add('3', meta('ru-01', session='other'))
+    index.add('4', meta('tp-stream-writer', session='other', user='someone'))
+
+    assert index.select(names=['ru']) == ['2', '3']
+    assert index.select(names=['controller$']) == ['1', '2']
+    assert index.select(session='other') == ['3', '4']
+    assert index.select(user='someone') == ['4']
+    assert index.select(uuids=['4', 'unknown'], names=['root']) == ['1', '4']
+    assert index.select(session='') == []
+
+
+def test_cached_patterns_follow_updates():
+    index = ProcessIndex()
+    index.add('1', meta('ru-01'))
+    assert index.select(names=['ru']) == ['1']
+
+    index.add('2', meta('ru-02'))
+    assert index.select(names=['ru']) == ['1', '2']
+
+    index.remove('1')
+    assert index.select(names=['ru']) == ['2']
+    assert '1' not in index and len(index) == 1
+
+    # re-adding the same uuid (restart) keeps a single entry
+    index.add('2', meta('ru-02'))
+    assert index.select(names=['ru']) == ['2']
+
+
+def test_query_matches():
+    from drunc.process_manager.process_index import query_matches
+    query = SimpleNamespace(uuids=[SimpleNamespace(uuid='1')], names=['^ru'], session='', user='')
+    assert query_matches(query, '1', meta('root-controller'))
+    assert query_matches(query, '2', meta('ru-01'))
+    assert not query_matches(query, '3', meta('root-controller'))
+
+    query = SimpleNamespace(uuids=[], names=[], session='other', user='')
+    assert query_matches(query, '3', meta('df-01', session='other'))
+    assert not query_matches(query, '4', meta('df-01'))
+
+    # same selection as the index, also for the processes without a session
+    index = ProcessIndex()
+    index.add('5', meta('df-02', session=''))
+    index.add('6', meta('df-03'))
+    query = SimpleNamespace(uuids=[], names=[], session='', user='')
+    assert index.query(query) == ['5']
+    assert query_matches(query, '5', meta('df-02', session=''))
+    assert not query_matches(query, '6', meta('df-03'))
@@ -0,0 +1,34 @@
+import signal
+import threading
+import time
+
+from sh import Command
+
+from drunc.process_manager.process_reaper import ProcessReaper
+
+
+def test_exit_delivered_once_when_reaped_after_a_kill():
+    exits = []
+    lock = threading.Lock()
+
+    def on_exit(exec, uuid):
+        with lock:
+            exits.append((uuid, exec.exit_code if exec else 0))
+
+    reaper = ProcessReaper(on_exit=on_exit, poll_interval=0.05)
+    reaper.start()
+
+    processes = {f'uuid-{i}': Command('/bin/sleep')('30', _bg=True, _bg_exc=False) for i in range(20)}
+    for uuid, process in processes.items():
+        reaper.watch(uuid, process, uuid=uuid)
+
+    # as kill_processes does: the exit is delivered, whichever thread gets to it first, before unwatching
+    for uuid, process in processes.items():
+        process.signal(signal.SIGKILL)
+        while process.is_alive():
+            time.sleep(0.01)
+        reaper.reap(uuid)
+        reaper.unwatch(uuid)
+
+    time.sleep(0.2)
+    assert sorted(exits) == sorted((uuid, -signal.SIGKILL) for uuid in processes)
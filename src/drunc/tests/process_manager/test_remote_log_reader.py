@@ -0,0 +1,72 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+from drunc.process_manager.log_reader import LogFilter, tail_lines, filter_lines
+from drunc.process_manager.remote_log_reader import RemoteLogReader
+
+content = (
+    '2024-03-12 10:00:00 starting\n'
+    'some details\n'
+    '2024-03-12 11:00:00 ERROR something failed\n'
+    'traceback\n'
+    '2024-03-12 12:00:00 done\n'
+)
+
+
+def run_remote_script(args:dict) -> dict:
+    # What runs on the host of the process, here with the local interpreter instead of through ssh
+    result = subprocess.run(
+        [sys.executable, '-', json.dumps(args)],
+        input = RemoteLogReader().script(),
+        capture_output = True,
+        timeout = 30,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+
+def test_remote_read_is_the_local_read(tmp_path):
+    log = tmp_path/'app.log'
+    log.write_text(content)
+
+    result = run_remote_script({'mode': 'read', 'path': str(log), 'how_far': 3, 'filter': None})
+    assert (result['lines'], result['offset']) == tail_lines(str(log), 3)
+
+    log_filter = LogFilter(grep='error', ignore_case=True, context=1)
+    result = run_remote_script({'mode': 'read', 'path': str(log), 'how_far': 10, 'filter': log_filter.options()})
+    assert (result['lines'], result['offset']) == filter_lines(str(log), log_filter, 10)
+
+
+def test_remote_follow_of_a_burst(tmp_path):
+    log = tmp_path/'app.log'
+    log.write_text(content)
+    offset = len(content)
+    burst = [f'{i:08d} ' + 'x' * 1000 + '\n' for i in range(1000)] # about 1 MiB, written between two polls
+
+    reader = RemoteLogReader()
+    # the host is this one, without ssh
+    reader._command = lambda user_host, args, options=(): [sys.executable, '-', json.dumps(args)]
+
+    async def follow():
+        lines = []
+        followed = reader.follow('me@host', str(log), offset, poll_interval=0.1)
+        try:
+            async for new_lines in followed:
+                lines += new_lines
+                if len(lines) >= len(burst):
+                    break
+        finally:
+            await followed.aclose() # kills the remote reader
+        return lines
+
+    with open(log, 'a') as f:
+        f.writelines(burst)
+
+    loop = asyncio.new_event_loop()
+    try:
+        lines = loop.run_until_complete(asyncio.wait_for(follow(), timeout=30))
+    finally:
+        loop.close()
+    assert lines == burst
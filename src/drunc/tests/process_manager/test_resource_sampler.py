@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from drunc.process_manager.resource_probe import probe, read_pid_from_log
+from drunc.process_manager.resource_sampler import ResourceSampler
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self'), reason='needs /proc')
+def test_probe_measures_the_process_tree(tmp_path):
+    log = tmp_path/'app.log'
+    log.write_text(f'SSHPM: Starting process {os.getpid()} on host localhost as user me\n')
+    assert read_pid_from_log(str(log)) == os.getpid()
+
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        results = probe({
+            'test': {'pid': None, 'log': str(log)},
+            'child': {'pid': child.pid, 'log': None},
+            'unknown': {'pid': None, 'log': str(tmp_path/'missing.log')},
+        })
+    finally:
+        child.kill()
+        child.wait()
+
+    assert results['test']['pid'] == os.getpid() and results['test']['alive']
+    # this process and its child are both counted
+    assert results['test']['rss'] > results['child']['rss'] > 0
+    assert results['test']['threads'] >= 2
+    assert results['unknown'] == {'pid': None}
+
+
+def test_samples_are_rates_in_a_bounded_ring():
+    sampler = ResourceSampler(history=2)
+    sampler.watch('uuid', hostname='localhost', user='me', log_path=None)
+
+    for t in range(4):
+        sampler._record('uuid', {
+            'pid': 1, 'alive': True, 'time': float(t), 'cpu_time': 0.5*t,
+            'rss': 1024, 'threads': 3, 'read_bytes': 100*t, 'write_bytes': 0,
+        })
+
+    samples = sampler.samples('uuid')
+    assert len(samples) == 2
+    assert samples[-1]['cpu_percent'] == 50.
+    assert samples[-1]['read_rate'] == 100.
+
+    sampler._record('uuid', {'pid': 1, 'alive': False})
+    assert len(sampler.samples('uuid')) == 2 # kept until the process is forgotten
+    sampler.unwatch('uuid')
+    assert sampler.samples('uuid') == []
+    sampler.stop()
@@ -0,0 +1,24 @@
+import subprocess
+
+from drunc.process_manager.rte_snapshot import parse_environments, environment_script
+
+
+def test_snapshot_reproduces_the_environment():
+    output = '1700000000:123:42\n' + '\0'.join([
+        'PATH=/usr/bin', 'LANG=C', 'SHLVL=1',
+        'DRUNC_RTE_SOURCED',
+        'PATH=/release/bin:/usr/bin', 'QUOTED=it\'s "here"\nand there', 'SHLVL=2', 'BASH_FUNC_f%%=() { :; }',
+    ]) + '\0'
+
+    fingerprint, before, after = parse_environments(output)
+    assert fingerprint == '1700000000:123:42'
+    assert before == {'PATH': '/usr/bin', 'LANG': 'C', 'SHLVL': '1'}
+
+    script = environment_script(before, after)
+    assert 'SHLVL' not in script and 'BASH_FUNC' not in script
+
+    result = subprocess.run(
+        ['/bin/bash', '-c', script + 'printf "%s|%s|%s" "$PATH" "${LANG-unset}" "$QUOTED"'],
+        env = before, capture_output = True, text = True,
+    )
+    assert result.stdout == '/release/bin:/usr/bin|unset|it\'s "here"\nand there'
@@ -0,0 +1,33 @@
+from drunc.utils.ssh_utils import SSHControlMasters
+
+
+def test_sessions_per_master_are_capped(monkeypatch):
+    masters = SSHControlMasters(max_sessions=2)
+    checked = []
+    def options(user_host, index=0, check=False):
+        checked.append((user_host, index, check))
+        return ['-o', f'ControlPath={masters.control_path(user_host, index)}']
+    monkeypatch.setattr(masters, '_options', options)
+
+    first = masters.acquire('me@host', check=True)
+    with masters.session('me@host') as second:
+        assert first == second
+        # sshd would refuse a third channel, it goes through a second master
+        with masters.session('me@host') as third:
+            assert third and third != first
+        assert masters.acquire('me@other-host') == ['-o', f'ControlPath={masters.control_path("me@other-host")}']
+
+    masters.release('me@host', first)
+    assert masters.acquire('me@host') == first
+    assert checked[0] == ('me@host', 0, True)
+    masters.close()
+
+
+def test_no_session_counted_without_master(monkeypatch):
+    masters = SSHControlMasters(max_sessions=1)
+    monkeypatch.setattr(masters, '_options', lambda user_host, index=0, check=False: [])
+
+    assert masters.acquire('me@host') == []
+    assert masters._sessions['me@host'] == [0]
+    masters.release('me@host', [])
+    masters.close()
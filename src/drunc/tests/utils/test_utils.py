@@ -253,6 +253,35 @@ def test_host_is_local():
     assert not host_is_local("8.8.8.8")
 
 
+
+def test_host_resolution_cache():
+    from drunc.utils.utils import HostResolutionCache
+    import pytest, socket
+    cache = HostResolutionCache(ttl=300., negative_ttl=0.)
+    lookups = []
+
+    def lookup(host):
+        lookups.append(host)
+        if host == 'unknown':
+            raise socket.gaierror('Name or service not known')
+        return '10.0.0.1'
+
+    assert cache._lookup(('address', 'known'), lookup, 'known') == '10.0.0.1'
+    assert cache._lookup(('address', 'known'), lookup, 'known') == '10.0.0.1'
+    assert lookups == ['known']
+
+    for _ in range(2): # the failures expire straight away here
+        with pytest.raises(socket.gaierror):
+            cache._lookup(('address', 'unknown'), lookup, 'unknown')
+    assert lookups == ['known', 'unknown', 'unknown']
+
+    cache.negative_ttl = 300.
+    cache.clear()
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            cache._lookup(('address', 'unknown'), lookup, 'unknown')
+    assert lookups == ['known', 'unknown', 'unknown', 'unknown']
+
 def test_parent_death_pact():
     from drunc.utils.utils import parent_death_pact
     from os import getpid
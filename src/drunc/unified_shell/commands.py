@@ -22,6 +22,18 @@ from drunc.process_manager.interface.context import ProcessManagerContext
     '--override-logs/--no-override-logs',
     default=True
 )
+@click.option(
+    '--controller-boot-threshold',
+    type=click.FloatRange(0., 1.),
+    default=1.,
+    help='Fraction of the applications under a controller that must be spawned before the controller is booted (1: whole subtree first, 0: everything in parallel)'
+)
+@click.option(
+    '--boot-plan-cache/--no-boot-plan-cache',
+    'use_boot_plan_cache',
+    default=True,
+    help='Reuse the boot plan of the configuration if it has not changed since it was last booted (--no-boot-plan-cache reads the configuration again)'
+)
 @click.pass_obj
 @run_coroutine
 async def boot(
@@ -29,6 +41,8 @@ async def boot(
     user:str,
     log_level:str,
     override_logs:bool,
+    controller_boot_threshold:float,
+    use_boot_plan_cache:bool,
     ) -> None:
 
 
@@ -41,9 +55,15 @@ async def boot(
             session_name = obj.session_name,
             log_level = log_level,
             override_logs = override_logs,
+            controller_boot_threshold = controller_boot_threshold,
+            use_boot_plan_cache = use_boot_plan_cache,
         )
+        from druncschema.process_manager_pb2 import ProcessInstance
         async for result in results:
             if not result: break
+            if not isinstance(result.data, ProcessInstance):
+                log.error('A process could not be booted, see the logs of the process manager')
+                continue
             log.debug(f'\'{result.data.process_description.metadata.name}\' ({result.data.uuid.uuid}) process started')
     except InterruptedCommand:
         return
@@ -6,6 +6,8 @@ class UnifiedShellContext(ShellContext): # boilerplatefest
     status_receiver_pm = None
     status_receiver_controller = None
     took_control = False
+    fsm_schema = None
+    fsm_state = None # FSM state of the controller when the shell last saw it
     pm_process = None
     address_pm = ''
     address_controller = ''
@@ -118,13 +118,15 @@ def unified_shell(
     from drunc.unified_shell.commands import boot
     ctx.command.add_command(boot, 'boot')
 
-    from drunc.process_manager.interface.commands import kill, terminate, flush, logs, restart, ps, dummy_boot
+    from drunc.process_manager.interface.commands import kill, terminate, flush, logs, restart, ps, metrics, watch, dummy_boot
     ctx.command.add_command(kill, 'kill')
     ctx.command.add_command(terminate, 'terminate')
     ctx.command.add_command(flush, 'flush')
     ctx.command.add_command(logs, 'logs')
     ctx.command.add_command(restart, 'restart')
     ctx.command.add_command(ps, 'ps')
+    ctx.command.add_command(metrics, 'metrics')
+    ctx.command.add_command(watch, 'watch')
     ctx.command.add_command(dummy_boot, 'dummy_boot')
 
     # Not particularly proud of this...
@@ -181,7 +183,7 @@ def unified_shell(
 
 
     from drunc.controller.interface.commands import (
-        status, connect, take_control, surrender_control, who_am_i, who_is_in_charge, include, exclude, wait
+        status, connect, take_control, surrender_control, who_am_i, who_is_in_charge, include, exclude, wait, abort
     )
 
     ctx.command.add_command(status, 'status')
@@ -193,3 +195,4 @@ def unified_shell(
     ctx.command.add_command(include, 'include')
     ctx.command.add_command(exclude, 'exclude')
     ctx.command.add_command(wait, 'wait')
+    ctx.command.add_command(abort, 'abort')
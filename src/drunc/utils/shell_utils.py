@@ -227,6 +227,33 @@ class GRPCDriver:
 
 
 
+    async def send_stream_for_aio(self, command:str, data, outformat=None):
+        '''
+        Streams one request per element of data (iterable or async iterable), and yields the responses as they arrive
+        '''
+        import grpc
+        if not self.stub:
+            raise DruncShellException('No stub initialised')
+
+        cmd = getattr(self.stub, command) # this throws if the command doesn't exist
+
+        async def requests():
+            if hasattr(data, '__aiter__'):
+                async for d in data:
+                    yield self._create_request(d)
+            else:
+                for d in data:
+                    yield self._create_request(d)
+
+        try:
+            async for s in cmd(requests()):
+                yield self.handle_response(s, command, outformat)
+
+        except grpc.aio.AioRpcError as e:
+            self.__handle_grpc_error(e, command)
+
+
+
 class ShellContext:
     def _reset(self, name:str, token_args:dict={}, driver_args:dict={}):
         from rich.console import Console
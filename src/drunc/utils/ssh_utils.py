@@ -0,0 +1,186 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from sh import Command, ErrorReturnCode, TimeoutException
+
+
+class SSHControlMasters:
+    '''
+    Keeps a pool of persistent ssh master connections (ControlMaster) per user@host, so that the ssh sessions to a
+    host (the processes, as well as the short commands) are multiplexed over a few connections instead of doing a
+    full handshake each time.
+
+    acquire(user_host) gives the ssh options to route one session through a master of the host with fewer than
+    max_sessions sessions, opening a new master when they are all full. sshd refuses the channels above its
+    MaxSessions (10 by default), so max_sessions has to stay below it. A master is health-checked before being
+    reused (at most every check_interval seconds, or every time with check=True), and reopened if it died. If a
+    master cannot be opened, no option is given and the session uses its own connection. A master going down ends
+    all the sessions it carries, which is why each one carries at most max_sessions of them.
+    '''
+    def __init__(self, control_persist:int=600, check_interval:float=30., timeout:float=30., max_sessions:int=8):
+        self.log = logging.getLogger('ssh_control_masters')
+        self.ssh = Command('/usr/bin/ssh')
+        self.control_persist = control_persist # how long an idle master stays up
+        self.check_interval = check_interval # how often the masters are health-checked
+        self.timeout = timeout
+        self.max_sessions = max(1, max_sessions)
+
+        # The control sockets paths are limited to ~100 characters, so they go in a short temporary directory
+        import tempfile
+        self.control_dir = tempfile.mkdtemp(prefix='drunc-ssh-')
+
+        self._lock = threading.Lock()
+        self._master_locks = {} # (user_host, index) -> lock held while the master is checked or (re)opened
+        self._last_check = {} # (user_host, index) -> time of the last successful health check
+        self._last_failure = {} # user_host -> time a master last failed to open, not retried before check_interval
+        self._sessions = {} # user_host -> number of sessions going through each master of the pool
+
+
+    def control_path(self, user_host:str, index:int=0) -> str:
+        import hashlib, os
+        return os.path.join(self.control_dir, hashlib.sha1(f'{user_host}#{index}'.encode()).hexdigest()[:16])
+
+
+    def _master_lock(self, user_host:str, index:int) -> threading.Lock:
+        with self._lock:
+            return self._master_locks.setdefault((user_host, index), threading.Lock())
+
+
+    def is_alive(self, user_host:str, index:int=0) -> bool:
+        try:
+            self.ssh(
+                '-O', 'check',
+                '-o', f'ControlPath={self.control_path(user_host, index)}',
+                user_host,
+                _timeout = self.timeout,
+            )
+            return True
+        except (ErrorReturnCode, TimeoutException):
+            return False
+
+
+    def _start_master(self, user_host:str, index:int) -> bool:
+        self.log.info(f'Opening master ssh connection {index} to {user_host}')
+        import os
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True) # close() removes it, but the masters can be reopened afterwards
+        try:
+            # -f backgrounds the master once the connection is established, so this returns when it is usable.
+            # A master which stops answering is closed after a minute (and the sessions it carries with it),
+            # rather than hanging them forever; shorter network glitches are ridden out.
+            self.ssh(
+                '-M', '-N', '-f',
+                '-o', 'StrictHostKeyChecking=no',
+                '-o', 'ControlMaster=yes',
+                '-o', f'ControlPath={self.control_path(user_host, index)}',
+                '-o', f'ControlPersist={self.control_persist}',
+                '-o', 'ServerAliveInterval=10',
+                '-o', 'ServerAliveCountMax=6',
+                user_host,
+                _timeout = self.timeout,
+            )
+            return True
+        except (ErrorReturnCode, TimeoutException) as e:
+            self.log.warning(f'Could not open a master ssh connection to {user_host}, sessions will use their own connection: {str(e)}')
+            return False
+
+
+    def _options(self, user_host:str, index:int=0, check:bool=False) -> list:
+        from time import monotonic
+        with self._master_lock(user_host, index):
+            with self._lock:
+                last_failure = self._last_failure.get(user_host)
+            if last_failure is not None and monotonic() - last_failure < self.check_interval:
+                return []
+
+            last_check = self._last_check.get((user_host, index))
+            if check or last_check is None or monotonic() - last_check > self.check_interval:
+                if not self.is_alive(user_host, index):
+                    if last_check is not None:
+                        self.log.warning(f'Master ssh connection {index} to {user_host} is down, reopening it')
+                    if not self._start_master(user_host, index):
+                        self._last_check.pop((user_host, index), None)
+                        with self._lock:
+                            self._last_failure[user_host] = monotonic()
+                        return []
+                self._last_check[(user_host, index)] = monotonic()
+                with self._lock:
+                    self._last_failure.pop(user_host, None)
+
+        return [
+            '-o', 'ControlMaster=no',
+            '-o', f'ControlPath={self.control_path(user_host, index)}',
+        ]
+
+
+    def acquire(self, user_host:str, check:bool=False) -> list:
+        '''
+        Returns the ssh options for one session to go through a master of the host, or [] for it to use its own
+        connection. With check, the master is health-checked whenever it was last checked (for the long sessions).
+        Each call has to be matched by a release once the session is over.
+        '''
+        with self._lock:
+            sessions = self._sessions.setdefault(user_host, [])
+            index = next((i for i, n in enumerate(sessions) if n < self.max_sessions), len(sessions))
+            if index == len(sessions):
+                sessions.append(0)
+            sessions[index] += 1
+
+        options = []
+        try:
+            options = self._options(user_host, index, check)
+        finally:
+            if not options:
+                self._release(user_host, index)
+        return options
+
+
+    def _release(self, user_host:str, index:int) -> None:
+        with self._lock:
+            self._sessions[user_host][index] -= 1
+
+
+    def release(self, user_host:str, options:list) -> None:
+        if not options:
+            return
+        with self._lock:
+            n_masters = len(self._sessions.get(user_host, []))
+        for index in range(n_masters):
+            if f'ControlPath={self.control_path(user_host, index)}' in options:
+                self._release(user_host, index)
+                return
+
+
+    @contextmanager
+    def session(self, user_host:str):
+        '''
+        Gives the ssh options of acquire, released when the command is over
+        '''
+        options = self.acquire(user_host)
+        try:
+            yield options
+        finally:
+            self.release(user_host, options)
+
+
+    def close(self) -> None:
+        with self._lock:
+            masters = list(self._master_locks.keys())
+
+        for user_host, index in masters:
+            with self._master_lock(user_host, index):
+                if self._last_check.pop((user_host, index), None) is None:
+                    continue
+                self.log.info(f'Closing master ssh connection {index} to {user_host}')
+                try:
+                    self.ssh(
+                        '-O', 'exit',
+                        '-o', f'ControlPath={self.control_path(user_host, index)}',
+                        user_host,
+                        _timeout = self.timeout,
+                    )
+                except (ErrorReturnCode, TimeoutException) as e:
+                    self.log.debug(f'Could not close master ssh connection {index} to {user_host}: {str(e)}')
+
+        import shutil
+        shutil.rmtree(self.control_dir, ignore_errors=True)
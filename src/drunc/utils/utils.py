@@ -1,4 +1,5 @@
 import logging
+import re
 from rich.theme import Theme
 from enum import Enum
 from drunc.connectivity_service.client import ConnectivityServiceClient
@@ -180,65 +181,91 @@ def validate_command_facility(ctx, param, value):
             raise BadParameter(message='Command factory for drunc-controller only allows \'grpc\'', ctx=ctx, param=param)
 
 
-def resolve_localhost_to_hostname(address):
-    from socket import gethostname
-    hostname = gethostname()
-    if 'localhost' in address:
-        address = address.replace('localhost', hostname)
+# https://stackoverflow.com/a/25969006
+IPV4_ADDRESS = re.compile(r"((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)")
 
-    import re
-    ip_match = re.search(
-        "((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)",
-        address
-    )
-    # https://stackoverflow.com/a/25969006
 
-    if not ip_match:
-        return address
+class HostResolutionCache:
+    '''
+    Process-wide cache of the name of this host and of the host name lookups, which can take a while on nodes with
+    a slow DNS and are done for every application at boot. Successful lookups are kept ttl seconds, and failed ones
+    negative_ttl seconds (the error is raised again from the cache), so that a host without address is not looked up
+    again for every application, but is retried soon after.
+    '''
+    def __init__(self, ttl:float=300., negative_ttl:float=30.):
+        import threading
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = {} # key -> (expiry, value, exception)
 
-    if ip_match.group(0).startswith('127.'):
-        address = address.replace(ip_match.group(0), hostname)
 
-    if ip_match.group(0).startswith('0.'):
-        address = address.replace(ip_match.group(0), hostname)
+    def _lookup(self, key, function, *args):
+        from time import monotonic
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] < monotonic():
+            # Looked up without the lock: another thread may look it up at the same time, but none waits for the others
+            try:
+                entry = (monotonic() + self.ttl, function(*args), None)
+            except OSError as e:
+                entry = (monotonic() + self.negative_ttl, None, e)
+            with self._lock:
+                self._entries[key] = entry
+        if entry[2] is not None:
+            raise entry[2]
+        return entry[1]
 
-    return address
 
+    def hostname(self) -> str:
+        from socket import gethostname
+        return self._lookup('hostname', gethostname)
 
-def resolve_localhost_and_127_ip_to_network_ip(address):
-    from socket import gethostbyname, gethostname
-    this_ip = gethostbyname(gethostname())
-    if 'localhost' in address:
-        address = address.replace('localhost', this_ip)
 
-    import re
-    ip_match = re.search(
-        "((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)",
-        address
-    )
-    # https://stackoverflow.com/a/25969006
+    def gethostbyname(self, host:str) -> str:
+        from socket import gethostbyname
+        return self._lookup(('address', host), gethostbyname, host)
+
+
+    def this_ip(self) -> str:
+        return self.gethostbyname(self.hostname())
+
 
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+host_resolution = HostResolutionCache()
+
+
+def _replace_local_addresses(address:str, replacement) -> str:
+    # replacement is only called if there is something to replace, so that nothing is looked up for the other addresses
+    if 'localhost' in address:
+        address = address.replace('localhost', replacement())
+
+    ip_match = IPV4_ADDRESS.search(address)
     if not ip_match:
         return address
 
-    if ip_match.group(0).startswith('127.'):
-        address = address.replace(ip_match.group(0), this_ip)
-
-    if ip_match.group(0).startswith('0.'):
-        address = address.replace(ip_match.group(0), this_ip)
+    if ip_match.group(0).startswith('127.') or ip_match.group(0).startswith('0.'):
+        address = address.replace(ip_match.group(0), replacement())
 
     return address
 
-def host_is_local(host):
-    from socket import gethostname, gethostbyname
 
-    if host in ['localhost', gethostname(), gethostbyname(gethostname())]:
-        return True
+def resolve_localhost_to_hostname(address):
+    return _replace_local_addresses(address, host_resolution.hostname)
+
 
-    if host.startswith('127.') or host.startswith('0.'):
+def resolve_localhost_and_127_ip_to_network_ip(address):
+    return _replace_local_addresses(address, host_resolution.this_ip)
+
+def host_is_local(host):
+    if host == 'localhost' or host.startswith('127.') or host.startswith('0.'):
         return True
 
-    return False
+    return host == host_resolution.hostname() or host == host_resolution.this_ip()
 
 
 def pid_info_str():